@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException, Query, status
+import os
+from fastapi.responses import FileResponse
+
+from app.core.config import settings
+from app.core.profiling import list_profiles, get_profile_path
+from app.core.dependencies import get_rag_service, get_web_refresh_service
+from app.services.api_scheduler import get_api_scheduler
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+def _ensure_profiling_enabled():
+    if not (settings.debug and settings.profiling_enabled):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profiling is disabled"
+        )
+
+@router.get("/profiles", summary="List recent request profiles")
+async def get_profiles(limit: int = Query(20, ge=1, le=200)):
+    """
+    List the most recent request profiles.
+
+    A request is profiled when it is sent with the `X-Profile: 1` header or
+    the `?profile=1` query parameter while profiling (`PROFILING_ENABLED`)
+    and debug mode are enabled.
+    """
+    _ensure_profiling_enabled()
+    try:
+        profiles = list_profiles(settings.profiles_path, limit=limit)
+        return {"profiles": profiles, "total": len(profiles)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error listing profiles: {str(e)}"
+        )
+
+@router.get("/profiles/{profile_id}", summary="Download a request profile")
+async def download_profile(profile_id: str):
+    """
+    Download a profile in speedscope format (open it at https://www.speedscope.app).
+    """
+    _ensure_profiling_enabled()
+    path = get_profile_path(settings.profiles_path, profile_id)
+    if not path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return FileResponse(path, media_type="application/json", filename=path.name)
+
+@router.get("/metrics", summary="Get runtime metrics")
+async def get_metrics():
+    """
+    Get runtime metrics:
+    
+    - API scheduler: rate limits, concurrency, retries
+    - query embedding micro-batcher: batch sizes, queueing delay
+    - rerank stage: cache hits, budget fallbacks
+    - queries answered without the LLM (nothing relevant retrieved)
+    - answer and semantic caches: hit rates, best-match similarity histogram
+    - web document refresh scheduler
+    
+    Metrics are per worker process; `worker_pid` tells which one answered.
+    """
+    try:
+        rag_service = get_rag_service()
+        query_batcher = rag_service.embeddings.query_batcher
+        return {
+            "worker_pid": os.getpid(),
+            "api_scheduler": get_api_scheduler().get_stats(),
+            "query_embedding_batcher": query_batcher.get_stats() if query_batcher else None,
+            "reranker": rag_service.rerank_stage.get_stats() if rag_service.rerank_stage else None,
+            "queries": rag_service.get_query_stats(),
+            "answer_cache": rag_service.answer_cache.get_stats(),
+            "semantic_cache": rag_service.semantic_cache.get_stats() if rag_service.semantic_cache else None,
+            "web_refresh": get_web_refresh_service().get_stats()
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting metrics: {str(e)}"
+        )
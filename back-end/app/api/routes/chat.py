@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
 
 from app.models.chat import (
     ChatRequest, 
@@ -9,12 +9,15 @@ from app.models.chat import (
 )
 from app.services.chat_service import ChatService
 from app.core.dependencies import get_chat_service
+from app.core.profiling import run_sync
+from app.utils.projection import parse_fields, project_response
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 @router.post("/", response_model=ChatResponse, summary="Send a chat message")
 async def chat(
     request: ChatRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (prefix with - to exclude)"),
     chat_service: ChatService = Depends(get_chat_service)
 ):
     """
@@ -23,14 +26,18 @@ async def chat(
     - **message**: The user's message/question
     - **conversation_id**: Optional conversation ID to continue existing conversation
     - **include_sources**: Whether to include source documents in response
+    - **fields**: Only return these fields, e.g. `message,conversation_id` or `-sources`
     """
+    projection = parse_fields(fields)
     try:
-        response = chat_service.chat(
+        response = await run_sync(
+            chat_service.chat,
             message=request.message,
             conversation_id=request.conversation_id,
-            include_sources=request.include_sources
+            # Don't build sources the client has asked us to leave out
+            include_sources=request.include_sources and (projection is None or projection.selects("sources"))
         )
-        return response
+        return project_response(response, projection)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -39,14 +46,16 @@ async def chat(
 
 @router.get("/conversations", response_model=List[ConversationHistory], summary="List all conversations")
 async def list_conversations(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (prefix with - to exclude)"),
     chat_service: ChatService = Depends(get_chat_service)
 ):
     """
     Get a list of all conversation histories.
     """
+    projection = parse_fields(fields)
     try:
         conversations = chat_service.list_conversations()
-        return conversations
+        return project_response(conversations, projection)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -56,11 +65,13 @@ async def list_conversations(
 @router.get("/conversations/{conversation_id}", response_model=ConversationHistory, summary="Get conversation history")
 async def get_conversation(
     conversation_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (prefix with - to exclude)"),
     chat_service: ChatService = Depends(get_chat_service)
 ):
     """
     Get the history of a specific conversation.
     """
+    projection = parse_fields(fields)
     try:
         conversation = chat_service.get_conversation_history(conversation_id)
         if not conversation:
@@ -68,7 +79,7 @@ async def get_conversation(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Conversation not found"
             )
-        return conversation
+        return project_response(conversation, projection)
     except HTTPException:
         raise
     except Exception as e:
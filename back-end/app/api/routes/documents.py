@@ -1,17 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import List, Optional
+import json
 
 from app.models.document import (
     DocumentUploadRequest,
     WebDocumentRequest,
+    CrawlRequest,
     DocumentResponse,
     DocumentListResponse,
     DocumentInfo,
+    ChunkListResponse,
     VectorStoreStatus
 )
 from app.services.document_service import DocumentService
 from app.services.rag_service import RAGService
-from app.core.dependencies import get_document_service, get_rag_service
+from app.services.reindex_service import ReindexService
+from app.services.web_refresh import WebRefreshService
+from app.services.crawl_service import CrawlService
+from app.core.dependencies import (
+    get_document_service, get_rag_service, get_reindex_service, get_web_refresh_service, get_crawl_service
+)
+from app.core.profiling import run_sync
+from app.services.kb_transfer import export_records, iter_gzip, iter_ndjson
+from app.utils.projection import parse_fields, project_response
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
@@ -31,7 +44,8 @@ async def add_text_document(
     - **metadata**: Optional metadata dictionary
     """
     try:
-        result = document_service.add_text_document(
+        result = await run_sync(
+            document_service.add_text_document,
             content=request.content,
             title=request.title,
             source=request.source,
@@ -65,7 +79,8 @@ async def add_web_document(
     - **metadata**: Optional metadata dictionary
     """
     try:
-        result = document_service.add_web_document(
+        result = await run_sync(
+            document_service.add_web_document,
             url=str(request.url),
             title=request.title,
             metadata=request.metadata,
@@ -84,33 +99,255 @@ async def add_web_document(
             detail=f"Error adding web document: {str(e)}"
         )
 
+@router.post("/upload", response_model=DocumentResponse, summary="Upload file document")
+async def upload_file_document(
+    file: UploadFile = File(...),
+    title: Optional[str] = Form(None),
+    metadata: Optional[str] = Form(None),
+    document_service: DocumentService = Depends(get_document_service),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Upload a PDF, Markdown or text file to the knowledge base.
+    
+    The file is streamed to disk and ingested page by page (PDF) or section by
+    section (Markdown), so large files never have to fit in memory. Files over
+    ``max_upload_size_mb`` are refused with 413, before their body is read when
+    the request has a Content-Length.
+    
+    - **file**: The file to upload (.pdf, .md, .markdown or .txt)
+    - **title**: Optional title for the document (defaults to the file name)
+    - **metadata**: Optional metadata as a JSON object string
+    """
+    filename = file.filename or "upload"
+    doc_type = document_service.detect_document_type(filename)
+    if doc_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported file type: {filename}"
+        )
+    
+    try:
+        custom_metadata = json.loads(metadata) if metadata else None
+    except ValueError:
+        custom_metadata = None
+    if metadata and not isinstance(custom_metadata, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="metadata must be a JSON object"
+        )
+    
+    try:
+        file_path, _ = await run_sync(document_service.save_upload, file.file, filename)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error saving uploaded file: {str(e)}"
+        )
+    finally:
+        await file.close()
+    
+    try:
+        result = await run_sync(
+            document_service.add_file_document,
+            file_path=file_path,
+            filename=filename,
+            doc_type=doc_type,
+            title=title,
+            metadata=custom_metadata,
+            rag_service=rag_service
+        )
+        
+        return DocumentResponse(
+            doc_id=result["doc_id"],
+            message=result["message"],
+            status=result["status"]
+        )
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error adding file document: {str(e)}"
+        )
+
 @router.get("/", response_model=DocumentListResponse, summary="List all documents")
 async def list_documents(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (prefix with - to exclude)"),
     document_service: DocumentService = Depends(get_document_service)
 ):
     """
     Get a list of all documents in the knowledge base.
     """
+    projection = parse_fields(fields)
     try:
         documents = document_service.list_documents()
-        return DocumentListResponse(
+        return project_response(DocumentListResponse(
             documents=documents,
             total=len(documents)
-        )
+        ), projection)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error listing documents: {str(e)}"
         )
 
+@router.get("/export", summary="Export the knowledge base")
+async def export_knowledge_base(
+    include_embeddings: bool = Query(False, description="Include chunk embeddings (import then skips re-embedding)"),
+    compress: bool = Query(False, description="Gzip the NDJSON stream (.ndjson.gz)"),
+    document_service: DocumentService = Depends(get_document_service),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Stream every completed document, its original content and its chunks as
+    NDJSON, optionally gzip-compressed.
+    
+    The export is generated while it is sent, in constant memory. Import it
+    into another deployment with `python -m app.cli kb import <file>`.
+    """
+    try:
+        records = await run_sync(export_records, document_service, rag_service, include_embeddings)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error exporting knowledge base: {str(e)}"
+        )
+    
+    body = iter_ndjson(records)
+    filename = f"knowledge_base_{datetime.now():%Y%m%d_%H%M%S}.ndjson"
+    if compress:
+        body = iter_gzip(body)
+        filename += ".gz"
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.post("/crawl", summary="Start site crawl")
+async def start_crawl(
+    request: CrawlRequest,
+    crawl_service: CrawlService = Depends(get_crawl_service)
+):
+    """
+    Crawl a site into the knowledge base, starting from seed URLs and/or a sitemap.
+    
+    Links are followed within the allowed domains (default: the seed and
+    sitemap hosts) and path prefixes, up to `max_depth` links from a seed and
+    `max_pages` pages. robots.txt is honoured and requests to each host are
+    limited and spaced. Pages are ingested as they are fetched; follow the
+    job with `GET /documents/crawl/{job_id}`.
+    
+    - **seeds**: URLs to start from
+    - **sitemap**: Optional sitemap (or sitemap index) URL
+    - **allowed_domains**: Domains to stay on (subdomains included)
+    - **path_prefixes**: Only follow URLs whose path starts with one of these
+    - **max_depth**: Maximum number of links followed from a seed
+    - **max_pages**: Maximum number of pages to fetch
+    - **per_host_concurrency**: Maximum parallel requests per host
+    - **metadata**: Optional metadata added to every crawled document
+    """
+    try:
+        return await run_sync(crawl_service.start, request.model_dump(mode="json"))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error starting crawl: {str(e)}"
+        )
+
+@router.get("/crawl", summary="List crawl jobs")
+async def list_crawl_jobs(
+    crawl_service: CrawlService = Depends(get_crawl_service)
+):
+    """
+    List crawl jobs, most recent first.
+    """
+    return {"jobs": await run_sync(crawl_service.list_jobs)}
+
+@router.get("/crawl/{job_id}", summary="Get crawl progress")
+async def get_crawl_status(
+    job_id: str,
+    crawl_service: CrawlService = Depends(get_crawl_service)
+):
+    """
+    Get the status and counters of a crawl job.
+    """
+    try:
+        return crawl_service.get_status(job_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Crawl job not found"
+        )
+
+@router.delete("/crawl/{job_id}", summary="Cancel crawl")
+async def cancel_crawl(
+    job_id: str,
+    crawl_service: CrawlService = Depends(get_crawl_service)
+):
+    """
+    Stop a running crawl job. Pages already ingested are kept and the
+    frontier is saved, so the job can be resumed later.
+    """
+    result = crawl_service.cancel(job_id)
+    if result["status"] == "error":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=result["message"]
+        )
+    return result
+
+@router.post("/crawl/{job_id}/resume", summary="Resume crawl")
+async def resume_crawl(
+    job_id: str,
+    crawl_service: CrawlService = Depends(get_crawl_service)
+):
+    """
+    Resume a cancelled, failed or interrupted crawl job from its saved frontier.
+    """
+    try:
+        return await run_sync(crawl_service.resume, job_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Crawl job not found"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
 @router.get("/{doc_id}", response_model=DocumentInfo, summary="Get document by ID")
 async def get_document(
     doc_id: str,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (prefix with - to exclude)"),
     document_service: DocumentService = Depends(get_document_service)
 ):
     """
     Get detailed information about a specific document.
     """
+    projection = parse_fields(fields)
     try:
         document = document_service.get_document(doc_id)
         if not document:
@@ -118,7 +355,7 @@ async def get_document(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Document not found"
             )
-        return document
+        return project_response(document, projection)
     except HTTPException:
         raise
     except Exception as e:
@@ -127,18 +364,99 @@ async def get_document(
             detail=f"Error getting document: {str(e)}"
         )
 
+@router.get("/{doc_id}/chunks", response_model=ChunkListResponse, summary="List document chunks")
+async def list_document_chunks(
+    doc_id: str,
+    offset: int = Query(0, ge=0, description="Index of the first chunk to return"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of chunks to return"),
+    include_norms: bool = Query(False, description="Include the L2 norm of each chunk's embedding"),
+    include_token_counts: bool = Query(False, description="Include an estimated token count per chunk"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (prefix with - to exclude)"),
+    document_service: DocumentService = Depends(get_document_service),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Get the chunks indexed for a document, as stored in the active collection.
+    
+    Chunks are looked up by their IDs in the vector store, one page at a
+    time, to check what was actually indexed when answers look wrong.
+    """
+    projection = parse_fields(fields)
+    doc_data = document_service.documents_db.get(doc_id)
+    if doc_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    try:
+        result = await run_sync(
+            rag_service.get_document_chunks,
+            doc_id,
+            offset=offset,
+            limit=limit,
+            include_norms=include_norms,
+            include_token_counts=include_token_counts,
+            chunk_seq=doc_data.get("chunk_seq")
+        )
+        return project_response(ChunkListResponse(**result), projection)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error listing document chunks: {str(e)}"
+        )
+
+@router.post("/{doc_id}/refresh", summary="Refresh web document")
+async def refresh_web_document(
+    doc_id: str,
+    web_refresh_service: WebRefreshService = Depends(get_web_refresh_service)
+):
+    """
+    Re-fetch a web document now instead of waiting for the refresh schedule.
+    
+    The page is requested with its stored ETag / Last-Modified; it is only
+    re-processed when its content changed, and then only the changed chunks
+    are embedded again. Refused with 409 while a re-index job runs.
+    """
+    try:
+        return await run_sync(web_refresh_service.refresh, doc_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error refreshing web document: {str(e)}"
+        )
+
 @router.delete("/{doc_id}", summary="Delete document")
 async def delete_document(
     doc_id: str,
-    document_service: DocumentService = Depends(get_document_service)
+    document_service: DocumentService = Depends(get_document_service),
+    rag_service: RAGService = Depends(get_rag_service)
 ):
     """
-    Delete a document from the knowledge base.
-    Note: This only removes the document metadata. In a production system,
-    you would also need to remove the chunks from the vector store.
+    Delete a document from the knowledge base, together with its chunks in the
+    active collection and any cached answers generated from them.
     """
     try:
-        result = document_service.delete_document(doc_id)
+        result = await run_sync(document_service.delete_document, doc_id, rag_service)
         if result["status"] == "error":
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -184,7 +502,8 @@ async def get_vectorstore_status(
         return VectorStoreStatus(
             total_documents=doc_stats.get("total_documents", 0),
             total_chunks=rag_stats.get("total_chunks", 0),
-            last_updated=None  # Could be implemented to track last update time
+            last_updated=None,  # Could be implemented to track last update time
+            snapshot_restore=rag_stats.get("snapshot_restore")
         )
     except Exception as e:
         raise HTTPException(
@@ -198,13 +517,102 @@ async def clear_vectorstore(
 ):
     """
     Clear all documents from the vector store.
-    WARNING: This will remove all embedded documents!
+    
+    Queries switch to a new empty collection; the old collection is kept and
+    can be restored with the rollback endpoint.
     """
     try:
-        result = rag_service.clear_vectorstore()
+        result = await run_sync(rag_service.clear_vectorstore)
         return result
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error clearing vector store: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+@router.get("/vectorstore/index", summary="Get active collection")
+async def get_vectorstore_index(
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Get the active and previous (rollback) collections, the settings they were
+    built with, and whether the current settings call for a re-index.
+    """
+    try:
+        return rag_service.get_index_state()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting vector store index: {str(e)}"
+        )
+
+@router.post("/vectorstore/reindex", summary="Start re-index")
+async def start_reindex(
+    chunks_per_minute: Optional[int] = Query(None, ge=0, description="Throttle (0 for none, defaults to settings)"),
+    reindex_service: ReindexService = Depends(get_reindex_service)
+):
+    """
+    Rebuild the vector store from the stored documents under the current
+    chunking and embedding settings.
+    
+    The new collection is built in the background while queries keep using
+    the active one, then activated atomically. The old collection is kept
+    for rollback.
+    """
+    try:
+        return reindex_service.start(chunks_per_minute=chunks_per_minute)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error starting re-index: {str(e)}"
+        )
+
+@router.get("/vectorstore/reindex", summary="Get re-index progress")
+async def get_reindex_status(
+    reindex_service: ReindexService = Depends(get_reindex_service)
+):
+    """
+    Get the progress of the current or last re-index job.
+    """
+    return reindex_service.get_status()
+
+@router.delete("/vectorstore/reindex", summary="Cancel re-index")
+async def cancel_reindex(
+    reindex_service: ReindexService = Depends(get_reindex_service)
+):
+    """
+    Cancel the running re-index job. The active collection is left unchanged.
+    """
+    result = reindex_service.cancel()
+    if result["status"] == "error":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=result["message"]
+        )
+    return result
+
+@router.post("/vectorstore/rollback", summary="Roll back to previous collection")
+async def rollback_vectorstore(
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Switch queries back to the previously active collection.
+    """
+    try:
+        result = await run_sync(rag_service.rollback_index)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error rolling back vector store: {str(e)}"
+        )
+    if result["status"] == "error":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=result["message"]
+        )
+    return result
\ No newline at end of file
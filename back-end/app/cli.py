@@ -0,0 +1,118 @@
+"""Command line tools for operating the RAG back end.
+
+Usage (from the back-end directory):
+
+    python -m app.cli snapshot export <dir> [--dtype float16|float32]
+    python -m app.cli snapshot verify <dir>
+    python -m app.cli snapshot restore <dir>
+    python -m app.cli kb export <file.ndjson[.gz]> [--embeddings]
+    python -m app.cli kb import <file.ndjson[.gz]>
+
+``restore`` imports the snapshot into a new collection and makes it active;
+run it while the server is stopped. To bring up a server straight from a
+snapshot instead, set ``SNAPSHOT_RESTORE_PATH``: the snapshot is then served
+memory-mapped while it is imported in the background.
+
+``kb export`` writes the documents, their original content and their chunks
+as NDJSON (gzip-compressed for a ``.gz`` file name) in constant memory. ``kb
+import`` loads such a file into the active collection; run it while the
+server is stopped (or in multi-worker mode). An interrupted import is resumed
+by running it again: documents already imported are skipped.
+"""
+import argparse
+import json
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+def _snapshot_export(args) -> int:
+    from app.services.rag_service import RAGService
+    from app.services.snapshot import export_snapshot
+
+    rag_service = RAGService()
+    index = rag_service.index
+    manifest = export_snapshot(index.vectorstore._collection, args.path, index.config, dtype=args.dtype)
+    print(json.dumps({key: manifest[key] for key in ("snapshot_id", "collection", "rows", "dimension", "dtype")}, indent=2))
+    return 0
+
+def _snapshot_verify(args) -> int:
+    from app.services.snapshot import SnapshotError, verify_snapshot
+
+    try:
+        manifest = verify_snapshot(args.path)
+    except SnapshotError as e:
+        print(f"Snapshot is invalid: {str(e)}", file=sys.stderr)
+        return 1
+    print(f"Snapshot {manifest['snapshot_id']} is valid ({manifest['rows']} chunks)")
+    return 0
+
+def _snapshot_restore(args) -> int:
+    from app.services.rag_service import RAGService
+
+    rag_service = RAGService()
+    status = rag_service.restore_snapshot(args.path, background=False)
+    print(f"Restored snapshot {status['snapshot_id']} ({status['imported']} chunks) into {rag_service.index.name}")
+    return 0
+
+def _kb_export(args) -> int:
+    from app.services.document_service import DocumentService
+    from app.services.kb_transfer import export_to_file
+    from app.services.rag_service import RAGService
+
+    summary = export_to_file(args.path, DocumentService(), RAGService(), include_embeddings=args.embeddings)
+    print(f"Exported {summary['documents']} documents ({summary['chunks']} chunks) to {args.path}")
+    return 0
+
+def _kb_import(args) -> int:
+    from app.services.document_service import DocumentService
+    from app.services.kb_transfer import ExportFormatError, import_knowledge_base
+    from app.services.rag_service import RAGService
+
+    try:
+        summary = import_knowledge_base(args.path, DocumentService(), RAGService(), batch_size=args.batch_size)
+    except ExportFormatError as e:
+        print(f"Import stopped: {str(e)}. Documents imported so far are kept; run again to resume.", file=sys.stderr)
+        return 1
+    print(json.dumps(summary, indent=2))
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="RAG back end tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snapshot = commands.add_parser("snapshot", help="Export, verify or restore vector index snapshots")
+    snapshot_commands = snapshot.add_subparsers(dest="action", required=True)
+
+    export = snapshot_commands.add_parser("export", help="Export the active collection")
+    export.add_argument("path", help="Output directory (must not contain a snapshot)")
+    export.add_argument("--dtype", choices=["float16", "float32"], default="float16", help="Embedding storage type")
+    export.set_defaults(handler=_snapshot_export)
+
+    verify = snapshot_commands.add_parser("verify", help="Check a snapshot's checksums")
+    verify.add_argument("path", help="Snapshot directory")
+    verify.set_defaults(handler=_snapshot_verify)
+
+    restore = snapshot_commands.add_parser("restore", help="Import a snapshot into a new active collection")
+    restore.add_argument("path", help="Snapshot directory")
+    restore.set_defaults(handler=_snapshot_restore)
+
+    kb = commands.add_parser("kb", help="Export or import the whole knowledge base (NDJSON)")
+    kb_commands = kb.add_subparsers(dest="action", required=True)
+
+    kb_export = kb_commands.add_parser("export", help="Export documents, content and chunks")
+    kb_export.add_argument("path", help="Output file (.ndjson, or .ndjson.gz to compress)")
+    kb_export.add_argument("--embeddings", action="store_true", help="Include chunk embeddings")
+    kb_export.set_defaults(handler=_kb_export)
+
+    kb_import = kb_commands.add_parser("import", help="Import an export into the active collection")
+    kb_import.add_argument("path", help="Export file (plain or gzip-compressed)")
+    kb_import.add_argument("--batch-size", type=int, default=None, help="Chunks written per batch")
+    kb_import.set_defaults(handler=_kb_import)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+from typing import List, Optional
+import logging
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is used without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Content types that are already compressed or must reach the client unbuffered
+_SKIP_CONTENT_TYPES = (
+    "image/", "audio/", "video/", "application/zip", "application/gzip",
+    "application/x-gzip", "application/octet-stream", "text/event-stream"
+)
+
+def _accepted_encodings(scope) -> List[str]:
+    """Encodings the client accepts, from the Accept-Encoding header"""
+    for name, value in scope.get("headers", ()):
+        if name == b"accept-encoding":
+            accepted = []
+            for item in value.decode("latin-1").split(","):
+                encoding, _, params = item.strip().partition(";")
+                params = params.strip().replace(" ", "")
+                if params.startswith("q="):
+                    try:
+                        if float(params[2:]) <= 0:
+                            continue
+                    except ValueError:
+                        continue
+                accepted.append(encoding.strip().lower())
+            return accepted
+    return []
+
+class _Compressor:
+    """Incremental gzip or brotli compressor"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        """Compress a chunk; ``flush`` makes everything so far decodable by the client"""
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + self._brotli.flush() if flush else out
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses responses with brotli or gzip.
+
+    Brotli is preferred when the client accepts it and the ``brotli`` package
+    is installed. Complete responses smaller than ``minimum_size`` are sent
+    as-is since compressing them costs more than it saves; streamed responses
+    are compressed chunk by chunk and flushed after each chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, scope) -> Optional[str]:
+        accepted = _accepted_encodings(scope)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        encoding = self._choose_encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether to compress
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            start = state["start"]
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if state["passthrough"]:
+                await send(message)
+                return
+
+            if start is not None:
+                state["start"] = None
+                headers = list(start.get("headers", ()))
+                if not self._compressible(headers) or (not more_body and len(body) < self.minimum_size):
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = [(name, value) for name, value in headers if name != b"content-length"]
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                headers.append((b"vary", b"Accept-Encoding"))
+                if more_body:
+                    state["compressor"] = compressor
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressor.compress(body, flush=True), "more_body": True})
+                else:
+                    compressed = compressor.finish(body)
+                    headers.append((b"content-length", str(len(compressed)).encode("latin-1")))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                return
+
+            compressor = state["compressor"]
+            if more_body:
+                await send({"type": "http.response.body", "body": compressor.compress(body, flush=True), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body)})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _compressible(headers) -> bool:
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type" and value.decode("latin-1").lower().startswith(_SKIP_CONTENT_TYPES):
+                return False
+        return True
@@ -11,6 +11,12 @@ class Settings(BaseSettings):
     app_version: str = "1.0.0"
     debug: bool = True
     
+    # Multi-process deployment (python -m app.server --workers N)
+    workers: int = 1
+    state_db_path: str = "./data/state.db"
+    chroma_server_host: Optional[str] = None
+    chroma_server_port: int = 8001
+    
     # Google API
     google_api_key: str
     
@@ -25,15 +31,110 @@ class Settings(BaseSettings):
     max_tokens: Optional[int] = 1000
     temperature: float = 0.0
     
+    # Prompt template (see app/prompts/templates)
+    prompt_name: str = "rag"
+    prompt_version: str = "v1"
+    
+    # API rate limiting for Gemini and embedding calls (0 disables a limit)
+    llm_requests_per_minute: int = 15
+    llm_tokens_per_minute: int = 1000000
+    embedding_requests_per_minute: int = 1500
+    embedding_tokens_per_minute: int = 0
+    embedding_batch_size: int = 100
+    
+    # Micro-batching of query embeddings across concurrent requests
+    query_batching_enabled: bool = True
+    query_batch_max_size: int = 32
+    query_batch_window_ms: float = 5.0
+    api_max_concurrency: int = 8
+    api_target_latency: float = 10.0
+    api_max_retries: int = 4
+    api_backoff_base: float = 1.0
+    api_backoff_max: float = 30.0
+    
     # RAG Configuration
     chunk_size: int = 1000
     chunk_overlap: int = 200
     max_retrieval_docs: int = 4
+    # Chunks scoring below this relevance (0-1) are ignored; if none is left the LLM is skipped (0 disables)
+    min_relevance_score: float = 0.0
+    
+    # Intent routing: greetings and small talk get canned answers without retrieval
+    intent_routing_enabled: bool = True
+    intent_min_confidence: float = 0.8
+    
+    # Cache of generated answers, keyed by question and retrieved chunks (0 disables)
+    answer_cache_size: int = 1000
+    answer_cache_ttl: float = 3600.0
+    
+    # Semantic cache of near-duplicate questions: on, observe (only collect similarity stats) or off
+    semantic_cache_mode: str = "observe"
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_size: int = 1000
+    semantic_cache_ttl: float = 3600.0
+    
+    # Reranking: over-fetch candidates, rescore them and keep the best for the LLM
+    reranker: str = "lexical"  # lexical, cross-encoder (needs sentence-transformers) or none
+    rerank_candidates: int = 12
+    rerank_top_k: int = 3
+    rerank_budget_ms: float = 200.0
+    rerank_vector_weight: float = 0.3
+    rerank_cache_size: int = 10000
+    cross_encoder_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    
+    # Process pool for CPU-bound ingestion work (0 shares the CPU cores between server workers)
+    ingest_workers: int = 0
+    parallel_split_min_chars: int = 200000
+    split_shard_chars: int = 100000
+    
+    # File uploads
+    max_upload_size_mb: int = 500
+    pdf_pages_per_task: int = 8
+    ingest_stream_chars: int = 1000000
+    
+    # Re-indexing into a shadow collection (0 means no throttling)
+    reindex_chunks_per_minute: int = 0
+    
+    # Periodic conditional re-fetch of web documents (seconds, 0 disables)
+    web_refresh_interval: int = 86400
+    web_refresh_jitter: float = 0.1  # fraction of the interval documents are spread over
+    web_refresh_spacing: float = 5.0  # maximum random pause between two fetches (seconds)
+    
+    # Web page text extraction: "readability" (main content without boilerplate) or "classes" (WEB_CONTENT_CLASSES)
+    html_extractor: str = "readability"
+    html_extract_pool_min_chars: int = 50000  # larger pages are parsed in the ingestion process pool
+    
+    # Site crawls (POST /documents/crawl)
+    crawl_concurrency: int = 4
+    crawl_per_host_concurrency: int = 2
+    crawl_host_delay: float = 0.5  # minimum seconds between requests to a host (robots.txt Crawl-delay wins if longer)
+    crawl_max_pages: int = 500
+    
+    # Snapshot to bootstrap a fresh node from (served memory-mapped while it is imported)
+    snapshot_restore_path: Optional[str] = None
+    
+    # Response compression (brotli when installed and accepted, gzip otherwise)
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    gzip_level: int = 6
+    brotli_quality: int = 4
+    
+    # Conversations idle this long (seconds) move from memory to compressed files (0 disables)
+    conversation_archive_after: int = 1800
     
     # Paths
     vector_store_path: str = "./vector_store"
     documents_path: str = "./data/documents"
-    
+    conversation_archive_path: str = "./data/conversations"
+    profiles_path: str = "./profiles"
+
+    # Profiling (opt-in, and only available when debug is enabled)
+    profiling_enabled: bool = False
+    profile_header: str = "X-Profile"
+    profile_query_param: str = "profile"
+    profile_sample_interval: float = 0.001
+    max_profiles: int = 50
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,27 +1,63 @@
-from fastapi import Depends
+import os
+from functools import lru_cache
 from app.core.config import settings
 from app.services.rag_service import RAGService
 from app.services.document_service import DocumentService
 from app.services.chat_service import ChatService
+from app.services.reindex_service import ReindexService
+from app.services.web_refresh import WebRefreshService
+from app.services.crawl_service import CrawlService
+
+# Services are created once per process and shared by all requests
 
 # Dependency to get RAG service
+@lru_cache(maxsize=None)
 def get_rag_service() -> RAGService:
     """Get RAG service instance"""
     return RAGService()
 
 # Dependency to get document service
+@lru_cache(maxsize=None)
 def get_document_service() -> DocumentService:
     """Get document service instance"""
     return DocumentService()
 
 # Dependency to get chat service
-def get_chat_service(
-    rag_service: RAGService = Depends(get_rag_service)
-) -> ChatService:
+@lru_cache(maxsize=None)
+def get_chat_service() -> ChatService:
     """Get chat service instance"""
-    return ChatService(rag_service)
+    return ChatService(get_rag_service())
+
+# Dependency to get re-index service
+@lru_cache(maxsize=None)
+def get_reindex_service() -> ReindexService:
+    """Get re-index service instance"""
+    return ReindexService(get_rag_service(), get_document_service())
+
+# Dependency to get the web document refresh scheduler
+@lru_cache(maxsize=None)
+def get_web_refresh_service() -> WebRefreshService:
+    """Get web refresh service instance"""
+    return WebRefreshService(
+        get_document_service(),
+        get_rag_service(),
+        get_reindex_service(),
+        interval=settings.web_refresh_interval,
+        jitter=settings.web_refresh_jitter,
+        spacing=settings.web_refresh_spacing
+    )
+
+# Dependency to get the site crawler
+@lru_cache(maxsize=None)
+def get_crawl_service() -> CrawlService:
+    """Get crawl service instance"""
+    return CrawlService(
+        get_document_service(),
+        get_rag_service(),
+        jobs_path=os.path.join(settings.documents_path, "crawls")
+    )
 
 # Dependency to get settings
 def get_settings():
     """Get application settings"""
-    return settings 
\ No newline at end of file
+    return settings 
@@ -0,0 +1,291 @@
+from typing import List, Dict, Any, Optional
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".speedscope.json"
+META_SUFFIX = ".meta.json"
+
+_REQUEST_ID_PATTERN = re.compile(r"[^A-Za-z0-9_.-]")
+_TRUTHY = {"1", "true", "yes", "on"}
+
+# Session of the request currently being profiled (None for every other request)
+_current_session: contextvars.ContextVar = contextvars.ContextVar("profiling_session", default=None)
+
+
+class SamplingSession:
+    """Sampling profiler for a single request.
+
+    A background thread snapshots the stacks of the tracked threads (the
+    event loop thread plus any threadpool worker running code for the
+    request) and records them in speedscope's "sampled" format.
+    """
+
+    def __init__(self, request_id: str, interval: float):
+        self.request_id = request_id
+        self.interval = interval
+        self.thread_ids = {threading.get_ident()}
+        self.frames: List[Dict[str, Any]] = []
+        self.frame_index: Dict[Any, int] = {}
+        self.samples: Dict[int, List[List[int]]] = defaultdict(list)
+        self.weights: Dict[int, List[float]] = defaultdict(list)
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{request_id}", daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    @contextmanager
+    def track_current_thread(self):
+        """Include the calling thread in the samples while the block runs"""
+        thread_id = threading.get_ident()
+        self.thread_ids.add(thread_id)
+        try:
+            yield
+        finally:
+            self.thread_ids.discard(thread_id)
+
+    def _frame_id(self, code) -> int:
+        index = self.frame_index.get(code)
+        if index is None:
+            index = len(self.frames)
+            self.frame_index[code] = index
+            self.frames.append({
+                "name": code.co_name,
+                "file": code.co_filename,
+                "line": code.co_firstlineno
+            })
+        return index
+
+    def _run(self):
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = now - last
+            last = now
+            current_frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                frame = current_frames.get(thread_id)
+                if frame is None or thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_id(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[thread_id].append(stack)
+                self.weights[thread_id].append(weight)
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        """Render the collected samples as a speedscope document"""
+        profiles = []
+        for thread_id, samples in self.samples.items():
+            weights = self.weights[thread_id]
+            profiles.append({
+                "type": "sampled",
+                "name": f"{name} (thread {thread_id})",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "rag-chatbot-profiler",
+            "shared": {"frames": self.frames},
+            "profiles": profiles
+        }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests which explicitly opt in.
+
+    Requests opt in with the configured header or query parameter. Requests
+    that don't opt in are passed straight through, and at most one request is
+    profiled at a time.
+    """
+
+    def __init__(
+        self,
+        app,
+        profiles_path: str,
+        header_name: str = "X-Profile",
+        query_param: str = "profile",
+        interval: float = 0.001,
+        max_profiles: int = 50
+    ):
+        self.app = app
+        self.profiles_path = Path(profiles_path)
+        self.header_name = header_name.lower().encode("latin-1")
+        self.query_param = query_param
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not self._lock.acquire(blocking=False):
+            # Another request is already being profiled
+            await self.app(scope, receive, self._with_headers(send, {b"x-profile-status": b"busy"}))
+            return
+
+        request_id = self._request_id(scope)
+        session = SamplingSession(request_id, self.interval)
+        status_code = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code["value"] = message["status"]
+            await send(message)
+
+        token = _current_session.set(session)
+        session.start()
+        try:
+            await self.app(
+                scope,
+                receive,
+                self._with_headers(send_wrapper, {
+                    b"x-request-id": request_id.encode("latin-1"),
+                    b"x-profile-status": b"recorded"
+                })
+            )
+        finally:
+            session.stop()
+            _current_session.reset(token)
+            self._lock.release()
+            try:
+                self._save(session, scope, status_code.get("value"))
+            except Exception as e:
+                logger.error(f"Error saving profile for request {request_id}: {str(e)}")
+
+    def _wants_profile(self, scope) -> bool:
+        for name, value in scope.get("headers", ()):
+            if name == self.header_name:
+                return value.decode("latin-1").strip().lower() in _TRUTHY
+        query_string = scope.get("query_string", b"")
+        if query_string and self.query_param.encode("latin-1") in query_string:
+            values = parse_qs(query_string.decode("latin-1")).get(self.query_param, [])
+            return any(value.strip().lower() in _TRUTHY for value in values)
+        return False
+
+    def _request_id(self, scope) -> str:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = _REQUEST_ID_PATTERN.sub("", value.decode("latin-1"))[:64]
+                if request_id:
+                    return request_id
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def _with_headers(send, headers: Dict[bytes, bytes]):
+        async def wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + list(headers.items())
+            await send(message)
+        return wrapper
+
+    def _save(self, session: SamplingSession, scope, status_code: Optional[int]):
+        """Write the profile and its metadata, then prune old profiles"""
+        self.profiles_path.mkdir(parents=True, exist_ok=True)
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{session.request_id}"
+        label = f"{scope['method']} {scope['path']}"
+
+        with open(self.profiles_path / f"{name}{PROFILE_SUFFIX}", "w", encoding="utf-8") as f:
+            json.dump(session.to_speedscope(label), f)
+
+        meta = {
+            "profile_id": name,
+            "request_id": session.request_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status_code": status_code,
+            "duration": round(session.duration, 6),
+            "sample_count": sum(len(samples) for samples in session.samples.values()),
+            "created_at": datetime.now().isoformat()
+        }
+        with open(self.profiles_path / f"{name}{META_SUFFIX}", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        logger.info(f"Profile {name} recorded for {label} ({session.duration:.3f}s)")
+        self._prune()
+
+    def _prune(self):
+        profiles = sorted(self.profiles_path.glob(f"*{PROFILE_SUFFIX}"), key=os.path.getmtime, reverse=True)
+        for path in profiles[self.max_profiles:]:
+            profile_id = path.name[:-len(PROFILE_SUFFIX)]
+            path.unlink(missing_ok=True)
+            (self.profiles_path / f"{profile_id}{META_SUFFIX}").unlink(missing_ok=True)
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run a blocking function in the threadpool.
+
+    When the current request is being profiled, the worker thread is
+    sampled as well; otherwise this is a plain ``run_in_threadpool``.
+    """
+    session = _current_session.get()
+    if session is None:
+        return await run_in_threadpool(func, *args, **kwargs)
+
+    def tracked():
+        with session.track_current_thread():
+            return func(*args, **kwargs)
+
+    return await run_in_threadpool(tracked)
+
+
+def list_profiles(profiles_path: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """List recorded profiles, most recent first"""
+    path = Path(profiles_path)
+    if not path.exists():
+        return []
+
+    profiles = []
+    for meta_file in sorted(path.glob(f"*{META_SUFFIX}"), key=os.path.getmtime, reverse=True)[:limit]:
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            profile_file = path / f"{meta['profile_id']}{PROFILE_SUFFIX}"
+            meta["size_bytes"] = profile_file.stat().st_size if profile_file.exists() else 0
+            profiles.append(meta)
+        except Exception as e:
+            logger.error(f"Error reading profile metadata {meta_file.name}: {str(e)}")
+    return profiles
+
+
+def get_profile_path(profiles_path: str, profile_id: str) -> Optional[Path]:
+    """Resolve a profile ID to its file, refusing anything outside the profiles directory"""
+    if _REQUEST_ID_PATTERN.sub("", profile_id) != profile_id:
+        return None
+    path = Path(profiles_path) / f"{profile_id}{PROFILE_SUFFIX}"
+    return path if path.exists() else None
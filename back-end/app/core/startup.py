@@ -0,0 +1,37 @@
+from typing import Dict, List, Optional, Tuple
+from contextlib import contextmanager
+import time
+
+class StartupTimer:
+    """Collects the duration of named startup phases"""
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.phases: List[Tuple[str, float]] = []
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as a startup phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def record(self, name: str, duration: float):
+        """Record a phase that was timed elsewhere"""
+        self.phases.append((name, duration))
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(duration, 4) for name, duration in self.phases}
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def report(self) -> str:
+        """Format the phases as a human readable report (dotted names are sub-phases)"""
+        names = [("    " if "." in name else "  ") + name for name, _ in self.phases]
+        width = max((len(name) for name in names), default=0)
+        lines = [f"{name.ljust(width)}  {duration * 1000:8.1f} ms" for name, (_, duration) in zip(names, self.phases)]
+        lines.append(f"{'  total'.ljust(width)}  {self.total() * 1000:8.1f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,178 @@
+from typing import Any, Callable, Iterator, List, MutableMapping, Tuple
+from functools import lru_cache
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class StateStore:
+    """JSON key-value store in SQLite, shared by all worker processes.
+
+    Values live in namespaces (``documents``, ``conversations``, ...). Each
+    thread uses its own connection; the database runs in WAL mode so readers
+    never block the writer, and ``update`` runs read-modify-write in one
+    immediate transaction so concurrent workers can't lose each other's
+    changes.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    class _Transaction:
+        def __init__(self, conn: sqlite3.Connection):
+            self.conn = conn
+
+        def __enter__(self) -> sqlite3.Connection:
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self.conn
+
+        def __exit__(self, exc_type, exc, tb):
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+    def _transaction(self) -> "_Transaction":
+        return self._Transaction(self._connection())
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        row = self._connection().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, namespace: str, key: str, value: Any):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False, default=str), time.time())
+        )
+
+    def add(self, namespace: str, key: str, value: Any) -> bool:
+        """Insert only if the key is absent; returns whether it was inserted"""
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False, default=str), time.time())
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, namespace: str, key: str) -> bool:
+        cursor = self._connection().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+        return cursor.rowcount > 0
+
+    def update(self, namespace: str, key: str, fn: Callable[[Any], Any]) -> Any:
+        """Atomically replace a value with ``fn(current)`` (current is None if absent)"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+            value = fn(json.loads(row[0]) if row else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False, default=str), time.time())
+            )
+            return value
+
+    def increment(self, namespace: str, key: str, amount: int = 1) -> int:
+        """Atomically add to an integer value (created as 0 if absent); returns the new value"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET "
+                "value = CAST(value AS INTEGER) + excluded.value, updated_at = excluded.updated_at",
+                (namespace, key, amount, time.time())
+            )
+            row = conn.execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+            return int(row[0])
+
+    def keys(self, namespace: str) -> List[str]:
+        return [row[0] for row in self._connection().execute(
+            "SELECT key FROM kv WHERE namespace = ? ORDER BY key", (namespace,)
+        )]
+
+    def items(self, namespace: str) -> List[Tuple[str, Any]]:
+        return [(row[0], json.loads(row[1])) for row in self._connection().execute(
+            "SELECT key, value FROM kv WHERE namespace = ? ORDER BY key", (namespace,)
+        )]
+
+    def count(self, namespace: str) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM kv WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def clear(self, namespace: str) -> int:
+        cursor = self._connection().execute("DELETE FROM kv WHERE namespace = ?", (namespace,))
+        return cursor.rowcount
+
+class SharedDict(MutableMapping):
+    """Dict view of one namespace of the state store.
+
+    Values are JSON copies: mutating a value read from it does nothing until
+    it is assigned back.
+    """
+
+    def __init__(self, store: StateStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.store.get(self.namespace, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.store.get(self.namespace, key, default)
+
+    def __setitem__(self, key: str, value: Any):
+        self.store.set(self.namespace, key, value)
+
+    def __delitem__(self, key: str):
+        if not self.store.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.store.get(self.namespace, key, _MISSING) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.keys(self.namespace))
+
+    def __len__(self) -> int:
+        return self.store.count(self.namespace)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return self.store.items(self.namespace)
+
+    def values(self) -> List[Any]:
+        return [value for _, value in self.store.items(self.namespace)]
+
+    def clear(self):
+        self.store.clear(self.namespace)
+
+_MISSING = object()
+
+def shared_state_enabled() -> bool:
+    """Whether state must be shared between worker processes"""
+    return settings.workers > 1
+
+@lru_cache(maxsize=None)
+def get_state_store() -> StateStore:
+    """Get the process-wide handle on the shared state database"""
+    logger.info(f"Using shared state database {settings.state_db_path}")
+    return StateStore(settings.state_db_path)
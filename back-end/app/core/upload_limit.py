@@ -0,0 +1,70 @@
+from typing import Iterable, Optional
+import json
+import logging
+
+from starlette.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Allowance for the multipart boundaries, part headers and small form fields around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope.get("headers", ()):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+class UploadLimitMiddleware:
+    """ASGI middleware that caps the request body size of upload endpoints.
+
+    Form bodies are parsed (and spooled to disk) before the route runs, so the
+    limit has to be applied here: a request whose Content-Length is over the
+    limit is refused with 413 before any of its body is read, and a body
+    without one (chunked) is counted as it arrives and aborted with 413 as
+    soon as it goes over. The exact file size is checked again when the
+    upload is copied to disk.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.max_body = max_bytes + MULTIPART_OVERHEAD
+        self.detail = f"File is larger than {max_bytes // (1024 * 1024)} MB"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = _content_length(scope)
+        if length is not None and length > self.max_body:
+            logger.info(f"Refused upload of {length} bytes to {scope['path']}")
+            body = json.dumps({"detail": self.detail}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"connection", b"close")
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def receive_wrapper():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, receive_wrapper, send)
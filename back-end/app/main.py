@@ -1,12 +1,20 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 import logging
 import sys
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.api.routes import chat, documents
+from app.core.startup import StartupTimer
+from app.core.profiling import ProfilingMiddleware
+from app.core.compression import CompressionMiddleware
+from app.core.upload_limit import UploadLimitMiddleware
+from app.utils.process_pool import shutdown_process_pool
+from app.api.routes import chat, documents, admin
 
 # Configure logging
 logging.basicConfig(
@@ -19,6 +27,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_import_duration = time.perf_counter() - _import_started
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
@@ -28,12 +38,33 @@ async def lifespan(app: FastAPI):
     logger.info(f"Version: {settings.app_version}")
     logger.info(f"Debug: {settings.debug}")
     
+    web_refresh_service = None
+    chat_service = None
     try:
-        # Test Google API connection on startup
-        from app.services.rag_service import RAGService
-        rag_service = RAGService()
+        timer = StartupTimer(started_at=_import_started)
+        timer.record("imports", _import_duration)
+        
+        # Warm up the shared services so the first request doesn't pay for it
+        from app.core.dependencies import (
+            get_rag_service, get_document_service, get_chat_service, get_web_refresh_service
+        )
+        with timer.phase("rag_service"):
+            rag_service = get_rag_service()
+        for name, duration in rag_service.init_timings.items():
+            timer.record(f"rag_service.{name}", duration)
         logger.info("RAG service initialized successfully")
         
+        with timer.phase("document_service"):
+            get_document_service()
+        with timer.phase("chat_service"):
+            chat_service = get_chat_service()
+        chat_service.conversations.start()
+        web_refresh_service = get_web_refresh_service()
+        web_refresh_service.start()
+        
+        app.state.startup_timings = timer.as_dict()
+        logger.info(f"Startup timing report:\n{timer.report()}")
+        
         yield
         
     except Exception as e:
@@ -42,6 +73,11 @@ async def lifespan(app: FastAPI):
     finally:
         # Shutdown
         logger.info("Shutting down RAG Chatbot API...")
+        if web_refresh_service is not None:
+            web_refresh_service.stop()
+        if chat_service is not None:
+            chat_service.conversations.stop()
+        shutdown_process_pool()
 
 # Create FastAPI app
 app = FastAPI(
@@ -65,7 +101,15 @@ app = FastAPI(
     
     """,
     debug=settings.debug,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# Refuse oversized uploads before their body is read (added first so CORS headers still apply)
+app.add_middleware(
+    UploadLimitMiddleware,
+    paths=["/api/v1/documents/upload"],
+    max_bytes=settings.max_upload_size_mb * 1024 * 1024
 )
 
 # Add CORS middleware
@@ -77,9 +121,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large responses
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.gzip_level,
+        brotli_quality=settings.brotli_quality
+    )
+
+# Opt-in per-request profiling (debug only, not installed otherwise)
+if settings.debug and settings.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        profiles_path=settings.profiles_path,
+        header_name=settings.profile_header,
+        query_param=settings.profile_query_param,
+        interval=settings.profile_sample_interval,
+        max_profiles=settings.max_profiles
+    )
+
 # Include routers
 app.include_router(chat.router, prefix="/api/v1")
 app.include_router(documents.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
 
 @app.get("/", tags=["health"])
 async def root():
@@ -99,12 +164,21 @@ async def health_check():
     try:
         # Basic health check
         # Could add more sophisticated checks like DB connectivity, etc.
-        return {
+        health = {
             "status": "healthy",
             "app_name": settings.app_name,
             "version": settings.app_version,
             "debug": settings.debug
         }
+        
+        # A snapshot restore that failed leaves the node serving a read-only (or its previous) index
+        from app.core.dependencies import get_rag_service
+        restore = get_rag_service().restore_status
+        if restore is not None:
+            health["snapshot_restore"] = restore
+            if restore["status"] in ("failed", "retrying"):
+                health["status"] = "degraded"
+        return health
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         raise HTTPException(status_code=503, detail="Service unavailable")
@@ -36,6 +36,7 @@ class ChatResponse(BaseModel):
     conversation_id: str = Field(..., description="Conversation ID")
     sources: Optional[List[SourceDocument]] = Field(None, description="Source documents used")
     processing_time: Optional[float] = Field(None, description="Processing time in seconds")
+    cached: bool = Field(False, description="Whether the answer was served from the answer cache")
     timestamp: datetime = Field(default_factory=datetime.now)
     
     class Config:
@@ -51,6 +52,7 @@ class ChatResponse(BaseModel):
                     }
                 ],
                 "processing_time": 1.23,
+                "cached": False,
                 "timestamp": "2024-01-01T12:00:00Z"
             }
         }
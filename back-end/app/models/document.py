@@ -59,10 +59,34 @@ class DocumentInfo(BaseModel):
     doc_type: DocumentType = Field(..., description="Document type")
     status: DocumentStatus = Field(..., description="Processing status")
     chunk_count: Optional[int] = Field(None, description="Number of chunks created")
+    content_hash: Optional[str] = Field(None, description="SHA-256 of the stored original content")
+    content_size: Optional[int] = Field(None, description="Size of the original content in bytes")
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
 
+class CrawlRequest(BaseModel):
+    """Site crawl request"""
+    seeds: List[HttpUrl] = Field(default_factory=list, description="URLs to start from")
+    sitemap: Optional[HttpUrl] = Field(None, description="Sitemap (or sitemap index) whose URLs are crawled")
+    allowed_domains: Optional[List[str]] = Field(None, description="Domains to stay within (defaults to the seed and sitemap hosts)")
+    path_prefixes: Optional[List[str]] = Field(None, description="Only follow URLs whose path starts with one of these")
+    max_depth: int = Field(2, ge=0, le=10, description="Link depth from the seeds (0 crawls only the seeds)")
+    max_pages: Optional[int] = Field(None, ge=1, le=100000, description="Maximum number of pages to fetch")
+    per_host_concurrency: Optional[int] = Field(None, ge=1, le=16, description="Concurrent requests per host")
+    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Metadata added to every crawled document")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "seeds": ["https://docs.example.com/guide/"],
+                "path_prefixes": ["/guide/"],
+                "max_depth": 3,
+                "max_pages": 200,
+                "metadata": {"category": "docs"}
+            }
+        }
+
 class DocumentResponse(BaseModel):
     """Document operation response"""
     doc_id: str = Field(..., description="Document ID")
@@ -90,12 +114,23 @@ class ChunkInfo(BaseModel):
     content: str = Field(..., description="Chunk content")
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
     embedding_status: Optional[str] = Field(None, description="Embedding status")
+    embedding_norm: Optional[float] = Field(None, description="L2 norm of the stored embedding")
+    token_count: Optional[int] = Field(None, description="Estimated number of tokens")
+
+class ChunkListResponse(BaseModel):
+    """One page of a document's chunks"""
+    doc_id: str = Field(..., description="Parent document ID")
+    chunks: List[ChunkInfo] = Field(..., description="Chunks in this page")
+    total: int = Field(..., description="Total number of chunks of the document")
+    offset: int = Field(..., description="Index of the first chunk in this page")
+    limit: int = Field(..., description="Maximum number of chunks per page")
 
 class VectorStoreStatus(BaseModel):
     """Vector store status"""
     total_documents: int = Field(..., description="Total documents in store")
     total_chunks: int = Field(..., description="Total chunks in store")
     last_updated: Optional[datetime] = Field(None, description="Last update time")
+    snapshot_restore: Optional[Dict[str, Any]] = Field(None, description="Progress or failure of a snapshot restore")
     
     class Config:
         json_schema_extra = {
@@ -0,0 +1,2 @@
+# Versioned prompt templates shipped with the application
+from app.prompts.registry import load_prompt_template, list_prompt_templates
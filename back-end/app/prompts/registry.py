@@ -0,0 +1,31 @@
+from typing import Dict, List
+from functools import lru_cache
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Templates live next to this module as ``<name>.<version>.txt``
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+
+@lru_cache(maxsize=None)
+def load_prompt_template(name: str, version: str) -> str:
+    """Load a prompt template by name and version"""
+    path = TEMPLATES_DIR / f"{name}.{version}.txt"
+    if not path.exists():
+        available = ", ".join(
+            f"{prompt}@{v}" for prompt, versions in list_prompt_templates().items() for v in versions
+        )
+        raise ValueError(f"Unknown prompt template {name}@{version} (available: {available})")
+
+    template = path.read_text(encoding="utf-8")
+    logger.info(f"Loaded prompt template {name}@{version}")
+    return template
+
+def list_prompt_templates() -> Dict[str, List[str]]:
+    """List available prompt templates and their versions"""
+    templates: Dict[str, List[str]] = {}
+    for path in sorted(TEMPLATES_DIR.glob("*.txt")):
+        name, _, version = path.stem.rpartition(".")
+        templates.setdefault(name, []).append(version)
+    return templates
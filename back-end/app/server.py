@@ -0,0 +1,86 @@
+"""Multi-process launcher.
+
+Usage (from the back-end directory):
+
+    python -m app.server --workers 4
+
+With more than one worker, each uvicorn worker process would otherwise open
+the Chroma SQLite/HNSW files itself. Instead a single Chroma server process
+owns the vector store (the only writer) and every worker talks to it over
+HTTP. Documents, conversations and re-index jobs live in a shared SQLite
+state database. Point ``CHROMA_SERVER_HOST`` at an existing Chroma server
+to skip starting one here.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from app.core.config import settings
+from app.utils.process_pool import available_cpus
+
+logger = logging.getLogger(__name__)
+
+CHROMA_STARTUP_TIMEOUT = 60.0
+
+def start_chroma_server(path: str, host: str, port: int) -> subprocess.Popen:
+    """Start a Chroma server over the vector store directory and wait until it answers"""
+    import chromadb
+
+    process = subprocess.Popen([
+        sys.executable, "-m", "chromadb.cli.cli", "run",
+        "--path", path, "--host", host, "--port", str(port)
+    ])
+    deadline = time.monotonic() + CHROMA_STARTUP_TIMEOUT
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"Chroma server exited with code {process.returncode}")
+        try:
+            chromadb.HttpClient(host=host, port=port).heartbeat()
+            logger.info(f"Chroma server is up at {host}:{port} (pid {process.pid})")
+            return process
+        except Exception:
+            if time.monotonic() > deadline:
+                process.terminate()
+                raise RuntimeError("Chroma server did not start in time")
+            time.sleep(0.5)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.server", description="Run the API with several worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=settings.workers if settings.workers > 1 else available_cpus(),
+        help="Worker processes (default: WORKERS, or one per CPU)"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    import uvicorn
+
+    # Settings are read from the environment by every worker process
+    os.environ["WORKERS"] = str(args.workers)
+    chroma_process = None
+    try:
+        if args.workers > 1 and not settings.chroma_server_host:
+            chroma_process = start_chroma_server(
+                os.path.abspath(settings.vector_store_path), "127.0.0.1", settings.chroma_server_port
+            )
+            os.environ["CHROMA_SERVER_HOST"] = "127.0.0.1"
+            os.environ["CHROMA_SERVER_PORT"] = str(settings.chroma_server_port)
+
+        logger.info(f"Starting {args.workers} API workers on {args.host}:{args.port}")
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers, log_level="info")
+        return 0
+    finally:
+        if chroma_process is not None:
+            chroma_process.terminate()
+            try:
+                chroma_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                chroma_process.kill()
+
+if __name__ == "__main__":
+    sys.exit(main())
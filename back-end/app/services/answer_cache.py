@@ -0,0 +1,95 @@
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class AnswerCache:
+    """LRU + TTL cache of generated answers, indexed by the chunks they came from.
+
+    Keys include the sorted IDs of the chunks the answer was generated from,
+    so a changed knowledge base simply retrieves a different chunk set and
+    misses. ``invalidate_chunks`` additionally drops every answer built on a
+    deleted or re-ingested chunk right away.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[str, float, Tuple[str, ...]]]" = OrderedDict()
+        self._keys_by_chunk: Dict[str, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._invalidated = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._remove(key)
+                self._expired += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, answer: str, chunk_ids: Iterable[str]):
+        if self.max_size <= 0:
+            return
+        chunk_ids = tuple(chunk_ids)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (answer, time.monotonic() + self.ttl, chunk_ids)
+            for chunk_id in chunk_ids:
+                self._keys_by_chunk.setdefault(chunk_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: Hashable):
+        _, _, chunk_ids = self._entries.pop(key)
+        for chunk_id in chunk_ids:
+            keys = self._keys_by_chunk.get(chunk_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_chunk[chunk_id]
+
+    def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Drop the answers generated from any of these chunks"""
+        with self._lock:
+            keys = set()
+            for chunk_id in chunk_ids:
+                keys.update(self._keys_by_chunk.get(chunk_id, ()))
+            for key in keys:
+                self._remove(key)
+            self._invalidated += len(keys)
+            return len(keys)
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._keys_by_chunk.clear()
+            return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "expired": self._expired,
+                "invalidated": self._invalidated
+            }
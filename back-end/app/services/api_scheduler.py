@@ -0,0 +1,312 @@
+from typing import Any, Callable, Dict, List, Optional
+from contextlib import contextmanager
+from enum import IntEnum
+from functools import lru_cache
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """Scheduling priority of an API call (lower goes first)"""
+    CHAT = 0
+    INGESTION = 1
+
+_current_priority: contextvars.ContextVar = contextvars.ContextVar("api_priority", default=Priority.CHAT)
+
+@contextmanager
+def api_priority(priority: Priority):
+    """Run the enclosed API calls with the given priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+_RATE_LIMIT_MARKERS = ("429", "resource has been exhausted", "resourceexhausted", "quota", "rate limit")
+_TRANSIENT_NAMES = {
+    "ServiceUnavailable", "InternalServerError", "DeadlineExceeded",
+    "TimeoutError", "Timeout", "ConnectionError", "ConnectTimeout", "ReadTimeout"
+}
+
+def _exception_chain(exc: BaseException):
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """Whether the error (or its cause) is a quota / HTTP 429 response"""
+    for error in _exception_chain(exc):
+        name = type(error).__name__.lower()
+        if "resourceexhausted" in name or "ratelimit" in name or getattr(error, "code", None) == 429:
+            return True
+        message = str(error).lower()
+        if any(marker in message for marker in _RATE_LIMIT_MARKERS):
+            return True
+    return False
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Whether the error is worth retrying"""
+    if is_rate_limit_error(exc):
+        return True
+    return any(type(error).__name__ in _TRANSIENT_NAMES for error in _exception_chain(exc))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute`` tokens per minute"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` tokens are available"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+class APILane:
+    """Rate and concurrency limits for one upstream API.
+
+    Calls wait in a priority queue and are admitted in priority order once
+    the request and token buckets allow it and a concurrency slot is free.
+    The concurrency limit adapts: it grows slowly while calls are fast,
+    shrinks when latency exceeds the target and halves on a 429.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        max_concurrency: int = 8,
+        target_latency: float = 10.0
+    ):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.target_latency = target_latency
+        self.active = 0
+        self._waiting: List = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "failures": 0, "total_latency": 0.0, "total_wait": 0.0}
+
+    def acquire(self, priority: Priority, tokens: int = 0):
+        """Block until the call may proceed"""
+        entry = (int(priority), next(self._sequence))
+        enqueued_at = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    if self._waiting[0] == entry and self.active < int(self.limit):
+                        now = time.monotonic()
+                        delay = 0.0
+                        if self.request_bucket:
+                            delay = max(delay, self.request_bucket.wait_time(1, now))
+                        if self.token_bucket and tokens:
+                            delay = max(delay, self.token_bucket.wait_time(tokens, now))
+                        if delay <= 0:
+                            if self.request_bucket:
+                                self.request_bucket.consume(1)
+                            if self.token_bucket and tokens:
+                                self.token_bucket.consume(tokens)
+                            heapq.heappop(self._waiting)
+                            self.active += 1
+                            self.stats["total_wait"] += now - enqueued_at
+                            self._condition.notify_all()
+                            return
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()
+                raise
+
+    def release(self, latency: float, throttled: bool = False):
+        """Free the slot and adapt the concurrency limit"""
+        with self._condition:
+            self.active -= 1
+            self.stats["calls"] += 1
+            self.stats["total_latency"] += latency
+            if throttled:
+                self.stats["throttled"] += 1
+                self.limit = max(1.0, self.limit / 2)
+            elif latency > self.target_latency:
+                self.limit = max(1.0, self.limit * 0.9)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            calls = self.stats["calls"]
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "active": self.active,
+                "waiting": len(self._waiting),
+                "calls": calls,
+                "throttled": self.stats["throttled"],
+                "retries": self.stats["retries"],
+                "failures": self.stats["failures"],
+                "average_latency": round(self.stats["total_latency"] / calls, 4) if calls else 0.0,
+                "average_wait": round(self.stats["total_wait"] / calls, 4) if calls else 0.0
+            }
+
+class APIScheduler:
+    """Central scheduler for outgoing LLM and embedding API calls"""
+
+    def __init__(
+        self,
+        lanes: Dict[str, APILane],
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0
+    ):
+        self.lanes = lanes
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def call(
+        self,
+        lane_name: str,
+        fn: Callable[..., Any],
+        *args,
+        tokens: int = 0,
+        priority: Optional[Priority] = None,
+        **kwargs
+    ) -> Any:
+        """Run ``fn`` once the lane admits it, retrying transient errors with jittered backoff"""
+        lane = self.lanes[lane_name]
+        if priority is None:
+            priority = _current_priority.get()
+
+        attempt = 0
+        while True:
+            lane.acquire(priority, tokens)
+            start = time.monotonic()
+            throttled = False
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                if attempt >= self.max_retries or not is_transient_error(e):
+                    lane.stats["failures"] += 1
+                    raise
+                error = e
+            finally:
+                lane.release(time.monotonic() - start, throttled)
+
+            # Full jitter exponential backoff
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            attempt += 1
+            lane.stats["retries"] += 1
+            logger.warning(
+                f"{lane_name} API call failed ({type(error).__name__}), retry {attempt}/{self.max_retries} in {delay:.2f}s"
+            )
+            time.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get per-lane scheduling statistics"""
+        return {name: lane.get_stats() for name, lane in self.lanes.items()}
+
+def _per_worker(limit: int) -> int:
+    """Share of a per-minute quota for one of ``settings.workers`` processes"""
+    if limit <= 0:
+        return limit
+    return max(1, limit // max(1, settings.workers))
+
+@lru_cache(maxsize=None)
+def get_api_scheduler() -> APIScheduler:
+    """Get the process-wide API scheduler"""
+    # Quotas are per API key, so worker processes split them
+    return APIScheduler(
+        lanes={
+            "llm": APILane(
+                "llm",
+                requests_per_minute=_per_worker(settings.llm_requests_per_minute),
+                tokens_per_minute=_per_worker(settings.llm_tokens_per_minute),
+                max_concurrency=settings.api_max_concurrency,
+                target_latency=settings.api_target_latency
+            ),
+            "embedding": APILane(
+                "embedding",
+                requests_per_minute=_per_worker(settings.embedding_requests_per_minute),
+                tokens_per_minute=_per_worker(settings.embedding_tokens_per_minute),
+                max_concurrency=settings.api_max_concurrency,
+                target_latency=settings.api_target_latency
+            )
+        },
+        max_retries=settings.api_max_retries,
+        backoff_base=settings.api_backoff_base,
+        backoff_max=settings.api_backoff_max
+    )
+
+class ScheduledEmbeddings(Embeddings):
+    """Embeddings wrapper that sends every API call through the scheduler.
+
+    When a query batcher is attached, single query embeddings from
+    concurrent requests are grouped into batched calls.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        scheduler: APIScheduler,
+        batch_size: int = 100,
+        query_batcher=None
+    ):
+        self.embeddings = embeddings
+        self.scheduler = scheduler
+        self.batch_size = batch_size
+        self.query_batcher = query_batcher
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Schedule batches separately so chat calls can go in between
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            vectors.extend(self.scheduler.call(
+                "embedding",
+                self.embeddings.embed_documents,
+                batch,
+                tokens=sum(estimate_tokens(text) for text in batch)
+            ))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_batcher is not None:
+            return self.query_batcher.embed(text)
+        return self.scheduler.call("embedding", self.embeddings.embed_query, text, tokens=estimate_tokens(text))
@@ -4,8 +4,14 @@ import uuid
 import time
 from datetime import datetime
 
+from app.core.config import settings
 from app.services.rag_service import RAGService
-from app.models.chat import ChatMessage, ChatResponse, SourceDocument, ConversationHistory
+from app.services.intent_router import QUESTION, IntentRouter
+from app.services.conversation_store import create_conversation_store
+from app.services.usage_stats import get_usage_stats
+from app.models.chat import ChatResponse, SourceDocument, ConversationHistory
+from app.utils.helpers import normalize_question
+from app.utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +20,10 @@ class ChatService:
     
     def __init__(self, rag_service: RAGService):
         self.rag_service = rag_service
-        self.conversations = {}  # Simple in-memory storage for demo
+        self.conversations = create_conversation_store()
+        self.usage = get_usage_stats()
+        self._inflight_queries = SingleFlight()
+        self.intent_router = IntentRouter(settings.intent_min_confidence) if settings.intent_routing_enabled else None
     
     def chat(
         self,
@@ -30,26 +39,21 @@ class ChatService:
             if not conversation_id:
                 conversation_id = str(uuid.uuid4())
             
-            # Get or create conversation history
-            if conversation_id not in self.conversations:
-                self.conversations[conversation_id] = ConversationHistory(
-                    conversation_id=conversation_id,
-                    messages=[]
+            # Add user message to conversation (created if new)
+            self.conversations.append(conversation_id, "user", message)
+            self.usage.record("messages")
+            
+            intent = self.intent_router.classify(message) if self.intent_router else None
+            if intent is not None and intent.name != QUESTION:
+                # Small talk: answer directly, no retrieval or LLM call
+                response_text, source_docs, cached = intent.response, [], False
+            else:
+                # Query RAG system, sharing the call with identical questions already in flight
+                query_key = (normalize_question(message),) + self.rag_service.retrieval_signature()
+                response_text, source_docs, cached = self._inflight_queries.do(
+                    query_key, self.rag_service.query_with_details, message
                 )
             
-            conversation = self.conversations[conversation_id]
-            
-            # Add user message to conversation
-            user_message = ChatMessage(
-                role="user",
-                content=message,
-                timestamp=datetime.now()
-            )
-            conversation.messages.append(user_message)
-            
-            # Query RAG system
-            response_text, source_docs = self.rag_service.query(message)
-            
             # Process source documents
             sources = None
             if include_sources and source_docs:
@@ -58,23 +62,17 @@ class ChatService:
                     source = SourceDocument(
                         content=doc.page_content[:500] + "..." if len(doc.page_content) > 500 else doc.page_content,
                         source=doc.metadata.get("source"),
+                        score=doc.metadata.get("rerank_score", doc.metadata.get("relevance_score")),
                         metadata=doc.metadata
                     )
                     sources.append(source)
             
             # Add assistant message to conversation
-            assistant_message = ChatMessage(
-                role="assistant",
-                content=response_text,
-                timestamp=datetime.now()
-            )
-            conversation.messages.append(assistant_message)
-            
-            # Update conversation
-            conversation.updated_at = datetime.now()
-            self.conversations[conversation_id] = conversation
+            self.conversations.append(conversation_id, "assistant", response_text)
+            self.usage.record("messages")
             
             processing_time = time.time() - start_time
+            self.usage.record("chat_requests", latency=processing_time)
             
             # Create response
             response = ChatResponse(
@@ -82,6 +80,7 @@ class ChatService:
                 conversation_id=conversation_id,
                 sources=sources,
                 processing_time=processing_time,
+                cached=cached,
                 timestamp=datetime.now()
             )
             
@@ -111,7 +110,7 @@ class ChatService:
     def list_conversations(self) -> List[ConversationHistory]:
         """List all conversations"""
         try:
-            conversations = list(self.conversations.values())
+            conversations = self.conversations.list()
             # Sort by updated_at descending
             conversations.sort(key=lambda x: x.updated_at, reverse=True)
             return conversations
@@ -122,11 +121,9 @@ class ChatService:
     def delete_conversation(self, conversation_id: str) -> Dict[str, Any]:
         """Delete a conversation"""
         try:
-            if conversation_id not in self.conversations:
+            if not self.conversations.delete(conversation_id):
                 return {"status": "error", "message": "Conversation not found"}
             
-            del self.conversations[conversation_id]
-            
             logger.info(f"Conversation {conversation_id} deleted successfully")
             
             return {"status": "success", "message": "Conversation deleted successfully"}
@@ -138,8 +135,7 @@ class ChatService:
     def clear_all_conversations(self) -> Dict[str, Any]:
         """Clear all conversations"""
         try:
-            count = len(self.conversations)
-            self.conversations.clear()
+            count = self.conversations.clear()
             
             logger.info(f"Cleared {count} conversations")
             
@@ -152,8 +148,7 @@ class ChatService:
     def get_chat_stats(self) -> Dict[str, Any]:
         """Get chat statistics"""
         try:
-            total_conversations = len(self.conversations)
-            total_messages = sum(len(conv.messages) for conv in self.conversations.values())
+            total_conversations, total_messages = self.conversations.stats()
             
             # Calculate average messages per conversation
             avg_messages = total_messages / total_conversations if total_conversations > 0 else 0
@@ -161,7 +156,12 @@ class ChatService:
             return {
                 "total_conversations": total_conversations,
                 "total_messages": total_messages,
-                "average_messages_per_conversation": round(avg_messages, 2)
+                "average_messages_per_conversation": round(avg_messages, 2),
+                "coalesced_queries": self._inflight_queries.get_stats()["coalesced"],
+                "intent_router": self.intent_router.get_stats() if self.intent_router else None,
+                "archive": self.conversations.get_archive_stats(),
+                # Per worker: recent activity per minute (last hour) and per hour (last day)
+                "activity": self.usage.rollups("messages", "chat_requests")
             }
             
         except Exception as e:
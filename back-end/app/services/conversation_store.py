@@ -0,0 +1,461 @@
+from typing import Any, Dict, List, Optional, Tuple
+from array import array
+from datetime import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.state_store import StateStore, get_state_store, shared_state_enabled
+from app.models.chat import ChatMessage, ConversationHistory
+from app.services.usage_stats import Counters, get_usage_stats
+
+logger = logging.getLogger(__name__)
+
+ROLES = ["user", "assistant", "system"]
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+# Texts up to this length are interned: canned answers and short turns repeat a lot
+INTERN_MAX_LENGTH = 256
+
+def _role_code(role: str) -> int:
+    code = _ROLE_CODES.get(role)
+    if code is None:
+        if len(ROLES) >= 256:
+            raise ValueError(f"Too many message roles to store {role!r}")
+        code = _ROLE_CODES.setdefault(role, len(ROLES))
+        if code == len(ROLES):
+            ROLES.append(role)
+    return code
+
+def _to_timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value).timestamp() if value else time.time()
+
+class CompactConversation:
+    """A conversation's messages as parallel arrays instead of Pydantic models.
+
+    Roles are one byte each, timestamps are packed doubles and short texts are
+    interned, so a message costs little more than its text. Pydantic models
+    are only built by ``to_history`` for API responses.
+    """
+
+    __slots__ = ("conversation_id", "created_at", "updated_at", "roles", "timestamps", "texts")
+
+    def __init__(self, conversation_id: str, created_at: Optional[float] = None):
+        self.conversation_id = conversation_id
+        self.created_at = created_at if created_at is not None else time.time()
+        self.updated_at = self.created_at
+        self.roles = bytearray()
+        self.timestamps = array("d")
+        self.texts: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def append(self, role: str, content: str, timestamp: Optional[float] = None):
+        self.roles.append(_role_code(role))
+        self.timestamps.append(timestamp if timestamp is not None else time.time())
+        self.texts.append(sys.intern(content) if len(content) <= INTERN_MAX_LENGTH else content)
+        self.updated_at = time.time()
+
+    def to_history(self) -> ConversationHistory:
+        """Build the API model (the stored data is trusted, so nothing is re-validated)"""
+        messages = [
+            ChatMessage.model_construct(role=ROLES[role], content=text, timestamp=datetime.fromtimestamp(ts))
+            for role, ts, text in zip(self.roles, self.timestamps, self.texts)
+        ]
+        return ConversationHistory.model_construct(
+            conversation_id=self.conversation_id,
+            messages=messages,
+            created_at=datetime.fromtimestamp(self.created_at),
+            updated_at=datetime.fromtimestamp(self.updated_at)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Columnar JSON form, used for the shared state database and archives"""
+        return {
+            "conversation_id": self.conversation_id,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "roles": [ROLES[role] for role in self.roles],
+            "timestamps": self.timestamps.tolist(),
+            "texts": self.texts
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompactConversation":
+        """Read the columnar form, or a ``ConversationHistory`` dump stored before it"""
+        conversation = cls(data["conversation_id"], _to_timestamp(data.get("created_at")))
+        if "messages" in data:
+            rows = [(m["role"], m["content"], _to_timestamp(m.get("timestamp"))) for m in data["messages"]]
+        else:
+            rows = zip(data["roles"], data["texts"], data["timestamps"])
+        for role, content, ts in rows:
+            conversation.append(role, content, ts)
+        conversation.updated_at = _to_timestamp(data.get("updated_at"))
+        return conversation
+
+def _message_count(data: Dict[str, Any]) -> int:
+    return len(data["messages"] if "messages" in data else data["texts"])
+
+class ConversationArchive:
+    """Idle conversations as gzip-compressed JSON files, one per conversation.
+
+    File names are hashes of the conversation ID (IDs come from clients).
+    Writes go to a temporary file that is renamed into place. The archive
+    only ever touches its own files, so ``root`` may be a shared directory.
+    """
+
+    SUFFIX = ".json.gz"
+    TMP_PREFIX = ".tmp-"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, conversation_id: str) -> str:
+        name = hashlib.sha1(conversation_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{name}{self.SUFFIX}")
+
+    def write(self, conversation: CompactConversation) -> int:
+        """Archive a conversation; returns the compressed size"""
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path_for(conversation.conversation_id)
+        tmp_path = os.path.join(self.root, f"{self.TMP_PREFIX}{uuid.uuid4().hex}")
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(conversation.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return os.path.getsize(path)
+
+    def read(self, conversation_id: str) -> CompactConversation:
+        return self._read_file(self.path_for(conversation_id))
+
+    def _read_file(self, path: str) -> CompactConversation:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return CompactConversation.from_dict(json.load(f))
+
+    def exists(self, conversation_id: str) -> bool:
+        return os.path.exists(self.path_for(conversation_id))
+
+    def _names(self) -> List[str]:
+        try:
+            return os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+
+    def iter_conversations(self):
+        """Conversations in the archive (e.g. left by a previous run), skipping unreadable files"""
+        for name in self._names():
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                yield self._read_file(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass  # restored or deleted meanwhile
+            except Exception as e:
+                logger.warning(f"Skipping unreadable archived conversation {name}: {str(e)}")
+
+    def delete(self, conversation_id: str):
+        path = self.path_for(conversation_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def clear(self):
+        """Delete the archived conversations (and leftover temporary files), nothing else"""
+        for name in self._names():
+            if name.endswith(self.SUFFIX) or name.startswith(self.TMP_PREFIX):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    pass
+
+class ConversationStore:
+    """Conversation histories kept in process memory.
+
+    Conversation and message totals are kept in ``counters`` as messages are
+    added and removed, so ``stats`` doesn't walk the conversations.
+
+    With an ``archive``, a background thread (see ``start``) moves
+    conversations idle for ``archive_after`` seconds out of memory into it;
+    they are loaded back when they are read or written again. Conversations
+    archived by a previous run are picked up again when the thread starts.
+    """
+
+    # Seconds between scans for idle conversations
+    ARCHIVE_CHECK_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        counters: Optional[Counters] = None,
+        archive: Optional[ConversationArchive] = None,
+        archive_after: float = 0
+    ):
+        self._conversations: Dict[str, CompactConversation] = {}
+        # Archived conversation IDs and their message counts
+        self._archived: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.counters = counters or Counters()
+        self.archive = archive if archive_after > 0 else None
+        self.archive_after = archive_after
+        self._archived_total = 0
+        self._restored_total = 0
+        # Until the archive left by a previous run is indexed, unknown IDs are looked up on disk
+        self._archive_indexed = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the background archiving thread"""
+        if self.archive is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="conversation-archive", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        try:
+            self._index_archive()
+        except Exception as e:
+            logger.error(f"Error reading the conversation archive: {str(e)}")
+        while not self._stop.wait(self.ARCHIVE_CHECK_INTERVAL):
+            try:
+                self.archive_idle()
+            except Exception as e:
+                logger.error(f"Error archiving idle conversations: {str(e)}")
+
+    def _index_archive(self):
+        """Register the conversations archived by a previous run"""
+        found = 0
+        for conversation in self.archive.iter_conversations():
+            with self._lock:
+                conversation_id = conversation.conversation_id
+                if conversation_id in self._conversations or conversation_id in self._archived:
+                    continue
+                if not self.archive.exists(conversation_id):
+                    continue  # restored or deleted meanwhile
+                self._archived[conversation_id] = len(conversation)
+                self.counters.add("conversations.total")
+                self.counters.add("conversations.messages", len(conversation))
+                found += 1
+        with self._lock:
+            self._archive_indexed = True
+        if found:
+            logger.info(f"Found {found} archived conversations")
+
+    def _load(self, conversation_id: str) -> Optional[CompactConversation]:
+        """In-memory conversation, restored from the archive if needed (lock held)"""
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None and self.archive is not None and (
+            conversation_id in self._archived or (not self._archive_indexed and self.archive.exists(conversation_id))
+        ):
+            conversation = self.archive.read(conversation_id)
+            self.archive.delete(conversation_id)
+            if self._archived.pop(conversation_id, None) is None:
+                # From a previous run, not indexed yet
+                self.counters.add("conversations.total")
+                self.counters.add("conversations.messages", len(conversation))
+            self._conversations[conversation_id] = conversation
+            self._restored_total += 1
+        return conversation
+
+    def get(self, conversation_id: str) -> Optional[ConversationHistory]:
+        with self._lock:
+            conversation = self._load(conversation_id)
+            return conversation.to_history() if conversation is not None else None
+
+    def append(self, conversation_id: str, role: str, content: str, timestamp: Optional[float] = None):
+        """Append a message, creating the conversation if needed"""
+        with self._lock:
+            conversation = self._load(conversation_id)
+            if conversation is None:
+                conversation = CompactConversation(conversation_id)
+                self._conversations[conversation_id] = conversation
+                self.counters.add("conversations.total")
+            conversation.append(role, content, timestamp)
+            self.counters.add("conversations.messages")
+
+    def archive_idle(self) -> int:
+        """Move conversations idle for ``archive_after`` seconds to the archive"""
+        if self.archive is None:
+            return 0
+        cutoff = time.time() - self.archive_after
+        with self._lock:
+            idle = [c for c in self._conversations.values() if c.updated_at <= cutoff]
+        archived = 0
+        for conversation in idle:
+            # Written outside the lock; kept in memory if it changed meanwhile
+            size = len(conversation)
+            try:
+                self.archive.write(conversation)
+            except Exception as e:
+                logger.error(f"Error archiving conversation {conversation.conversation_id}: {str(e)}")
+                continue
+            with self._lock:
+                current = self._conversations.get(conversation.conversation_id)
+                if current is conversation and len(current) == size:
+                    del self._conversations[conversation.conversation_id]
+                    self._archived[conversation.conversation_id] = size
+                    archived += 1
+                else:
+                    self.archive.delete(conversation.conversation_id)
+        if archived:
+            self._archived_total += archived
+            logger.info(f"Archived {archived} idle conversations")
+        return archived
+
+    def list(self) -> List[ConversationHistory]:
+        with self._lock:
+            conversations = list(self._conversations.values())
+            archived = list(self._archived)
+        # Archived conversations are read for the listing but stay archived
+        for conversation_id in archived:
+            try:
+                conversations.append(self.archive.read(conversation_id))
+            except FileNotFoundError:
+                pass  # restored or deleted meanwhile
+        return [conversation.to_history() for conversation in conversations]
+
+    def delete(self, conversation_id: str) -> bool:
+        with self._lock:
+            conversation = self._conversations.pop(conversation_id, None)
+            if conversation is not None:
+                count = len(conversation)
+            elif conversation_id in self._archived:
+                count = self._archived.pop(conversation_id)
+                self.archive.delete(conversation_id)
+            elif self.archive is not None and not self._archive_indexed and self.archive.exists(conversation_id):
+                # From a previous run and not counted yet
+                self.archive.delete(conversation_id)
+                return True
+            else:
+                return False
+            self.counters.add("conversations.total", -1)
+            self.counters.add("conversations.messages", -count)
+            return True
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._conversations) + len(self._archived)
+            self._conversations.clear()
+            self._archived.clear()
+            if self.archive is not None:
+                self.archive.clear()
+            self.counters.reset("conversations.")
+            return count
+
+    def stats(self) -> Tuple[int, int]:
+        """Number of conversations and of messages"""
+        return self.counters.get("conversations.total"), self.counters.get("conversations.messages")
+
+    def get_archive_stats(self) -> Optional[Dict[str, Any]]:
+        if self.archive is None:
+            return None
+        with self._lock:
+            return {
+                "in_memory": len(self._conversations),
+                "archived": len(self._archived),
+                "archive_after_seconds": self.archive_after,
+                "archived_total": self._archived_total,
+                "restored_total": self._restored_total
+            }
+
+class SharedConversationStore(ConversationStore):
+    """Conversation histories in the shared state database (multi-worker mode).
+
+    Appends are read-modify-write transactions, so messages sent to the same
+    conversation through different workers are never lost. Conversations are
+    stored in the columnar form of ``CompactConversation``; the database
+    already keeps them out of memory, so nothing is archived.
+    """
+
+    NAMESPACE = "conversations"
+
+    def __init__(self, store: StateStore, counters: Counters):
+        self.store = store
+        self.counters = counters
+        # Conversations stored before totals were kept
+        self.counters.initialize("conversations", self._count)
+
+    def _count(self) -> Dict[str, int]:
+        conversations = self.store.items(self.NAMESPACE)
+        return {
+            "conversations.total": len(conversations),
+            "conversations.messages": sum(_message_count(data) for _, data in conversations)
+        }
+
+    def get(self, conversation_id: str) -> Optional[ConversationHistory]:
+        data = self.store.get(self.NAMESPACE, conversation_id)
+        return CompactConversation.from_dict(data).to_history() if data else None
+
+    def append(self, conversation_id: str, role: str, content: str, timestamp: Optional[float] = None):
+        created = []
+
+        def add_message(data):
+            if data is None:
+                conversation = CompactConversation(conversation_id)
+                created.append(True)
+            else:
+                conversation = CompactConversation.from_dict(data)
+            conversation.append(role, content, timestamp)
+            return conversation.to_dict()
+
+        self.store.update(self.NAMESPACE, conversation_id, add_message)
+        if created:
+            self.counters.add("conversations.total")
+        self.counters.add("conversations.messages")
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def archive_idle(self) -> int:
+        return 0
+
+    def list(self) -> List[ConversationHistory]:
+        return [CompactConversation.from_dict(data).to_history() for _, data in self.store.items(self.NAMESPACE)]
+
+    def delete(self, conversation_id: str) -> bool:
+        data = self.store.get(self.NAMESPACE, conversation_id)
+        if data is None or not self.store.delete(self.NAMESPACE, conversation_id):
+            return False
+        self.counters.add("conversations.total", -1)
+        self.counters.add("conversations.messages", -_message_count(data))
+        return True
+
+    def clear(self) -> int:
+        count = self.store.clear(self.NAMESPACE)
+        self.counters.reset("conversations.")
+        return count
+
+    def get_archive_stats(self) -> Optional[Dict[str, Any]]:
+        return None
+
+def create_conversation_store() -> ConversationStore:
+    """Shared store when running several workers, in-memory otherwise"""
+    counters = get_usage_stats().counters
+    if shared_state_enabled():
+        return SharedConversationStore(get_state_store(), counters)
+    return ConversationStore(
+        counters,
+        archive=ConversationArchive(settings.conversation_archive_path),
+        archive_after=settings.conversation_archive_after
+    )
@@ -0,0 +1,547 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ElementTree
+
+from app.core.config import settings
+from app.models.document import DocumentType
+from app.services.document_service import DocumentService
+from app.services.rag_service import RAGService
+from app.services.web_loader import REQUEST_TIMEOUT, fetch_web_page, is_html, user_agent
+
+logger = logging.getLogger(__name__)
+
+# How often a running job saves its frontier
+PERSIST_INTERVAL = 5.0
+
+# A job whose worker hasn't saved for this long is considered interrupted
+JOB_HEARTBEAT_TIMEOUT = 120.0
+
+# Nested sitemap indexes followed at most this deep
+MAX_SITEMAP_DEPTH = 2
+
+# Longest the scheduler sleeps before checking for a cancel request
+MAX_SCHEDULER_WAIT = 1.0
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str) -> Optional[str]:
+    """Canonical form used for scope checks and deduplication (None if not crawlable)"""
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if port is not None and port != _DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+class UrlSet:
+    """Set of URLs kept as 64-bit hashes instead of strings.
+
+    Two different URLs colliding is unlikely enough (about 1 in 10^10 for a
+    million URLs) to be ignored: the second one would simply not be crawled.
+    """
+
+    def __init__(self, hashes: Iterable[int] = ()):
+        self._hashes: Set[int] = set(hashes)
+
+    @staticmethod
+    def _hash(url: str) -> int:
+        return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add(self, url: str) -> bool:
+        """Add a URL; returns whether it was new"""
+        key = self._hash(url)
+        if key in self._hashes:
+            return False
+        self._hashes.add(key)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return self._hash(url) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(array("Q", self._hashes).tobytes()).decode("ascii")
+
+    @classmethod
+    def from_base64(cls, data: str) -> "UrlSet":
+        hashes = array("Q")
+        hashes.frombytes(base64.b64decode(data))
+        return cls(hashes)
+
+class Frontier:
+    """URLs waiting to be fetched, queued per host so hosts can be served in turn"""
+
+    def __init__(self):
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self.queued = 0
+
+    def push(self, url: str, depth: int):
+        host = urlsplit(url).netloc
+        self._queues.setdefault(host, deque()).append((url, depth))
+        self.queued += 1
+
+    def hosts(self) -> List[str]:
+        return list(self._queues)
+
+    def __contains__(self, host: str) -> bool:
+        return host in self._queues
+
+    def peek(self, host: str) -> Tuple[str, int]:
+        return self._queues[host][0]
+
+    def pop(self, host: str) -> Tuple[str, int]:
+        queue = self._queues[host]
+        item = queue.popleft()
+        if not queue:
+            del self._queues[host]
+        return item
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def to_list(self) -> List[List[Any]]:
+        return [[url, depth] for queue in self._queues.values() for url, depth in queue]
+
+class RobotsCache:
+    """robots.txt rules per host, fetched once per crawl.
+
+    Following RFC 9309, an unavailable robots.txt (any 4xx, 401 and 403
+    included) allows everything, while an unreachable one (5xx or network
+    error) disallows everything. ``fetch`` does the request (the crawler runs
+    it in its worker pool); ``allowed`` and ``crawl_delay`` fetch on first
+    use.
+    """
+
+    def __init__(self):
+        self._parsers: Dict[str, RobotFileParser] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def known(self, url: str) -> bool:
+        """Whether the rules for the URL's origin have been fetched"""
+        with self._lock:
+            return self.origin(url) in self._parsers
+
+    def fetch(self, url: str) -> RobotFileParser:
+        """Rules for the URL's origin, fetching its robots.txt unless already known"""
+        origin = self.origin(url)
+        with self._lock:
+            parser = self._parsers.get(origin)
+        if parser is not None:
+            return parser
+
+        import requests
+
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            response = requests.get(parser.url, headers={"User-Agent": user_agent()}, timeout=REQUEST_TIMEOUT)
+            if response.status_code >= 500:
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+        except Exception as e:
+            logger.warning(f"Could not fetch {parser.url}: {str(e)}")
+            parser.disallow_all = True
+        parser.modified()
+        with self._lock:
+            return self._parsers.setdefault(origin, parser)
+
+    def allowed(self, url: str) -> bool:
+        return self.fetch(url).can_fetch(user_agent(), url)
+
+    def crawl_delay(self, url: str) -> Optional[float]:
+        delay = self.fetch(url).crawl_delay(user_agent())
+        return float(delay) if delay is not None else None
+
+def iter_sitemap_urls(url: str, depth: int = 0) -> Iterator[str]:
+    """URLs listed in a sitemap, following sitemap indexes (gzip-compressed sitemaps too)"""
+    import requests
+
+    response = requests.get(url, headers={"User-Agent": user_agent()}, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    content = response.content
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    root = ElementTree.fromstring(content)
+    is_index = root.tag.endswith("sitemapindex")
+    for element in root.iter():
+        if not element.tag.endswith("loc") or not element.text:
+            continue
+        loc = element.text.strip()
+        if is_index:
+            if depth < MAX_SITEMAP_DEPTH:
+                yield from iter_sitemap_urls(loc, depth + 1)
+        else:
+            yield loc
+
+class CrawlService:
+    """Crawls sites into the knowledge base as web documents.
+
+    A job starts from seed URLs and/or a sitemap and follows links within the
+    allowed domains and path prefixes, up to a link depth and a page budget.
+    URLs are deduplicated with a hashed seen-set, robots.txt is honoured
+    (including Crawl-delay; it is fetched in the worker pool before a host's
+    first page), and each host gets at most ``per_host_concurrency`` requests
+    at a time, spaced by the host delay.
+    Fetched pages are ingested right away by the fetching thread, so pages
+    reach the index while the crawl goes on.
+
+    The job state (frontier, seen-set, counters) is saved to
+    ``<jobs_path>/<job_id>.json`` every few seconds; a cancelled or
+    interrupted job is resumed from it. Pages whose URL is already a web
+    document are not ingested again.
+    """
+
+    def __init__(self, document_service: DocumentService, rag_service: RAGService, jobs_path: str):
+        self.document_service = document_service
+        self.rag_service = rag_service
+        self.jobs_path = jobs_path
+        self._lock = threading.Lock()
+        self._threads: Dict[str, threading.Thread] = {}
+        self._cancel: Dict[str, threading.Event] = {}
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def _job_file(self, job_id: str) -> str:
+        return os.path.join(self.jobs_path, f"{job_id}.json")
+
+    def _load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._job_file(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, state: Dict[str, Any]):
+        os.makedirs(self.jobs_path, exist_ok=True)
+        path = self._job_file(state["job_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def start(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Start a crawl job"""
+        seeds = [url for url in (normalize_url(str(seed)) for seed in request.get("seeds") or []) if url]
+        sitemap = str(request["sitemap"]) if request.get("sitemap") else None
+        if not seeds and not sitemap:
+            raise ValueError("A crawl needs seed URLs or a sitemap")
+
+        domains = request.get("allowed_domains") or sorted({
+            urlsplit(url).hostname for url in seeds + ([sitemap] if sitemap else [])
+        })
+        config = {
+            "seeds": seeds,
+            "sitemap": sitemap,
+            "allowed_domains": [domain.lower().lstrip(".") for domain in domains],
+            "path_prefixes": request.get("path_prefixes") or [],
+            "max_depth": request.get("max_depth", 2),
+            "max_pages": request.get("max_pages") or settings.crawl_max_pages,
+            "per_host_concurrency": request.get("per_host_concurrency") or settings.crawl_per_host_concurrency,
+            "metadata": request.get("metadata") or {}
+        }
+        job_id = str(uuid.uuid4())
+        state = {
+            "job_id": job_id,
+            "status": "running",
+            "config": config,
+            "frontier": None,
+            "seen": None,
+            "stats": {
+                "queued": 0, "fetched": 0, "ingested": 0, "chunks_created": 0, "already_indexed": 0,
+                "not_html": 0, "empty": 0, "robots_disallowed": 0, "failed": 0
+            },
+            "started_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "error": None
+        }
+        self._launch(state)
+        logger.info(f"Started crawl job {job_id} ({len(seeds)} seeds, sitemap: {sitemap})")
+        return self.get_status(job_id)
+
+    def resume(self, job_id: str) -> Dict[str, Any]:
+        """Resume a cancelled, failed or interrupted job from its saved frontier"""
+        state = self._load(job_id)
+        if state is None:
+            raise KeyError(f"Crawl job {job_id} not found")
+        status = self.get_status(job_id)["status"]
+        if status == "running":
+            raise RuntimeError(f"Crawl job {job_id} is already running")
+        if status == "completed":
+            raise ValueError(f"Crawl job {job_id} has already completed")
+        state.update(status="running", finished_at=None, error=None)
+        self._launch(state)
+        logger.info(f"Resumed crawl job {job_id} ({len(state['frontier'] or [])} URLs in the frontier)")
+        return self.get_status(job_id)
+
+    def _launch(self, state: Dict[str, Any]):
+        job_id = state["job_id"]
+        state.update(pid=os.getpid(), heartbeat=time.time())
+        self._save(state)
+        with self._lock:
+            self._jobs[job_id] = state
+            self._cancel[job_id] = threading.Event()
+            thread = threading.Thread(target=self._run, args=(state,), name=f"crawl-{job_id[:8]}", daemon=True)
+            self._threads[job_id] = thread
+        thread.start()
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Stop a running job; its frontier is kept so it can be resumed"""
+        thread = self._threads.get(job_id)
+        if thread is None or not thread.is_alive():
+            return {"status": "error", "message": "Crawl job is not running in this worker"}
+        self._cancel[job_id].set()
+        return {"status": "success", "message": "Crawl job is being cancelled"}
+
+    def _public(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        status = state["status"]
+        thread = self._threads.get(state["job_id"])
+        if status == "running" and not (thread is not None and thread.is_alive()):
+            # Not running here: another worker may run it, or its process died
+            if time.time() - state.get("heartbeat", 0) > JOB_HEARTBEAT_TIMEOUT or state.get("pid") == os.getpid():
+                status = "interrupted"
+        info = {key: value for key, value in state.items() if key not in ("frontier", "seen")}
+        info["status"] = status
+        info["stats"] = dict(state["stats"])
+        info["frontier_size"] = len(state["frontier"] or [])
+        return info
+
+    def get_status(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            state = self._jobs.get(job_id)
+        if state is None:
+            state = self._load(job_id)
+        if state is None:
+            raise KeyError(f"Crawl job {job_id} not found")
+        return self._public(state)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        jobs = []
+        if os.path.isdir(self.jobs_path):
+            for name in os.listdir(self.jobs_path):
+                if name.endswith(".json"):
+                    try:
+                        jobs.append(self.get_status(name[:-len(".json")]))
+                    except KeyError:
+                        pass
+        jobs.sort(key=lambda job: job["started_at"], reverse=True)
+        return jobs
+
+    def _in_scope(self, config: Dict[str, Any], url: str) -> bool:
+        parts = urlsplit(url)
+        host = parts.hostname or ""
+        if not any(host == domain or host.endswith(f".{domain}") for domain in config["allowed_domains"]):
+            return False
+        prefixes = config["path_prefixes"]
+        return not prefixes or any(parts.path.startswith(prefix) for prefix in prefixes)
+
+    def _run(self, state: Dict[str, Any]):
+        job_id = state["job_id"]
+        config = state["config"]
+        stats = state["stats"]
+        cancel = self._cancel[job_id]
+        stats_lock = threading.Lock()
+        robots = RobotsCache()
+        frontier = Frontier()
+        frontier.queued = stats["queued"]
+        seen = UrlSet.from_base64(state["seen"]) if state["seen"] else UrlSet()
+        inflight: Dict[Future, Tuple[str, int, str]] = {}
+        robots_inflight: Dict[Future, str] = {}
+        indexed_sources = {
+            doc_data.get("source") for doc_data in list(self.document_service.documents_db.values())
+            if doc_data.get("doc_type") == DocumentType.WEB.value
+        }
+
+        def enqueue(url: str, depth: int):
+            url = normalize_url(url)
+            if url is None or not self._in_scope(config, url) or frontier.queued >= config["max_pages"]:
+                return
+            if not seen.add(url):
+                return
+            frontier.push(url, depth)
+
+        def save(final: bool = False):
+            pending = frontier.to_list() + [[url, depth] for url, depth, _ in inflight.values()]
+            with stats_lock:
+                stats["queued"] = frontier.queued
+                state.update(frontier=pending, seen=seen.to_base64(), heartbeat=time.time())
+                if final:
+                    state["finished_at"] = datetime.now().isoformat()
+                self._save(state)
+
+        executor = ThreadPoolExecutor(max_workers=max(settings.crawl_concurrency, 1), thread_name_prefix=f"crawl-{job_id[:8]}")
+        try:
+            if state["frontier"] is None:
+                for url in config["seeds"]:
+                    enqueue(url, 0)
+                if config["sitemap"]:
+                    for url in iter_sitemap_urls(config["sitemap"]):
+                        if frontier.queued >= config["max_pages"] or cancel.is_set():
+                            break
+                        enqueue(url, 0)
+            else:
+                # Resuming: URLs in flight when the job stopped were saved with the frontier
+                for url, depth in state["frontier"]:
+                    frontier.push(url, depth)
+                frontier.queued = stats["queued"]
+            save()
+
+            active: Dict[str, int] = {}
+            next_request: Dict[str, float] = {}
+            last_save = time.monotonic()
+            while not cancel.is_set():
+                now = time.monotonic()
+                # Earliest time a host that only waits for its delay can be served
+                ready_at = None
+                for host in frontier.hosts():
+                    while (
+                        host in frontier and len(inflight) + len(robots_inflight) < settings.crawl_concurrency
+                        and active.get(host, 0) < config["per_host_concurrency"]
+                    ):
+                        url, depth = frontier.peek(host)
+                        if not robots.known(url):
+                            # Fetch robots.txt in the pool; the host waits until it is known
+                            origin = robots.origin(url)
+                            if origin not in robots_inflight.values():
+                                robots_inflight[executor.submit(robots.fetch, url)] = origin
+                            break
+                        if next_request.get(host, 0) > now:
+                            ready_at = next_request[host] if ready_at is None else min(ready_at, next_request[host])
+                            break
+                        frontier.pop(host)
+                        if not robots.allowed(url):
+                            with stats_lock:
+                                stats["robots_disallowed"] += 1
+                            frontier.queued -= 1
+                            continue
+                        delay = max(settings.crawl_host_delay, robots.crawl_delay(url) or 0)
+                        next_request[host] = now + delay
+                        active[host] = active.get(host, 0) + 1
+                        inflight[executor.submit(self._fetch_and_ingest, state, stats_lock, indexed_sources, url, depth)] = (url, depth, host)
+
+                if not inflight and not robots_inflight and len(frontier) == 0:
+                    break
+
+                # Sleep until a request finishes or a host is ready (waking up now and then for cancels and saves)
+                timeout = min(MAX_SCHEDULER_WAIT, max(last_save + PERSIST_INTERVAL - time.monotonic(), 0))
+                if ready_at is not None:
+                    timeout = min(timeout, max(ready_at - time.monotonic(), 0))
+                if inflight or robots_inflight:
+                    done, _ = wait(list(inflight) + list(robots_inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    cancel.wait(timeout)
+                    done = set()
+                for future in done:
+                    if future in robots_inflight:
+                        robots_inflight.pop(future)
+                        continue
+                    url, depth, host = inflight.pop(future)
+                    active[host] -= 1
+                    final_url, links = future.result()
+                    if final_url:
+                        seen.add(final_url)
+                    for link in links:
+                        enqueue(link, depth + 1)
+
+                if time.monotonic() - last_save >= PERSIST_INTERVAL:
+                    save()
+                    last_save = time.monotonic()
+
+            # Let fetches in flight finish so their pages are ingested and their links kept for a resume
+            for future in list(inflight):
+                url, depth, host = inflight.pop(future)
+                final_url, links = future.result()
+                for link in links:
+                    enqueue(link, depth + 1)
+            state["status"] = "cancelled" if cancel.is_set() else "completed"
+            logger.info(
+                f"Crawl job {job_id} {state['status']}: {stats['fetched']} pages fetched, {stats['ingested']} ingested"
+            )
+        except Exception as e:
+            state["status"] = "failed"
+            state["error"] = str(e)
+            logger.error(f"Crawl job {job_id} failed: {str(e)}")
+        finally:
+            executor.shutdown(wait=True)
+            save(final=True)
+
+    def _fetch_and_ingest(
+        self,
+        state: Dict[str, Any],
+        stats_lock: threading.Lock,
+        indexed_sources: Set[str],
+        url: str,
+        depth: int
+    ) -> Tuple[Optional[str], Tuple[str, ...]]:
+        """Fetch one page and ingest it; returns its final URL and the links to follow"""
+        config = state["config"]
+        stats = state["stats"]
+        try:
+            page = fetch_web_page(url, with_links=depth < config["max_depth"])
+        except Exception as e:
+            logger.warning(f"Crawl job {state['job_id']}: could not fetch {url}: {str(e)}")
+            with stats_lock:
+                stats["failed"] += 1
+            return None, ()
+
+        with stats_lock:
+            stats["fetched"] += 1
+        final_url = normalize_url(page.url) or url
+        if not is_html(page.content_type):
+            outcome = "not_html"
+        elif final_url != url and not self._in_scope(config, final_url):
+            return final_url, ()  # Redirected out of scope
+        elif not page.text or not page.text.strip():
+            outcome = "empty"
+        else:
+            with stats_lock:
+                outcome = "already_indexed" if final_url in indexed_sources else None
+                indexed_sources.add(final_url)
+            if outcome is None:
+                try:
+                    result = self.document_service.add_web_document(
+                        url=final_url,
+                        title=page.title or final_url,
+                        metadata={**config["metadata"], "crawl_job": state["job_id"]},
+                        rag_service=self.rag_service,
+                        page=page
+                    )
+                except Exception as e:
+                    logger.warning(f"Crawl job {state['job_id']}: could not ingest {final_url}: {str(e)}")
+                    with stats_lock:
+                        stats["failed"] += 1
+                        indexed_sources.discard(final_url)
+                    return final_url, page.links
+                outcome = "ingested"
+                with stats_lock:
+                    stats["chunks_created"] += result.get("chunk_count", 0)
+        with stats_lock:
+            stats[outcome] += 1
+        return final_url, page.links
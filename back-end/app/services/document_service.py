@@ -1,32 +1,143 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, BinaryIO, Iterator, MutableMapping, Optional, Tuple
+from contextlib import nullcontext
 import logging
 import uuid
 import json
 import os
+import time
 from datetime import datetime
 from pathlib import Path
 
-import bs4
-from langchain_community.document_loaders import WebBaseLoader
 from langchain_core.documents import Document
 
 from app.core.config import settings
+from app.core.state_store import SharedDict, get_state_store, shared_state_enabled
 from app.models.document import DocumentType, DocumentStatus, DocumentInfo
 from app.services.rag_service import RAGService
-from app.utils.helpers import create_document_metadata
+from app.services.file_loaders import iter_pdf_pages, iter_markdown_sections, iter_text_blocks, TextSource
+from app.services.raw_store import RawDocumentStore
+from app.services.usage_stats import Counters, UsageStats, get_usage_stats
+from app.services.web_loader import HTTP_CACHE_KEY, WebPage, fetch_web_page, http_cache_entry
+from app.utils.helpers import create_document_metadata, sanitize_filename
+from app.utils.process_pool import default_pool_size
 
 logger = logging.getLogger(__name__)
 
+# Uploaded file extensions and the document type they are ingested as
+FILE_DOCUMENT_TYPES = {
+    ".pdf": DocumentType.PDF,
+    ".md": DocumentType.MARKDOWN,
+    ".markdown": DocumentType.MARKDOWN,
+    ".txt": DocumentType.TEXT,
+}
+
+UPLOAD_COPY_CHUNK_SIZE = 1024 * 1024
+
+def _document_counts(doc_data: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Counters a registry entry contributes to"""
+    if doc_data is None:
+        return {}
+    return {
+        "documents.total": 1,
+        f"documents.status.{doc_data['status']}": 1,
+        f"documents.type.{doc_data['doc_type']}": 1,
+        "documents.chunks": doc_data.get("chunk_count") or 0
+    }
+
+class DocumentRegistry(MutableMapping):
+    """Document registry (a dict, or a SharedDict in multi-worker mode) that keeps totals.
+    
+    Every assignment and deletion adjusts the document, status, type and chunk
+    counters by the difference between the old and the new entry, and records
+    finished ingestions in the activity series.
+    """
+    
+    def __init__(self, data: MutableMapping, usage: UsageStats):
+        self.data = data
+        self.usage = usage
+        self.counters: Counters = usage.counters
+        # Documents registered before totals were kept
+        self.counters.initialize("documents", self._count)
+    
+    def _count(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for doc_data in self.data.values():
+            for key, value in _document_counts(doc_data).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+    
+    def _account(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+        old_counts, new_counts = _document_counts(old), _document_counts(new)
+        for key in set(old_counts) | set(new_counts):
+            self.counters.add(key, new_counts.get(key, 0) - old_counts.get(key, 0))
+        
+        old_status = old["status"] if old else None
+        new_status = new["status"] if new else None
+        if new_status == old_status:
+            return
+        if new_status == DocumentStatus.COMPLETED.value:
+            try:
+                duration = (
+                    datetime.fromisoformat(new["updated_at"]) - datetime.fromisoformat(new["created_at"])
+                ).total_seconds()
+            except (KeyError, TypeError, ValueError):
+                duration = None
+            self.usage.record("ingestions", latency=duration)
+            self.usage.record("chunks_ingested", value=new.get("chunk_count") or 0)
+        elif new_status == DocumentStatus.FAILED.value:
+            self.usage.record("ingestion_failures")
+    
+    # Entries are copied in and out (as with SharedDict), so an entry changed
+    # in place and assigned back can still be compared with the stored one
+    def __getitem__(self, doc_id: str) -> Dict[str, Any]:
+        return dict(self.data[doc_id])
+    
+    def get(self, doc_id: str, default: Any = None) -> Any:
+        doc_data = self.data.get(doc_id)
+        return dict(doc_data) if doc_data is not None else default
+    
+    def __setitem__(self, doc_id: str, doc_data: Dict[str, Any]):
+        old = self.data.get(doc_id)
+        self.data[doc_id] = dict(doc_data)
+        self._account(old, doc_data)
+    
+    def __delitem__(self, doc_id: str):
+        old = self.data[doc_id]
+        del self.data[doc_id]
+        self._account(old, None)
+    
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self.data
+    
+    def __iter__(self):
+        return iter(self.data)
+    
+    def __len__(self) -> int:
+        return len(self.data)
+    
+    def items(self):
+        return self.data.items()
+    
+    def values(self):
+        return self.data.values()
+
 class DocumentService:
     """Document processing and management service"""
     
     def __init__(self):
         self.documents_db = {}  # Simple in-memory storage for demo
         self.documents_db_file = os.path.join(settings.documents_path, "documents_db.json")
+        self.uploads_path = os.path.join(settings.documents_path, "uploads")
+        self.usage = get_usage_stats()
+        self.raw_store = RawDocumentStore(os.path.join(settings.documents_path, "objects"), self.usage.counters)
         self._load_documents_db()
+        self.documents_db = DocumentRegistry(self.documents_db, self.usage)
     
     def _load_documents_db(self):
         """Load documents database from file"""
+        if shared_state_enabled():
+            self._load_shared_documents_db()
+            return
         try:
             if os.path.exists(self.documents_db_file):
                 with open(self.documents_db_file, 'r', encoding='utf-8') as f:
@@ -39,12 +150,26 @@ class DocumentService:
             logger.error(f"Error loading documents database: {str(e)}")
             self.documents_db = {}
     
+    def _load_shared_documents_db(self):
+        """Use the registry in the shared state database (multi-worker mode)"""
+        self.documents_db = SharedDict(get_state_store(), "documents")
+        # First start in multi-worker mode: take over the single-process registry
+        if len(self.documents_db) == 0 and os.path.exists(self.documents_db_file):
+            with open(self.documents_db_file, 'r', encoding='utf-8') as f:
+                for doc_id, doc_info in json.load(f).items():
+                    get_state_store().add("documents", doc_id, doc_info)
+            logger.info(f"Imported {len(self.documents_db)} documents into the shared database")
+        logger.info(f"Using shared documents database ({len(self.documents_db)} documents)")
+    
     def _save_documents_db(self):
         """Save documents database to file"""
+        registry = self.documents_db.data
+        if isinstance(registry, SharedDict):
+            return  # Every assignment is already written to the shared database
         try:
             os.makedirs(os.path.dirname(self.documents_db_file), exist_ok=True)
             with open(self.documents_db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.documents_db, f, ensure_ascii=False, indent=2, default=str)
+                json.dump(registry, f, ensure_ascii=False, indent=2, default=str)
             logger.info("Documents database saved successfully")
         except Exception as e:
             logger.error(f"Error saving documents database: {str(e)}")
@@ -75,6 +200,9 @@ class DocumentService:
                 "metadata": metadata or {}
             }
             
+            # Keep the original content so the document can be re-indexed later
+            doc_info["content_hash"], doc_info["content_size"] = self.raw_store.put_text(content)
+            
             # Save document info
             self.documents_db[doc_id] = doc_info
             self._save_documents_db()
@@ -95,14 +223,18 @@ class DocumentService:
             
             # Add to RAG system if provided
             if rag_service:
-                result = rag_service.add_documents([langchain_doc])
-                doc_info["chunk_count"] = result["chunks_created"]
-                doc_info["status"] = DocumentStatus.COMPLETED.value
-                doc_info["updated_at"] = datetime.now().isoformat()
-                
-                # Update database
-                self.documents_db[doc_id] = doc_info
-                self._save_documents_db()
+                # Chunks and registry entry are written under the gate so a re-index sees them together
+                with rag_service.write_gate.shared():
+                    result = rag_service.add_documents([langchain_doc])
+                    doc_info["chunk_count"] = result["chunks_created"]
+                    # Chunks are numbered {doc_id}:0 ... so they can be looked up by ID
+                    doc_info["chunk_seq"] = result["chunks_created"]
+                    doc_info["status"] = DocumentStatus.COMPLETED.value
+                    doc_info["updated_at"] = datetime.now().isoformat()
+                    
+                    # Update database
+                    self.documents_db[doc_id] = doc_info
+                    self._save_documents_db()
                 
                 logger.info(f"Text document {doc_id} added successfully with {result['chunks_created']} chunks")
             else:
@@ -121,7 +253,8 @@ class DocumentService:
             logger.error(f"Error adding text document: {str(e)}")
             # Update status to failed
             if doc_id in self.documents_db:
-                self.documents_db[doc_id]["status"] = DocumentStatus.FAILED.value
+                doc_info["status"] = DocumentStatus.FAILED.value
+                self.documents_db[doc_id] = doc_info
                 self._save_documents_db()
             raise
     
@@ -130,9 +263,10 @@ class DocumentService:
         url: str,
         title: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
-        rag_service: Optional[RAGService] = None
+        rag_service: Optional[RAGService] = None,
+        page: Optional[WebPage] = None
     ) -> Dict[str, Any]:
-        """Add a web document"""
+        """Add a web document (``page``: the page already fetched, e.g. by the crawler)"""
         try:
             # Generate document ID
             doc_id = str(uuid.uuid4())
@@ -154,41 +288,41 @@ class DocumentService:
             self.documents_db[doc_id] = doc_info
             self._save_documents_db()
             
-            # Load web content
-            loader = WebBaseLoader(
-                web_paths=(url,),
-                bs_kwargs=dict(
-                    parse_only=bs4.SoupStrainer(
-                        class_=("post-content", "post-title", "post-header", "content", "article", "main")
-                    )
-                ),
-            )
-            docs = loader.load()
-            
-            if not docs:
+            # Load web content, keeping the validators for conditional refreshes
+            if page is None:
+                page = fetch_web_page(url)
+            if not page.text or not page.text.strip():
                 raise ValueError("No content could be loaded from the URL")
+            doc_info["metadata"] = {**(metadata or {}), HTTP_CACHE_KEY: http_cache_entry(page, time.time())}
+            
+            # Keep the extracted text so the page can be re-indexed without refetching
+            doc_info["content_hash"], doc_info["content_size"] = self.raw_store.put_text(page.text)
             
-            # Update document metadata with filtered values
-            for doc in docs:
-                doc_metadata = create_document_metadata(
+            docs = [Document(
+                page_content=page.text,
+                metadata=create_document_metadata(
                     doc_id=doc_id,
                     doc_type=DocumentType.WEB.value,
                     title=title,
                     source=url,
-                    custom_metadata=metadata
+                    custom_metadata={**(metadata or {}), **self._fetch_metadata(doc_info)}
                 )
-                doc.metadata.update(doc_metadata)
+            )]
             
             # Add to RAG system if provided
             if rag_service:
-                result = rag_service.add_documents(docs)
-                doc_info["chunk_count"] = result["chunks_created"]
-                doc_info["status"] = DocumentStatus.COMPLETED.value
-                doc_info["updated_at"] = datetime.now().isoformat()
-                
-                # Update database
-                self.documents_db[doc_id] = doc_info
-                self._save_documents_db()
+                # Chunks and registry entry are written under the gate so a re-index sees them together
+                with rag_service.write_gate.shared():
+                    result = rag_service.add_documents(docs)
+                    doc_info["chunk_count"] = result["chunks_created"]
+                    # Chunks are numbered {doc_id}:0 ... so they can be looked up by ID
+                    doc_info["chunk_seq"] = result["chunks_created"]
+                    doc_info["status"] = DocumentStatus.COMPLETED.value
+                    doc_info["updated_at"] = datetime.now().isoformat()
+                    
+                    # Update database
+                    self.documents_db[doc_id] = doc_info
+                    self._save_documents_db()
                 
                 logger.info(f"Web document {doc_id} added successfully with {result['chunks_created']} chunks")
             else:
@@ -207,10 +341,271 @@ class DocumentService:
             logger.error(f"Error adding web document: {str(e)}")
             # Update status to failed
             if doc_id in self.documents_db:
-                self.documents_db[doc_id]["status"] = DocumentStatus.FAILED.value
+                doc_info["status"] = DocumentStatus.FAILED.value
+                self.documents_db[doc_id] = doc_info
                 self._save_documents_db()
             raise
     
+    def refresh_web_document(self, doc_id: str, rag_service: RAGService) -> Dict[str, Any]:
+        """Re-fetch a web document with a conditional GET and re-index it if it changed.
+        
+        Nothing is re-processed when the server answers 304 or the extracted
+        text has the same hash as the stored one; otherwise only the chunks
+        whose text changed are embedded again.
+        """
+        doc_info = self.documents_db.get(doc_id)
+        if doc_info is None:
+            raise KeyError(f"Document {doc_id} not found")
+        if doc_info["doc_type"] != DocumentType.WEB.value or not doc_info.get("source"):
+            raise ValueError(f"Document {doc_id} is not a web document")
+        
+        cache = (doc_info.get("metadata") or {}).get(HTTP_CACHE_KEY) or {}
+        page = fetch_web_page(doc_info["source"], cache.get("etag"), cache.get("last_modified"))
+        result = {"doc_id": doc_id, "status": "not_modified"}
+        entry = http_cache_entry(page, time.time(), cache.get("fetched_at"))
+        
+        # Chunks and registry entry are written under the gate so a re-index sees them together
+        with rag_service.write_gate.shared():
+            if not page.not_modified:
+                if not page.text or not page.text.strip():
+                    raise ValueError("No content could be loaded from the URL")
+                content_hash, content_size = self.raw_store.put_text(page.text)
+                if content_hash == doc_info.get("content_hash"):
+                    result["status"] = "unchanged"
+                else:
+                    entry = http_cache_entry(page, entry["checked_at"])
+                    doc_info["metadata"] = {**(doc_info.get("metadata") or {}), HTTP_CACHE_KEY: entry}
+                    docs = [Document(
+                        page_content=page.text,
+                        metadata=create_document_metadata(
+                            doc_id=doc_id,
+                            doc_type=DocumentType.WEB.value,
+                            title=doc_info.get("title"),
+                            source=doc_info["source"],
+                            custom_metadata={**self._custom_metadata(doc_info), **self._fetch_metadata(doc_info)}
+                        )
+                    )]
+                    try:
+                        result.update(
+                            rag_service.update_document_chunks(doc_id, docs, doc_info.get("chunk_seq")), status="updated"
+                        )
+                    except Exception:
+                        self._release_content(content_hash)
+                        raise
+                    old_hash = doc_info.get("content_hash")
+                    doc_info["content_hash"], doc_info["content_size"] = content_hash, content_size
+                    doc_info["chunk_count"] = result["chunks_total"]
+                    chunk_seq = result.pop("chunk_seq")
+                    if chunk_seq is not None:
+                        doc_info["chunk_seq"] = chunk_seq
+                    doc_info["updated_at"] = datetime.now().isoformat()
+            
+            # The document may have been deleted while the page was fetched
+            if doc_id not in self.documents_db:
+                raise KeyError(f"Document {doc_id} not found")
+            doc_info["metadata"] = {**(doc_info.get("metadata") or {}), HTTP_CACHE_KEY: entry}
+            self.documents_db[doc_id] = doc_info
+            self._save_documents_db()
+        if result["status"] == "updated":
+            self._release_content(old_hash)
+        
+        logger.info(f"Refreshed web document {doc_id}: {result['status']}")
+        return result
+    
+    @staticmethod
+    def _custom_metadata(doc_data: Dict[str, Any]) -> Dict[str, Any]:
+        """User metadata of a document, without the fetch validators of web documents"""
+        return {key: value for key, value in (doc_data.get("metadata") or {}).items() if key != HTTP_CACHE_KEY}
+    
+    @staticmethod
+    def _fetch_metadata(doc_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Chunk metadata recording the fetch a web document's indexed content comes from"""
+        cache = (doc_data.get("metadata") or {}).get(HTTP_CACHE_KEY)
+        if not cache:
+            return {}
+        fetched_at = cache.get("fetched_at", cache.get("checked_at"))
+        return {
+            "fetched_at": datetime.fromtimestamp(fetched_at).isoformat() if fetched_at else None,
+            "etag": cache.get("etag")
+        }
+    
+    def _release_content(self, content_hash: Optional[str]):
+        """Drop stored content unless a document still refers to it"""
+        if content_hash and not any(
+            other.get("content_hash") == content_hash for other in self.documents_db.values()
+        ):
+            self.raw_store.delete(content_hash)
+    
+    @staticmethod
+    def detect_document_type(filename: str) -> Optional[DocumentType]:
+        """Get the document type for an uploaded file name (None if unsupported)"""
+        return FILE_DOCUMENT_TYPES.get(Path(filename).suffix.lower())
+    
+    def save_upload(self, fileobj: BinaryIO, filename: str) -> Tuple[str, int]:
+        """Stream an uploaded file to disk in fixed-size blocks.
+        
+        Returns the stored path and size. Raises ValueError when the file is
+        larger than ``max_upload_size_mb``.
+        """
+        os.makedirs(self.uploads_path, exist_ok=True)
+        path = os.path.join(self.uploads_path, f"{uuid.uuid4().hex}_{sanitize_filename(filename)}")
+        max_bytes = settings.max_upload_size_mb * 1024 * 1024
+        size = 0
+        try:
+            with open(path, "wb") as out:
+                while True:
+                    block = fileobj.read(UPLOAD_COPY_CHUNK_SIZE)
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > max_bytes:
+                        raise ValueError(f"File is larger than {settings.max_upload_size_mb} MB")
+                    out.write(block)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        
+        logger.info(f"Saved upload {filename} ({size} bytes) to {path}")
+        return path, size
+    
+    def _iter_file_parts(self, source: TextSource, doc_type: DocumentType, base_metadata: Dict[str, Any]) -> Iterator[Document]:
+        """Yield the parts of a file as documents (pages, sections or text blocks).
+        
+        ``source`` is a path, or for Markdown and text also an open text stream.
+        """
+        if doc_type == DocumentType.PDF:
+            for page_number, text in iter_pdf_pages(
+                source,
+                workers=settings.ingest_workers or default_pool_size(settings.workers),
+                pages_per_task=settings.pdf_pages_per_task
+            ):
+                if text.strip():
+                    yield Document(page_content=text, metadata={**base_metadata, "page": page_number})
+        elif doc_type == DocumentType.MARKDOWN:
+            for text, headers in iter_markdown_sections(source):
+                yield Document(page_content=text, metadata={**base_metadata, **headers})
+        else:
+            for text in iter_text_blocks(source):
+                yield Document(page_content=text, metadata=base_metadata)
+    
+    def add_file_document(
+        self,
+        file_path: str,
+        filename: str,
+        doc_type: DocumentType,
+        title: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        rag_service: Optional[RAGService] = None
+    ) -> Dict[str, Any]:
+        """Add an uploaded file (PDF, Markdown or text), streaming its content into the RAG system"""
+        try:
+            # Generate document ID
+            doc_id = str(uuid.uuid4())
+            
+            # Create document info
+            doc_info = {
+                "doc_id": doc_id,
+                "title": title or filename,
+                "source": filename,
+                "doc_type": doc_type.value,
+                "status": DocumentStatus.PROCESSING.value,
+                "chunk_count": 0,
+                "created_at": datetime.now().isoformat(),
+                "updated_at": datetime.now().isoformat(),
+                "metadata": metadata or {}
+            }
+            
+            # Keep the original file so the document can be re-indexed later
+            doc_info["content_hash"], doc_info["content_size"] = self.raw_store.put_file(file_path)
+            
+            # Save document info
+            self.documents_db[doc_id] = doc_info
+            self._save_documents_db()
+            
+            doc_metadata = create_document_metadata(
+                doc_id=doc_id,
+                doc_type=doc_type.value,
+                title=title or filename,
+                source=filename,
+                custom_metadata=metadata
+            )
+            
+            # Add to RAG system if provided; parts are extracted while earlier ones are embedded
+            if rag_service:
+                # Chunks and registry entry are written under the gate so a re-index sees them together
+                with rag_service.write_gate.shared():
+                    result = rag_service.add_document_stream(
+                        self._iter_file_parts(file_path, doc_type, doc_metadata)
+                    )
+                    if result["chunks_created"] == 0:
+                        raise ValueError("No text could be extracted from the file")
+                    
+                    doc_info["chunk_count"] = result["chunks_created"]
+                    # Chunks are numbered {doc_id}:0 ... so they can be looked up by ID
+                    doc_info["chunk_seq"] = result["chunks_created"]
+                    doc_info["status"] = DocumentStatus.COMPLETED.value
+                    doc_info["updated_at"] = datetime.now().isoformat()
+                    
+                    # Update database
+                    self.documents_db[doc_id] = doc_info
+                    self._save_documents_db()
+                
+                logger.info(f"File document {doc_id} ({filename}) added successfully with {result['chunks_created']} chunks")
+            else:
+                doc_info["status"] = DocumentStatus.PENDING.value
+                self.documents_db[doc_id] = doc_info
+                self._save_documents_db()
+            
+            return {
+                "doc_id": doc_id,
+                "status": doc_info["status"],
+                "message": "File document added successfully",
+                "chunk_count": doc_info["chunk_count"]
+            }
+            
+        except Exception as e:
+            logger.error(f"Error adding file document {filename}: {str(e)}")
+            # Update status to failed
+            if doc_id in self.documents_db:
+                doc_info["status"] = DocumentStatus.FAILED.value
+                self.documents_db[doc_id] = doc_info
+                self._save_documents_db()
+            raise
+        finally:
+            # The upload is only a staging copy; the content store keeps the original
+            if os.path.exists(file_path):
+                os.remove(file_path)
+    
+    def iter_document_parts(self, doc_id: str) -> Iterator[Document]:
+        """Stream a document's stored original content back as LangChain documents.
+        
+        Parts and metadata match what the document was ingested with, so they can
+        be fed straight into ``RAGService.add_document_stream`` to re-index it.
+        """
+        doc_data = self.documents_db.get(doc_id)
+        if not doc_data:
+            raise KeyError(f"Document {doc_id} not found")
+        content_hash = doc_data.get("content_hash")
+        if not content_hash:
+            raise ValueError(f"Document {doc_id} has no stored content")
+        
+        doc_type = DocumentType(doc_data["doc_type"])
+        base_metadata = create_document_metadata(
+            doc_id=doc_id,
+            doc_type=doc_type.value,
+            title=doc_data.get("title"),
+            source=doc_data.get("source"),
+            custom_metadata={**self._custom_metadata(doc_data), **self._fetch_metadata(doc_data)}
+        )
+        
+        if doc_type == DocumentType.PDF:
+            with self.raw_store.materialize(content_hash, suffix=".pdf") as path:
+                yield from self._iter_file_parts(path, doc_type, base_metadata)
+        else:
+            with self.raw_store.open_text(content_hash) as stream:
+                yield from self._iter_file_parts(stream, doc_type, base_metadata)
+    
     def get_document(self, doc_id: str) -> Optional[DocumentInfo]:
         """Get document information by ID"""
         try:
@@ -237,22 +632,29 @@ class DocumentService:
             logger.error(f"Error listing documents: {str(e)}")
             return []
     
-    def delete_document(self, doc_id: str) -> Dict[str, Any]:
-        """Delete a document"""
+    def delete_document(self, doc_id: str, rag_service=None) -> Dict[str, Any]:
+        """Delete a document, and its chunks from the vector store when ``rag_service`` is given"""
         try:
             if doc_id not in self.documents_db:
                 return {"status": "error", "message": "Document not found"}
             
-            # Remove from database
-            del self.documents_db[doc_id]
-            self._save_documents_db()
+            gate = rag_service.write_gate.shared() if rag_service is not None else nullcontext()
+            with gate:
+                # Remove the chunks first so a failure leaves the document listed
+                chunks_deleted = rag_service.delete_document_chunks(
+                    doc_id, self.documents_db[doc_id].get("chunk_seq")
+                ) if rag_service is not None else 0
+                
+                # Remove from database
+                doc_data = self.documents_db.pop(doc_id)
+                self._save_documents_db()
             
-            # Note: In a production system, you would also need to remove 
-            # the chunks from the vector store, which requires more complex logic
+            # Drop the stored content unless another document has the same content
+            self._release_content(doc_data.get("content_hash"))
             
             logger.info(f"Document {doc_id} deleted successfully")
             
-            return {"status": "success", "message": "Document deleted successfully"}
+            return {"status": "success", "message": "Document deleted successfully", "chunks_deleted": chunks_deleted}
             
         except Exception as e:
             logger.error(f"Error deleting document {doc_id}: {str(e)}")
@@ -261,21 +663,15 @@ class DocumentService:
     def get_stats(self) -> Dict[str, Any]:
         """Get document statistics"""
         try:
-            total_docs = len(self.documents_db)
-            status_counts = {}
-            type_counts = {}
-            
-            for doc_data in self.documents_db.values():
-                status = doc_data["status"]
-                doc_type = doc_data["doc_type"]
-                
-                status_counts[status] = status_counts.get(status, 0) + 1
-                type_counts[doc_type] = type_counts.get(doc_type, 0) + 1
-            
+            counters = self.usage.counters
             return {
-                "total_documents": total_docs,
-                "by_status": status_counts,
-                "by_type": type_counts
+                "total_documents": counters.get("documents.total"),
+                "total_chunks": counters.get("documents.chunks"),
+                "by_status": counters.with_prefix("documents.status."),
+                "by_type": counters.with_prefix("documents.type."),
+                "raw_store": self.raw_store.get_stats(),
+                # Per worker: recent activity per minute (last hour) and per hour (last day)
+                "activity": self.usage.rollups("ingestions", "chunks_ingested", "ingestion_failures")
             }
             
         except Exception as e:
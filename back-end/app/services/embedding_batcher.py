@@ -0,0 +1,108 @@
+from typing import Callable, Dict, List, Any
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Micro-batches concurrent query embeddings into one API call.
+
+    Texts submitted within ``max_wait`` seconds of the oldest pending text
+    (or until ``max_batch_size`` texts are pending) are embedded with a
+    single batched call, and each caller's future is resolved with its own
+    vector. Batches are dispatched on a small pool so a slow API call
+    doesn't hold back the next batch.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        max_in_flight: int = 4
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._pending: List[Any] = []
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedding-batch")
+        self._collector = threading.Thread(target=self._collect, name="embedding-batcher", daemon=True)
+        self._collector.start()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes: Dict[int, int] = {}
+        self._batches = 0
+        self._items = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+
+    def submit(self, text: str) -> Future:
+        """Queue a text and return a future for its embedding"""
+        future: Future = Future()
+        with self._condition:
+            self._pending.append((text, future, time.monotonic()))
+            self._condition.notify()
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a single text through the batcher"""
+        return self.submit(text).result()
+
+    def _collect(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = self._pending[0][2] + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+
+            self._record(batch)
+            self._executor.submit(self._flush, batch)
+
+    def _flush(self, batch):
+        texts = [text for text, _, _ in batch]
+        try:
+            vectors = self.embed_batch(texts)
+            if len(vectors) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+        except BaseException as e:
+            logger.error(f"Error embedding batch of {len(batch)} queries: {str(e)}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def _record(self, batch):
+        now = time.monotonic()
+        with self._stats_lock:
+            size = len(batch)
+            self._batches += 1
+            self._items += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            for _, _, enqueued_at in batch:
+                wait = now - enqueued_at
+                self._total_wait += wait
+                self._max_wait_seen = max(self._max_wait_seen, wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batch size and queueing delay statistics"""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "batches": self._batches,
+                "queries": self._items,
+                "average_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "average_wait_ms": round(self._total_wait / self._items * 1000, 3) if self._items else 0.0,
+                "max_observed_wait_ms": round(self._max_wait_seen * 1000, 3)
+            }
@@ -0,0 +1,126 @@
+from typing import Dict, Iterator, List, TextIO, Tuple, Union
+from collections import deque
+from contextlib import contextmanager
+import logging
+import os
+import re
+
+from app.utils.process_pool import get_process_pool
+
+logger = logging.getLogger(__name__)
+
+TextSource = Union[str, os.PathLike, TextIO]
+
+@contextmanager
+def _open_text(source: TextSource):
+    """Open a path as UTF-8 text, or pass an already open text stream through"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            yield f
+    else:
+        yield source
+
+# PDF
+
+def _extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) (runs in a worker process)"""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def count_pdf_pages(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+def iter_pdf_pages(path: str, workers: int = 1, pages_per_task: int = 8) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) for each page of a PDF, in order.
+
+    With more than one worker, page ranges are extracted in the process pool
+    with a bounded number of ranges in flight, so memory stays flat however
+    long the document is.
+    """
+    page_count = count_pdf_pages(path)
+
+    if workers <= 1:
+        from pypdf import PdfReader
+        reader = PdfReader(path)
+        for i in range(page_count):
+            yield i + 1, reader.pages[i].extract_text() or ""
+        return
+
+    pool = get_process_pool(workers)
+    ranges = deque((start, min(start + pages_per_task, page_count)) for start in range(0, page_count, pages_per_task))
+    in_flight = deque()
+    while ranges or in_flight:
+        while ranges and len(in_flight) < workers * 2:
+            start, end = ranges.popleft()
+            in_flight.append((start, pool.submit(_extract_pdf_pages, path, start, end)))
+        start, future = in_flight.popleft()
+        for offset, text in enumerate(future.result()):
+            yield start + offset + 1, text
+
+# Markdown
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+def iter_markdown_sections(source: TextSource, max_section_chars: int = 1_000_000) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """Yield (text, headers) for each section of a Markdown file.
+
+    The file (a path or an open text stream) is read line by line. A section starts at each heading outside a
+    fenced code block, and its metadata holds the enclosing headings as
+    ``Header 1`` ... ``Header 6``. Very long sections are cut at blank lines.
+    """
+    headers: Dict[int, str] = {}
+    lines: List[str] = []
+    size = 0
+    in_fence = False
+
+    def current_headers() -> Dict[str, str]:
+        return {f"Header {level}": title for level, title in sorted(headers.items())}
+
+    with _open_text(source) as f:
+        for line in f:
+            if _FENCE.match(line):
+                in_fence = not in_fence
+            heading = None if in_fence else _HEADING.match(line)
+
+            if heading:
+                if "".join(lines).strip():
+                    yield "".join(lines), current_headers()
+                lines, size = [], 0
+                level = len(heading.group(1))
+                headers = {lvl: title for lvl, title in headers.items() if lvl < level}
+                headers[level] = heading.group(2)
+
+            lines.append(line)
+            size += len(line)
+            if size >= max_section_chars and not in_fence and not line.strip():
+                yield "".join(lines), current_headers()
+                lines, size = [], 0
+
+    if "".join(lines).strip():
+        yield "".join(lines), current_headers()
+
+# Plain text
+
+def iter_text_blocks(source: TextSource, block_chars: int = 1_000_000) -> Iterator[str]:
+    """Yield a text file (a path or an open text stream) in blocks of about ``block_chars``, cut at paragraph boundaries"""
+    buffer = ""
+    with _open_text(source) as f:
+        while True:
+            data = f.read(block_chars)
+            if not data:
+                break
+            buffer += data
+            cut = buffer.rfind("\n\n")
+            if cut <= 0 and len(buffer) >= 2 * block_chars:
+                # No paragraph break for a while: settle for a line or word boundary
+                cut = max(buffer.rfind("\n"), buffer.rfind(" "))
+                if cut <= 0:
+                    cut = len(buffer)
+            if cut > 0:
+                yield buffer[:cut]
+                buffer = buffer[cut:]
+    if buffer.strip():
+        yield buffer
@@ -0,0 +1,437 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import logging
+import re
+
+from app.core.config import settings
+from app.utils.process_pool import default_pool_size, get_process_pool
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional, the standard library parser is used without it
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+# Elements whose text is kept by the "classes" extractor
+WEB_CONTENT_CLASSES = ("post-content", "post-title", "post-header", "content", "article", "main")
+
+class ExtractedPage(NamedTuple):
+    text: str
+    title: Optional[str]
+    # Absolute URLs of the page's links (only collected on request)
+    links: Tuple[str, ...]
+
+class HtmlExtractor:
+    """Turns an HTML page into the text to index"""
+
+    name = "base"
+
+    def extract(self, html: str, base_url: str, with_links: bool = False) -> ExtractedPage:
+        raise NotImplementedError
+
+class ClassListExtractor(HtmlExtractor):
+    """Text of the elements with one of ``WEB_CONTENT_CLASSES`` (BeautifulSoup).
+
+    Fits blogs that use those class names and returns nothing on other sites.
+    """
+
+    name = "classes"
+
+    def extract(self, html: str, base_url: str, with_links: bool = False) -> ExtractedPage:
+        import bs4
+
+        soup = bs4.BeautifulSoup(html, "html.parser", parse_only=bs4.SoupStrainer(class_=WEB_CONTENT_CLASSES))
+        if not with_links:
+            return ExtractedPage(soup.get_text(), None, ())
+
+        soup_links = bs4.BeautifulSoup(html, "html.parser", parse_only=bs4.SoupStrainer(["title", "a", "base"]))
+        title_tag = soup_links.find("title")
+        title = title_tag.get_text().strip() or None if title_tag else None
+        base_tag = soup_links.find("base", href=True)
+        hrefs = [anchor["href"] for anchor in soup_links.find_all("a", href=True)]
+        return ExtractedPage(soup.get_text(), title, _resolve_links(hrefs, base_url, base_tag["href"] if base_tag else None))
+
+# Readability-style extraction
+
+_BLOCK_TAGS = frozenset((
+    "address", "article", "aside", "blockquote", "body", "caption", "dd", "details", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "html", "li", "main", "nav", "ol", "p", "pre", "section", "summary", "table", "tbody", "td",
+    "tfoot", "th", "thead", "tr", "ul"
+))
+_VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"
+))
+_HEADING_TAGS = frozenset(("h1", "h2", "h3", "h4", "h5", "h6"))
+
+# Subtrees that never hold the main content
+_SKIP_TAGS = frozenset((
+    "aside", "button", "canvas", "footer", "iframe", "math", "nav", "noscript", "object", "script", "select",
+    "style", "svg", "template", "textarea"
+))
+_SKIP_ROLES = frozenset(("banner", "complementary", "contentinfo", "dialog", "menu", "menubar", "navigation"))
+_NEVER_SKIPPED = frozenset(("html", "body", "article", "main", "a"))
+
+# Class / id patterns (after Mozilla Readability)
+_UNLIKELY = re.compile(
+    r"banner|breadcrumb|combx|comment|community|cookie|disqus|extra|footer|gdpr|header|legends|menu|modal|"
+    r"nav|pager|pagination|popup|promo|related|remark|replies|rss|share|shoutbox|sidebar|skyscraper|social|"
+    r"sponsor|subscribe|ad-break|agegate"
+)
+_MAYBE = re.compile(r"article|body|column|content|entry|main|post|shadow|title")
+_POSITIVE = re.compile(r"article|body|content|entry|hentry|h-entry|main|page|post|text|blog|story")
+_NEGATIVE = re.compile(
+    r"-ad-|hidden|banner|combx|comment|com-|contact|foot|footnote|gdpr|masthead|media|meta|outbrain|promo|"
+    r"related|scroll|share|shoutbox|sidebar|skyscraper|sponsor|shopping|tags|tool|widget"
+)
+_TAG_WEIGHTS = {
+    "article": 10, "main": 5, "div": 5, "pre": 3, "td": 3, "blockquote": 3,
+    "address": -3, "ol": -3, "ul": -3, "dl": -3, "dd": -3, "dt": -3, "li": -3, "form": -3,
+    "h1": -5, "h2": -5, "h3": -5, "h4": -5, "h5": -5, "h6": -5, "th": -5
+}
+
+# Text blocks shorter than this don't count as paragraphs when scoring
+MIN_PARAGRAPH_CHARS = 25
+
+# Below this much main content, every non-boilerplate block is kept instead
+MIN_CONTENT_CHARS = 250
+
+# Blocks whose text is mostly link text (menus, tag lists) are dropped
+MAX_LINK_DENSITY = 0.5
+
+# When this many other elements score close to the best one, their common ancestor is the content
+MIN_TOP_CANDIDATES = 3
+
+_IGNORED_HREFS = ("#", "mailto:", "javascript:", "tel:", "data:")
+
+def _resolve_links(hrefs: List[str], page_url: str, base_href: Optional[str]) -> Tuple[str, ...]:
+    base = urljoin(page_url, base_href) if base_href else page_url
+    links = (urljoin(base, href.strip()) for href in hrefs if href.strip() and not href.strip().startswith(_IGNORED_HREFS))
+    return tuple(dict.fromkeys(links))
+
+class _BlockCollector:
+    """Parser target that splits a page into text blocks, skipping boilerplate subtrees.
+
+    Only block-level elements become nodes; each text block belongs to the
+    innermost open block element. Both the lxml and the standard library
+    parsers drive it through ``start`` / ``end`` / ``data`` calls.
+    """
+
+    def __init__(self, with_links: bool):
+        self.with_links = with_links
+        # Node 0 is the document
+        self.parents: List[int] = [-1]
+        self.tags: List[str] = ["#document"]
+        self.weights: List[int] = [0]
+        # Blocks: (text, link_chars, node)
+        self.blocks: List[Tuple[str, int, int]] = []
+        self.title: Optional[str] = None
+        self.base_href: Optional[str] = None
+        self.hrefs: List[str] = []
+
+        self._stack: List[Tuple[str, int]] = []
+        self._node = 0
+        self._skip_level: Optional[int] = None
+        self._parts: List[str] = []
+        self._link_chars = 0
+        self._in_link = 0
+        self._in_pre = 0
+        self._title_parts: Optional[List[str]] = None
+
+    def _flush(self):
+        if not self._parts:
+            return
+        text = "".join(self._parts)
+        self._parts = []
+        if self._in_pre:
+            text = text.strip("\n")
+        else:
+            text = "\n".join(" ".join(line.split()) for line in text.split("\n") if line and not line.isspace())
+        if text.strip():
+            self.blocks.append((text, min(self._link_chars, len(text)), self._node))
+        self._link_chars = 0
+
+    def _boilerplate(self, tag: str, attrs) -> bool:
+        if tag in _SKIP_TAGS:
+            return True
+        if tag in _NEVER_SKIPPED:
+            return False
+        if "hidden" in attrs or attrs.get("aria-hidden") == "true" or attrs.get("role") in _SKIP_ROLES:
+            return True
+        if "display:none" in (attrs.get("style") or "").replace(" ", "").lower():
+            return True
+        if tag == "header" and not self._inside(("article", "main")):
+            return True
+        class_id = f"{attrs.get('class') or ''} {attrs.get('id') or ''}".lower()
+        return bool(class_id.strip()) and _UNLIKELY.search(class_id) is not None and _MAYBE.search(class_id) is None
+
+    def _inside(self, tags) -> bool:
+        node = self._node
+        while node > 0:
+            if self.tags[node] in tags:
+                return True
+            node = self.parents[node]
+        return False
+
+    def _class_weight(self, attrs) -> int:
+        weight = 0
+        for value in (attrs.get("class"), attrs.get("id")):
+            if value:
+                value = value.lower()
+                if _NEGATIVE.search(value):
+                    weight -= 25
+                if _POSITIVE.search(value):
+                    weight += 25
+        return weight
+
+    def start(self, tag, attrs, nsmap=None):
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+        if tag == "a" and self.with_links and attrs.get("href"):
+            self.hrefs.append(attrs["href"])
+        elif tag == "base" and attrs.get("href") and self.base_href is None:
+            self.base_href = attrs["href"]
+        if tag in _VOID_TAGS:
+            if tag == "br" and self._skip_level is None:
+                self._parts.append("\n")
+            elif tag == "hr":
+                self._flush()
+            return
+
+        if self._skip_level is None:
+            if tag == "title" and self.title is None:
+                self._title_parts = []
+            elif self._boilerplate(tag, attrs):
+                if tag in _BLOCK_TAGS:
+                    self._flush()
+                self._skip_level = len(self._stack)
+            elif tag in _BLOCK_TAGS:
+                # A block element closes an open paragraph (the lxml parser does this itself)
+                if self._stack and self._stack[-1][0] == "p":
+                    self.end("p")
+                elif tag == "li" and self._open_list_item():
+                    self.end("li")
+                self._flush()
+                self.parents.append(self._node)
+                self.tags.append(tag)
+                self.weights.append(_TAG_WEIGHTS.get(tag, 0) + self._class_weight(attrs))
+                self._node = len(self.tags) - 1
+                self._stack.append((tag, self._node))
+                if tag == "pre":
+                    self._in_pre += 1
+                return
+            elif tag == "a":
+                self._in_link += 1
+        self._stack.append((tag, -1))
+
+    def _open_list_item(self) -> bool:
+        for tag, _ in reversed(self._stack):
+            if tag == "li":
+                return True
+            if tag in ("ul", "ol"):
+                return False
+        return False
+
+    def end(self, tag):
+        if not isinstance(tag, str):
+            return
+        tag = tag.lower()
+        if tag == "title" and self._title_parts is not None:
+            self.title = " ".join("".join(self._title_parts).split()) or None
+            self._title_parts = None
+        for index in range(len(self._stack) - 1, -1, -1):
+            if self._stack[index][0] == tag:
+                break
+        else:
+            return  # Stray end tag
+        while len(self._stack) > index:
+            open_tag, node = self._stack.pop()
+            if self._skip_level is not None:
+                if len(self._stack) <= self._skip_level:
+                    self._skip_level = None
+                continue
+            if node >= 0:
+                self._flush()
+                if open_tag == "pre":
+                    self._in_pre -= 1
+                self._node = self.parents[node]
+            elif open_tag == "a":
+                self._in_link -= 1
+
+    def data(self, text: str):
+        if self._title_parts is not None:
+            self._title_parts.append(text)
+        elif self._skip_level is None:
+            if not self._in_pre:
+                text = text.replace("\n", " ")
+            self._parts.append(text)
+            if self._in_link:
+                self._link_chars += len(text.strip())
+
+    def close(self):
+        while self._stack:
+            self.end(self._stack[-1][0])
+        self._flush()
+        return self
+
+class _StandardLibraryDriver(HTMLParser):
+    """Feeds ``html.parser`` events to a parser target"""
+
+    def __init__(self, target: _BlockCollector):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+class ReadabilityExtractor(HtmlExtractor):
+    """Main content of the page, without navigation, headers, footers and sidebars.
+
+    The page is parsed in a single pass (lxml when installed, ``html.parser``
+    otherwise) into text blocks, dropping subtrees that are boilerplate by tag,
+    role or class/id. Paragraph-sized blocks then score their enclosing
+    elements as Readability does (text length and commas, class/id weights,
+    penalized by link density); the blocks of the best element and of
+    similarly scored siblings form the text. Pages without a clear main
+    element keep all their non-boilerplate blocks.
+    """
+
+    name = "readability"
+
+    def __init__(self, parser: Optional[str] = None):
+        self.parser = parser or ("lxml" if etree is not None else "html.parser")
+
+    def _collect(self, html: str, with_links: bool) -> _BlockCollector:
+        collector = _BlockCollector(with_links)
+        if self.parser == "lxml":
+            parser = etree.HTMLParser(target=collector, remove_comments=True, remove_pis=True)
+            parser.feed(html)
+            parser.close()
+        else:
+            driver = _StandardLibraryDriver(collector)
+            driver.feed(html)
+            driver.close()
+            collector.close()
+        return collector
+
+    def extract(self, html: str, base_url: str, with_links: bool = False) -> ExtractedPage:
+        collector = self._collect(html, with_links)
+        links = _resolve_links(collector.hrefs, base_url, collector.base_href) if with_links else ()
+        return ExtractedPage("\n\n".join(self._select(collector)), collector.title, links)
+
+    def _select(self, collector: _BlockCollector) -> List[str]:
+        parents, tags = collector.parents, collector.tags
+        text_chars = [0] * len(parents)
+        link_chars = [0] * len(parents)
+        scores: Dict[int, float] = {}
+
+        for text, links, node in collector.blocks:
+            ancestor = node
+            while ancestor > 0:
+                text_chars[ancestor] += len(text)
+                link_chars[ancestor] += links
+                ancestor = parents[ancestor]
+            if len(text) < MIN_PARAGRAPH_CHARS:
+                continue
+            score = 1 + text.count(",") + min(len(text) // 100, 3)
+            ancestor = node
+            for level in range(3):
+                if ancestor <= 0:
+                    break
+                if ancestor not in scores:
+                    scores[ancestor] = collector.weights[ancestor]
+                scores[ancestor] += score / (1 if level == 0 else level * 2)
+                ancestor = parents[ancestor]
+
+        def link_density(node: int) -> float:
+            return link_chars[node] / text_chars[node] if text_chars[node] else 0.0
+
+        final = {node: score * (1 - link_density(node)) for node, score in scores.items()}
+        selected = set()
+        if final:
+            ranked = sorted(final, key=final.get, reverse=True)
+            top = ranked[0]
+            # Content split into several similar blocks (sections, columns): take their common ancestor
+            alternatives = [node for node in ranked[1:5] if final[node] >= final[top] * 0.75]
+            if len(alternatives) >= MIN_TOP_CANDIDATES:
+                alternative_ancestors = []
+                for node in alternatives:
+                    ancestors = set()
+                    while node > 0:
+                        ancestors.add(node)
+                        node = parents[node]
+                    alternative_ancestors.append(ancestors)
+                ancestor = parents[top]
+                while ancestor > 0:
+                    if sum(1 for ancestors in alternative_ancestors if ancestor in ancestors) >= MIN_TOP_CANDIDATES:
+                        top = ancestor
+                        break
+                    ancestor = parents[ancestor]
+            final.setdefault(top, 0.0)
+            threshold = max(10.0, final[top] * 0.2)
+            selected = {top} | {
+                node for node, score in final.items()
+                if parents[node] == parents[top] and node != top and score >= threshold
+            }
+
+        in_selection: Dict[int, bool] = {0: False}
+
+        def selected_node(node: int) -> bool:
+            path = []
+            while node not in in_selection and node not in selected:
+                path.append(node)
+                node = parents[node]
+            result = node in selected or in_selection[node]
+            for visited in path:
+                in_selection[visited] = result
+            return result
+
+        def keep(text: str, links: int, node: int) -> bool:
+            return tags[node] in _HEADING_TAGS or links / len(text) <= MAX_LINK_DENSITY
+
+        texts = [text for text, links, node in collector.blocks if selected_node(node) and keep(text, links, node)]
+        if sum(len(text) for text in texts) < MIN_CONTENT_CHARS:
+            texts = [text for text, links, node in collector.blocks if keep(text, links, node)]
+        return texts
+
+EXTRACTORS = {
+    ReadabilityExtractor.name: ReadabilityExtractor,
+    ClassListExtractor.name: ClassListExtractor
+}
+
+def get_html_extractor(name: Optional[str] = None) -> HtmlExtractor:
+    """Extractor by name (default: the ``html_extractor`` setting)"""
+    name = (name or settings.html_extractor).lower()
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown HTML extractor: {name}")
+    return EXTRACTORS[name]()
+
+def _extract(name: str, html: str, base_url: str, with_links: bool) -> ExtractedPage:
+    """Run an extractor (in a worker process for large pages)"""
+    return get_html_extractor(name).extract(html, base_url, with_links)
+
+def extract_html(html: str, base_url: str, with_links: bool = False) -> ExtractedPage:
+    """Extract a page with the configured extractor.
+
+    Pages of at least ``html_extract_pool_min_chars`` are parsed in the
+    ingestion process pool, so parsing doesn't hold the GIL of the server
+    process while other requests (and other crawl fetches) are served.
+    """
+    name = settings.html_extractor
+    workers = settings.ingest_workers or default_pool_size(settings.workers)
+    if workers <= 1 or len(html) < settings.html_extract_pool_min_chars:
+        return _extract(name, html, base_url, with_links)
+    return get_process_pool(workers).submit(_extract, name, html, base_url, with_links).result()
@@ -0,0 +1,163 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+import logging
+import math
+import re
+import threading
+import time
+
+from app.utils.helpers import detect_language, normalize_question
+
+logger = logging.getLogger(__name__)
+
+QUESTION = "question"
+
+# Small-talk messages the router knows, used both as exact-match rules and as
+# training data for the naive Bayes fallback. Everything else is a question.
+_EXAMPLES: Dict[str, List[str]] = {
+    "greeting": [
+        "xin chào", "chào", "chào bạn", "chào bot", "chào buổi sáng", "chào buổi tối", "alo", "xin chào bạn",
+        "hello", "hi", "hey", "hi there", "hello there", "hey bot", "good morning", "good afternoon", "good evening"
+    ],
+    "thanks": [
+        "cảm ơn", "cám ơn", "cảm ơn bạn", "cảm ơn nhiều", "cảm ơn bạn nhiều", "thank", "tks", "thanks",
+        "thank you", "thanks a lot", "thanks so much", "thank you very much", "many thanks"
+    ],
+    "goodbye": [
+        "tạm biệt", "tạm biệt bạn", "bye", "bye bye", "goodbye", "good bye", "hẹn gặp lại", "see you",
+        "see you later"
+    ],
+    "identity": [
+        "bạn là ai", "bạn là gì", "bạn tên là gì", "bạn tên gì", "ai tạo ra bạn", "bạn có thể làm gì",
+        "who are you", "what are you", "what is your name", "what can you do", "who made you"
+    ],
+    "chitchat": [
+        "bạn khỏe không", "bạn có khỏe không", "khỏe không", "ok", "oke", "được rồi", "tốt", "tuyệt vời",
+        "hay quá", "how are you", "how are you doing", "okay", "cool", "great", "nice", "awesome"
+    ],
+    QUESTION: [
+        "là gì", "là ai", "tại sao", "như thế nào", "cách nào", "bao nhiêu", "khi nào", "ở đâu",
+        "giải thích", "định nghĩa", "so sánh", "liệt kê", "hướng dẫn", "tóm tắt", "tài liệu", "nội dung",
+        "what is", "how does", "how do i", "why", "when", "where", "explain", "define", "compare",
+        "list", "summarize", "describe", "document", "difference between", "example of"
+    ]
+}
+
+RESPONSES: Dict[str, Dict[str, str]] = {
+    "greeting": {
+        "vi": "Xin chào! Bạn muốn tìm hiểu điều gì trong tài liệu?",
+        "en": "Hello! What would you like to know from the documents?"
+    },
+    "thanks": {
+        "vi": "Không có gì! Bạn cần hỏi thêm gì cứ nói nhé.",
+        "en": "You're welcome! Let me know if you have more questions."
+    },
+    "goodbye": {
+        "vi": "Tạm biệt! Hẹn gặp lại bạn.",
+        "en": "Goodbye! See you next time."
+    },
+    "identity": {
+        "vi": "Mình là trợ lý AI trả lời câu hỏi dựa trên các tài liệu trong knowledge base.",
+        "en": "I'm an AI assistant that answers questions from the documents in the knowledge base."
+    },
+    "chitchat": {
+        "vi": "Mình luôn sẵn sàng! Bạn muốn hỏi gì về tài liệu?",
+        "en": "I'm ready to help! What would you like to ask about the documents?"
+    }
+}
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+class Intent(NamedTuple):
+    name: str
+    confidence: float
+    # Canned answer for small talk, None for questions
+    response: Optional[str]
+
+class IntentRouter:
+    """Routes small talk away from retrieval before it reaches the RAG path.
+
+    Exact (normalized) matches against the known phrases are answered right
+    away. Other short messages go through a multinomial naive Bayes model over
+    words, trained on the same phrases at startup; only confident small-talk
+    predictions are answered without retrieval. Longer messages are always
+    questions. Classification is a few dictionary lookups per word.
+    """
+
+    def __init__(self, min_confidence: float = 0.8, max_words: int = 6):
+        self.min_confidence = min_confidence
+        self.max_words = max_words
+        self._rules: Dict[str, str] = {}
+        for intent, phrases in _EXAMPLES.items():
+            if intent != QUESTION:
+                for phrase in phrases:
+                    self._rules[self._normalize(phrase)] = intent
+        self._train()
+        self._stats_lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        self._total_time = 0.0
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(_TOKEN_PATTERN.findall(normalize_question(text)))
+
+    def _train(self):
+        """Fit word log-likelihoods with add-one smoothing"""
+        vocabulary = {word for phrases in _EXAMPLES.values() for phrase in phrases for word in self._normalize(phrase).split()}
+        total_examples = sum(len(phrases) for phrases in _EXAMPLES.values())
+        self._priors: Dict[str, float] = {}
+        self._log_likelihoods: Dict[str, Dict[str, float]] = {}
+        self._unknown: Dict[str, float] = {}
+        for intent, phrases in _EXAMPLES.items():
+            counts: Dict[str, int] = {}
+            for phrase in phrases:
+                for word in self._normalize(phrase).split():
+                    counts[word] = counts.get(word, 0) + 1
+            denominator = sum(counts.values()) + len(vocabulary) + 1
+            self._priors[intent] = math.log(len(phrases) / total_examples)
+            self._log_likelihoods[intent] = {word: math.log((count + 1) / denominator) for word, count in counts.items()}
+            self._unknown[intent] = math.log(1 / denominator)
+
+    def _predict(self, words: List[str]) -> Intent:
+        scores = {}
+        for intent, prior in self._priors.items():
+            likelihoods = self._log_likelihoods[intent]
+            unknown = self._unknown[intent]
+            scores[intent] = prior + sum(likelihoods.get(word, unknown) for word in words)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        confidence = 1 / sum(math.exp(score - top) for score in scores.values())
+        return Intent(best, confidence, None)
+
+    def classify(self, message: str) -> Intent:
+        """Intent of a message, with the canned answer for small talk"""
+        started = time.perf_counter()
+        normalized = self._normalize(message)
+        words = normalized.split()
+
+        intent = self._rules.get(normalized)
+        if intent is not None:
+            result = Intent(intent, 1.0, None)
+        elif not words or len(words) > self.max_words:
+            result = Intent(QUESTION, 1.0, None)
+        else:
+            result = self._predict(words)
+            if result.confidence < self.min_confidence:
+                result = Intent(QUESTION, result.confidence, None)
+
+        if result.name != QUESTION:
+            result = result._replace(response=RESPONSES[result.name][detect_language(message)])
+
+        with self._stats_lock:
+            self._counts[result.name] = self._counts.get(result.name, 0) + 1
+            self._total_time += time.perf_counter() - started
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            classified = sum(self._counts.values())
+            return {
+                "classified": classified,
+                "intents": dict(sorted(self._counts.items())),
+                "routed_away_from_rag": classified - self._counts.get(QUESTION, 0),
+                "average_time_us": round(self._total_time / classified * 1e6, 2) if classified else 0.0
+            }
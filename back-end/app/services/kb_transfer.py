@@ -0,0 +1,352 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from datetime import datetime
+import base64
+import gzip
+import json
+import logging
+import os
+import tempfile
+import zlib
+
+from app.core.config import settings
+from app.models.document import DocumentStatus
+from app.services.api_scheduler import Priority, api_priority
+from app.services.vector_index import document_chunk_ids
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT_VERSION = 1
+
+# Raw content is exported in base64 lines of at most this many (decoded) bytes
+CONTENT_BLOCK_SIZE = 512 * 1024
+
+# Chunks read from the vector store per request while exporting
+CHUNK_PAGE_SIZE = 500
+
+# Registry saves during an import (single-process mode rewrites the whole file)
+SAVE_EVERY_DOCUMENTS = 100
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+class ExportFormatError(ValueError):
+    """Invalid or truncated knowledge base export"""
+
+def export_records(document_service, rag_service, include_embeddings: bool = False) -> Iterator[Dict[str, Any]]:
+    """Export the knowledge base as a stream of records.
+
+    A ``header`` record (format, index config) comes first, then for every
+    completed document a ``document`` record with its registry entry, its
+    original content as ``content`` records (base64 blocks) and its chunks as
+    ``chunk`` records (text, metadata and optionally the embedding), and an
+    ``end`` record with the totals last. Documents, content and chunks are
+    read one page at a time, so memory use doesn't depend on the size of the
+    knowledge base.
+
+    The active collection is checked before the returned generator starts.
+    """
+    rag_service.refresh_index()
+    index = rag_service.index
+    collection = getattr(index.vectorstore, "_collection", None)
+    if collection is None:
+        raise RuntimeError("The knowledge base can't be exported while a snapshot is being imported")
+    return _iter_export(document_service, index, collection, include_embeddings)
+
+def _iter_export(document_service, index, collection, include_embeddings: bool) -> Iterator[Dict[str, Any]]:
+    doc_ids = [
+        doc_id for doc_id, doc_data in list(document_service.documents_db.items())
+        if doc_data.get("status") == DocumentStatus.COMPLETED.value
+    ]
+    yield {
+        "type": "header",
+        "format_version": EXPORT_FORMAT_VERSION,
+        "exported_at": datetime.now().isoformat(),
+        "collection": index.name,
+        "config": index.config,
+        "includes_embeddings": include_embeddings,
+        "documents": len(doc_ids)
+    }
+
+    include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+    documents = chunks = 0
+    for doc_id in doc_ids:
+        doc_data = document_service.documents_db.get(doc_id)
+        if doc_data is None:
+            continue  # Deleted meanwhile
+        yield {"type": "document", "document": doc_data}
+
+        content_hash = doc_data.get("content_hash")
+        if content_hash and document_service.raw_store.exists(content_hash):
+            with document_service.raw_store.open(content_hash) as stream:
+                for block in iter(lambda: stream.read(CONTENT_BLOCK_SIZE), b""):
+                    yield {"type": "content", "doc_id": doc_id, "data": base64.b64encode(block).decode("ascii")}
+
+        chunk_ids = document_chunk_ids(collection, doc_id, doc_data.get("chunk_seq"))
+        exported = 0
+        for start in range(0, len(chunk_ids), CHUNK_PAGE_SIZE):
+            page = collection.get(ids=chunk_ids[start:start + CHUNK_PAGE_SIZE], include=include)
+            order = {chunk_id: i for i, chunk_id in enumerate(page["ids"])}
+            for chunk_id in chunk_ids[start:start + CHUNK_PAGE_SIZE]:
+                i = order.get(chunk_id)
+                if i is None:
+                    continue  # Deleted meanwhile
+                record = {
+                    "type": "chunk",
+                    "doc_id": doc_id,
+                    "id": chunk_id,
+                    "text": page["documents"][i] or "",
+                    "metadata": page["metadatas"][i] or {}
+                }
+                if include_embeddings:
+                    record["embedding"] = [float(x) for x in page["embeddings"][i]]
+                yield record
+                exported += 1
+        documents += 1
+        chunks += exported
+
+    yield {"type": "end", "documents": documents, "chunks": chunks}
+    logger.info(f"Exported {documents} documents and {chunks} chunks from {index.name}")
+
+def iter_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Serialize records as NDJSON lines"""
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+
+def iter_gzip(blocks: Iterable[bytes], level: int = 6, flush_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Gzip a byte stream on the fly, yielding compressed output every ``flush_size`` input bytes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    pending = 0
+    for block in blocks:
+        out = compressor.compress(block)
+        pending += len(block)
+        if pending >= flush_size:
+            out += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if out:
+            yield out
+    yield compressor.flush()
+
+def export_to_file(path: str, document_service, rag_service, include_embeddings: bool = False) -> Dict[str, Any]:
+    """Write an export to ``path`` (gzip-compressed if it ends with .gz); returns the end record"""
+    summary: Dict[str, Any] = {}
+    blocks = iter_ndjson(_track_end(export_records(document_service, rag_service, include_embeddings), summary))
+    if path.endswith(".gz"):
+        blocks = iter_gzip(blocks)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            for block in blocks:
+                f.write(block)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return summary
+
+def _track_end(records: Iterator[Dict[str, Any]], summary: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    for record in records:
+        if record["type"] == "end":
+            summary.update(record)
+        yield record
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Read an export file (plain or gzip-compressed NDJSON) one record at a time"""
+    with open(path, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    opener = gzip.open if compressed else open
+    line_number = 0
+    try:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    raise ExportFormatError(f"Line {line_number} is not valid JSON (truncated export?)")
+    except EOFError:
+        raise ExportFormatError(f"Compressed export ends after line {line_number} (truncated export?)")
+
+class _DocumentImport:
+    """State of the document currently being imported"""
+
+    def __init__(self, doc_data: Dict[str, Any], skip: bool):
+        self.doc_data = doc_data
+        self.skip = skip
+        self.chunks = 0
+        self.content_path: Optional[str] = None
+        self.content_file = None
+        self.content_stored = False
+        self.registered = False
+
+    def write_content(self, data: str):
+        if self.content_file is None:
+            fd, self.content_path = tempfile.mkstemp(suffix=".import")
+            self.content_file = os.fdopen(fd, "wb")
+        self.content_file.write(base64.b64decode(data))
+
+    def close(self):
+        if self.content_file is not None:
+            self.content_file.close()
+            self.content_file = None
+
+    def discard(self):
+        self.close()
+        if self.content_path and os.path.exists(self.content_path):
+            os.remove(self.content_path)
+
+def import_knowledge_base(path: str, document_service, rag_service, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Import an export file into the active collection and the document registry.
+
+    Chunks are written in batches with their exported IDs (upserts), reusing
+    the exported embeddings when the export has them and was made with the
+    active collection's embedding model; otherwise chunk texts are embedded
+    again. A document is registered only after its content and chunks are
+    stored, and documents already registered as completed with the same
+    content are skipped, so an interrupted import is resumed by running it
+    again on the same file. A document's content is checked against its hash
+    before any of its chunks is written, and the chunks of a document the
+    import fails on are removed again. The import holds the write gate, so
+    a re-index running meanwhile picks the imported documents up before it
+    switches.
+    """
+    with rag_service.write_gate.shared():
+        return _import_knowledge_base(path, document_service, rag_service, batch_size)
+
+def _import_knowledge_base(path: str, document_service, rag_service, batch_size: Optional[int]) -> Dict[str, Any]:
+    rag_service.refresh_index(force=True)
+    index = rag_service.index
+    collection = getattr(index.vectorstore, "_collection", None)
+    if collection is None:
+        raise RuntimeError("The knowledge base can't be imported while a snapshot is being imported")
+
+    records = iter_records(path)
+    header = next(records, None)
+    if not header or header.get("type") != "header":
+        raise ExportFormatError("Missing export header")
+    if header.get("format_version") != EXPORT_FORMAT_VERSION:
+        raise ExportFormatError(f"Unsupported export format version: {header.get('format_version')}")
+    reuse_vectors = bool(header.get("includes_embeddings")) and (
+        header.get("config", {}).get("embedding_model") == index.config.get("embedding_model")
+    )
+    batch_size = batch_size or (settings.embedding_batch_size * 10 if reuse_vectors else settings.embedding_batch_size)
+
+    summary = {
+        "documents_imported": 0,
+        "documents_skipped": 0,
+        "chunks_imported": 0,
+        "reused_embeddings": reuse_vectors,
+        "completed": False
+    }
+    batch: List[Dict[str, Any]] = []
+    current: Optional[_DocumentImport] = None
+
+    def flush():
+        if not batch:
+            return
+        ids = [chunk["id"] for chunk in batch]
+        metadatas = [chunk["metadata"] for chunk in batch]
+        texts = [chunk["text"] for chunk in batch]
+        if reuse_vectors and all("embedding" in chunk for chunk in batch):
+            collection.upsert(ids=ids, embeddings=[chunk["embedding"] for chunk in batch], metadatas=metadatas, documents=texts)
+        else:
+            with api_priority(Priority.INGESTION):
+                index.vectorstore.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+        rag_service.write_gate.touch(chunk["doc_id"] for chunk in batch)
+        summary["chunks_imported"] += len(batch)
+        batch.clear()
+
+    def store_content(document: _DocumentImport):
+        """Store the document's content and check its hash, before any of its chunks is written"""
+        document.close()
+        document.content_stored = True
+        if document.content_path is None:
+            return
+        doc_data = document.doc_data
+        content_hash, _ = document_service.raw_store.put_file(document.content_path)
+        if doc_data.get("content_hash") and content_hash != doc_data["content_hash"]:
+            document_service._release_content(content_hash)
+            raise ExportFormatError(f"Content of document {doc_data['doc_id']} does not match its hash")
+
+    def finish(document: _DocumentImport):
+        document.close()
+        if document.skip:
+            summary["documents_skipped"] += 1
+            return
+        try:
+            if not document.content_stored:
+                store_content(document)
+            flush()
+            doc_data = document.doc_data
+            doc_data["chunk_count"] = document.chunks
+            document_service.documents_db[doc_data["doc_id"]] = doc_data
+            document.registered = True
+            summary["documents_imported"] += 1
+            if summary["documents_imported"] % SAVE_EVERY_DOCUMENTS == 0:
+                document_service._save_documents_db()
+                index.vectorstore.persist()
+        finally:
+            document.discard()
+
+    try:
+        for record in records:
+            kind = record.get("type")
+            if kind == "document":
+                if current is not None:
+                    finish(current)
+                doc_data = record["document"]
+                existing = document_service.documents_db.get(doc_data["doc_id"])
+                skip = existing is not None and existing.get("status") == DocumentStatus.COMPLETED.value and (
+                    existing.get("content_hash") == doc_data.get("content_hash")
+                )
+                if existing is not None and not skip:
+                    # Same ID with other content: replace the document's chunks
+                    rag_service.delete_document_chunks(doc_data["doc_id"], existing.get("chunk_seq"))
+                current = _DocumentImport(doc_data, skip)
+            elif kind in ("content", "chunk"):
+                if current is None or record["doc_id"] != current.doc_data["doc_id"]:
+                    raise ExportFormatError(f"{kind.capitalize()} record outside its document")
+                if current.skip:
+                    continue
+                if kind == "content":
+                    if current.content_stored:
+                        raise ExportFormatError(f"Content record after the chunks of document {record['doc_id']}")
+                    current.write_content(record["data"])
+                else:
+                    if not current.content_stored:
+                        store_content(current)
+                    batch.append(record)
+                    current.chunks += 1
+                    if len(batch) >= batch_size:
+                        flush()
+            elif kind == "end":
+                if current is not None:
+                    finish(current)
+                    current = None
+                summary["completed"] = True
+                break
+            else:
+                raise ExportFormatError(f"Unknown record type: {kind}")
+        if not summary["completed"]:
+            raise ExportFormatError("Export ends before its end record (truncated export?)")
+    except Exception:
+        if current is not None and current.chunks and not current.registered:
+            # Without a registry entry these chunks would be searchable but not listed
+            try:
+                rag_service.delete_document_chunks(current.doc_data["doc_id"], current.doc_data.get("chunk_seq"))
+            except Exception as e:
+                logger.warning(f"Could not remove the chunks of document {current.doc_data['doc_id']}: {str(e)}")
+        raise
+    finally:
+        if current is not None:
+            current.discard()
+        index.vectorstore.persist()
+        document_service._save_documents_db()
+        if summary["chunks_imported"]:
+            rag_service._bump_knowledge_base_version()
+
+    logger.info(
+        f"Imported {summary['documents_imported']} documents ({summary['chunks_imported']} chunks) into {index.name}, "
+        f"skipped {summary['documents_skipped']} already present"
+    )
+    return summary
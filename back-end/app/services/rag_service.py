@@ -1,119 +1,491 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterable, NamedTuple, Optional, Set, Tuple
+from datetime import datetime
+from contextlib import nullcontext
+from functools import partial
 import logging
+import os
+import threading
+import time
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain import hub
-import os
+from langchain_core.runnables import RunnableLambda
+import numpy as np
 import uuid
 
 from app.core.config import settings
-from app.utils.helpers import filter_metadata
+from app.core.startup import StartupTimer
+from app.core.state_store import get_state_store, shared_state_enabled
+from app.services.api_scheduler import (
+    Priority, ScheduledEmbeddings, api_priority, estimate_tokens, get_api_scheduler
+)
+from app.services.answer_cache import AnswerCache
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.reranker import RerankStage, create_rerank_stage
+from app.services.semantic_cache import SemanticCache, SemanticCacheEntry
+from app.services.snapshot import SnapshotVectorStore, load_manifest, verify_snapshot
+from app.services.text_splitter import Chunk, ParallelSplitter
+from app.services.vector_index import (
+    LEGACY_COLLECTION, VectorIndex, chunk_id_for, chunk_key, current_index_config, document_chunk_ids, index_entry,
+    index_state_version, load_index_state, new_collection_name, relevance_from_distance, save_index_state
+)
+from app.prompts import load_prompt_template
+from app.utils.helpers import detect_language, filter_metadata, normalize_question
+from app.utils.process_pool import default_pool_size
+from app.utils.write_gate import WriteGate
 
 logger = logging.getLogger(__name__)
 
+# How often a worker checks whether another worker switched the active collection
+INDEX_REFRESH_INTERVAL = 1.0
+
+# A failed background snapshot import is retried, waiting the delay times 2, 4, ... in between
+SNAPSHOT_IMPORT_ATTEMPTS = 4
+SNAPSHOT_IMPORT_RETRY_DELAY = 30.0
+
+# Answers given without calling the LLM when no chunk is relevant enough
+NO_RELEVANT_CONTEXT_ANSWERS = {
+    "vi": "Xin lỗi, tôi không tìm thấy thông tin liên quan đến câu hỏi của bạn trong tài liệu hiện có.",
+    "en": "Sorry, I couldn't find anything related to your question in the available documents."
+}
+
+class RAGAnswer(NamedTuple):
+    answer: str
+    sources: List[Document]
+    # Whether the answer came from the answer cache
+    cached: bool = False
+
 class RAGService:
     """RAG (Retrieval Augmented Generation) Service"""
     
     def __init__(self):
-        self.embeddings = None
-        self.vectorstore = None
+        self.index: Optional[VectorIndex] = None
         self.llm = None
-        self.text_splitter = None
         self.rag_chain = None
+        self.rerank_stage: Optional[RerankStage] = None
+        self.answer_cache = AnswerCache(settings.answer_cache_size, settings.answer_cache_ttl)
+        self.semantic_cache: Optional[SemanticCache] = None
+        if settings.semantic_cache_mode != "off":
+            self.semantic_cache = SemanticCache(
+                settings.semantic_cache_size,
+                settings.semantic_cache_threshold,
+                settings.semantic_cache_ttl,
+                settings.semantic_cache_mode
+            )
+        self._kb_version = 0
+        self._index_state: Dict[str, Any] = {}
+        self._index_lock = threading.Lock()
+        # Held by writes to the active collection; a re-index job takes it alone to switch collections
+        self.write_gate = WriteGate(get_state_store() if shared_state_enabled() else None)
+        self.restore_status: Optional[Dict[str, Any]] = None
+        self._chroma_client = None
+        self._state_version: Optional[int] = None
+        self._state_checked_at = 0.0
+        self.scheduler = get_api_scheduler()
+        self.init_timings: Dict[str, float] = {}
+        self._query_stats = {"queries": 0, "no_relevant_context": 0}
+        self._stats_lock = threading.Lock()
         self._initialize_components()
     
     def _initialize_components(self):
         """Initialize LangChain components"""
         try:
-            # Initialize embeddings
-            self.embeddings = GoogleGenerativeAIEmbeddings(
-                model=settings.embedding_model,
-                google_api_key=settings.google_api_key
-            )
+            timer = StartupTimer()
             
             # Initialize LLM
-            self.llm = ChatGoogleGenerativeAI(
-                model=settings.llm_model,
-                temperature=settings.temperature,
-                max_tokens=settings.max_tokens,
-                google_api_key=settings.google_api_key
-            )
+            with timer.phase("llm"):
+                self.llm = ChatGoogleGenerativeAI(
+                    model=settings.llm_model,
+                    temperature=settings.temperature,
+                    max_tokens=settings.max_tokens,
+                    google_api_key=settings.google_api_key
+                )
             
-            # Initialize text splitter
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=settings.chunk_size,
-                chunk_overlap=settings.chunk_overlap
-            )
+            # Initialize or load the active collection and its embeddings
+            with timer.phase("vectorstore"):
+                self._initialize_vectorstore()
             
-            # Initialize or load existing vectorstore
-            self._initialize_vectorstore()
+            with timer.phase("reranker"):
+                self.rerank_stage = create_rerank_stage()
             
             # Setup RAG chain
-            self._setup_rag_chain()
+            with timer.phase("rag_chain"):
+                self._setup_rag_chain()
             
+            self.init_timings = timer.as_dict()
             logger.info("RAG components initialized successfully")
             
         except Exception as e:
             logger.error(f"Error initializing RAG components: {str(e)}")
             raise
     
+    @property
+    def vectorstore(self) -> Chroma:
+        """Vector store of the active collection"""
+        return self.index.vectorstore
+    
+    @property
+    def embeddings(self) -> ScheduledEmbeddings:
+        """Embeddings of the active collection"""
+        return self.index.embeddings
+    
+    @property
+    def text_splitter(self) -> ParallelSplitter:
+        """Text splitter of the active collection"""
+        return self.index.splitter
+    
     def _initialize_vectorstore(self):
         """Initialize vector store"""
         try:
-            # Check if vectorstore already exists
-            if os.path.exists(settings.vector_store_path):
-                self.vectorstore = Chroma(
-                    persist_directory=settings.vector_store_path,
-                    embedding_function=self.embeddings
-                )
-                logger.info("Loaded existing vector store")
-            else:
-                # Create new empty vectorstore
-                self.vectorstore = Chroma(
-                    persist_directory=settings.vector_store_path,
-                    embedding_function=self.embeddings
-                )
+            state = load_index_state(settings.vector_store_path)
+            if state is None:
+                # First start (or a store from before collections were versioned)
+                state = {"active": index_entry(LEGACY_COLLECTION, current_index_config()), "previous": None}
+                self._save_index_state(state)
                 logger.info("Created new vector store")
+            
+            self._index_state = state
+            self._state_version = index_state_version(settings.vector_store_path)
+            active = state["active"]
+            self.index = self._open_index(active["collection"], active["config"])
+            self._attach_query_batcher(self.index)
+            logger.info(f"Loaded vector store collection {active['collection']}")
+            
+            if active["config"] != current_index_config():
+                logger.warning(
+                    f"Active collection was built with {active['config']}, settings now ask for "
+                    f"{current_index_config()}; start a re-index to apply them"
+                )
+            
+            # Fresh node bootstrapped from a snapshot: serve it while it is imported
+            if settings.snapshot_restore_path:
+                manifest = load_manifest(settings.snapshot_restore_path)
+                if manifest["snapshot_id"] not in state.get("restored_snapshots", []):
+                    self.restore_snapshot(settings.snapshot_restore_path)
                 
         except Exception as e:
             logger.error(f"Error initializing vector store: {str(e)}")
             raise
     
-    def _setup_rag_chain(self):
-        """Setup RAG chain"""
+    def _create_embeddings(self, model: str) -> ScheduledEmbeddings:
+        """Embeddings client whose API calls all go through the scheduler"""
+        return ScheduledEmbeddings(
+            GoogleGenerativeAIEmbeddings(
+                model=model,
+                google_api_key=settings.google_api_key
+            ),
+            self.scheduler,
+            batch_size=settings.embedding_batch_size
+        )
+    
+    @staticmethod
+    def _create_splitter(config: Dict[str, Any]) -> ParallelSplitter:
+        return ParallelSplitter(
+            chunk_size=config["chunk_size"],
+            chunk_overlap=config["chunk_overlap"],
+            workers=settings.ingest_workers or default_pool_size(settings.workers),
+            min_parallel_chars=settings.parallel_split_min_chars,
+            shard_chars=settings.split_shard_chars
+        )
+    
+    def _get_chroma_client(self):
+        """Client for the shared Chroma server, or None to open the store embedded"""
+        if settings.chroma_server_host and self._chroma_client is None:
+            import chromadb
+            self._chroma_client = chromadb.HttpClient(
+                host=settings.chroma_server_host,
+                port=settings.chroma_server_port
+            )
+            logger.info(f"Using Chroma server at {settings.chroma_server_host}:{settings.chroma_server_port}")
+        return self._chroma_client
+    
+    def _open_index(self, name: str, config: Dict[str, Any]) -> VectorIndex:
+        """Open (or create) a collection with embeddings and splitter matching its config"""
+        embeddings = self._create_embeddings(config["embedding_model"])
+        vectorstore = Chroma(
+            collection_name=name,
+            persist_directory=settings.vector_store_path,
+            embedding_function=embeddings,
+            client=self._get_chroma_client()
+        )
+        return VectorIndex(name, config, embeddings, vectorstore, self._create_splitter(config))
+    
+    def _attach_query_batcher(self, index: VectorIndex):
+        """Batch query embeddings of a collection that serves queries"""
+        if settings.query_batching_enabled and index.embeddings.query_batcher is None:
+            index.embeddings.query_batcher = EmbeddingBatcher(
+                partial(self._embed_query_batch, index.embeddings.embeddings),
+                max_batch_size=settings.query_batch_max_size,
+                max_wait=settings.query_batch_window_ms / 1000,
+                max_in_flight=settings.api_max_concurrency
+            )
+    
+    def _save_index_state(self, state: Dict[str, Any]):
+        save_index_state(settings.vector_store_path, state)
+        self._state_version = index_state_version(settings.vector_store_path)
+    
+    def refresh_index(self, force: bool = False):
+        """Follow a collection switch made by another worker process.
+        
+        Queries check at most every ``INDEX_REFRESH_INTERVAL``; writers pass
+        ``force`` so they never write to a collection that was switched away.
+        """
+        if not shared_state_enabled():
+            return
+        now = time.monotonic()
+        if not force and now - self._state_checked_at < INDEX_REFRESH_INTERVAL:
+            return
+        self._state_checked_at = now
+        
+        version = index_state_version(settings.vector_store_path)
+        if version == self._state_version:
+            return
+        with self._index_lock:
+            state = load_index_state(settings.vector_store_path)
+            self._state_version = version
+            active = state["active"]
+            if active["collection"] != self.index.name:
+                index = self._open_index(active["collection"], active["config"])
+                self._attach_query_batcher(index)
+                self.index = index
+                logger.info(f"Switched to collection {index.name} activated by another worker")
+            self._index_state = state
+    
+    def create_index(self, config: Optional[Dict[str, Any]] = None) -> VectorIndex:
+        """Create an empty shadow collection (current settings by default)"""
+        name = new_collection_name()
+        index = self._open_index(name, config or current_index_config())
+        logger.info(f"Created collection {name} with {index.config}")
+        return index
+    
+    def drop_index(self, index: VectorIndex):
+        """Delete a collection that is not serving queries"""
+        if self.index is not None and index.name == self.index.name:
+            raise ValueError("Cannot drop the active collection")
+        index.vectorstore.delete_collection()
+        logger.info(f"Dropped collection {index.name}")
+    
+    def _drop_collection(self, name: str):
         try:
-            # Get retriever
-            retriever = self.vectorstore.as_retriever(
-                search_kwargs={"k": settings.max_retrieval_docs}
+            self.vectorstore._client.delete_collection(name)
+            logger.info(f"Dropped collection {name}")
+        except Exception as e:
+            logger.warning(f"Could not drop collection {name}: {str(e)}")
+    
+    def activate_index(self, index: VectorIndex) -> Dict[str, Any]:
+        """Atomically switch queries and ingestion to another collection.
+        
+        The pointer file is replaced first, then the in-memory reference; the
+        collection that was active is kept as the rollback target and the one
+        kept before it is dropped.
+        """
+        with self._index_lock:
+            self._attach_query_batcher(index)
+            old_state = self._index_state
+            state = {
+                **old_state,
+                "active": index_entry(index.name, index.config),
+                "previous": old_state["active"]
+            }
+            if index.snapshot_id:
+                state["restored_snapshots"] = old_state.get("restored_snapshots", []) + [index.snapshot_id]
+            self._save_index_state(state)
+            self._index_state = state
+            self.index = index
+            
+            stale = old_state.get("previous")
+            if stale and stale["collection"] not in (index.name, old_state["active"]["collection"]):
+                self._drop_collection(stale["collection"])
+            
+            logger.info(f"Activated collection {index.name} (previous: {old_state['active']['collection']})")
+            return {
+                "status": "success",
+                "message": f"Collection {index.name} is now active",
+                "active": state["active"],
+                "previous": state["previous"]
+            }
+    
+    def rollback_index(self) -> Dict[str, Any]:
+        """Switch back to the previously active collection"""
+        with self._index_lock:
+            previous = self._index_state.get("previous")
+            if not previous:
+                return {"status": "error", "message": "No previous collection to roll back to"}
+            
+            index = self._open_index(previous["collection"], previous["config"])
+            self._attach_query_batcher(index)
+            state = {
+                **self._index_state,
+                "active": index_entry(index.name, index.config),
+                "previous": self._index_state["active"]
+            }
+            self._save_index_state(state)
+            self._index_state = state
+            self.index = index
+            
+            logger.info(f"Rolled back to collection {index.name}")
+            return {
+                "status": "success",
+                "message": f"Rolled back to collection {index.name}",
+                "active": state["active"],
+                "previous": state["previous"]
+            }
+    
+    def get_index_state(self) -> Dict[str, Any]:
+        """Get the active and previous collections and whether settings changed since"""
+        self.refresh_index()
+        state = self._index_state
+        return {
+            "active": state.get("active"),
+            "previous": state.get("previous"),
+            "serving": self.index.name,
+            "current_config": current_index_config(),
+            "reindex_needed": state.get("active", {}).get("config") != current_index_config(),
+            "restore": self.restore_status
+        }
+    
+    def restore_snapshot(self, path: str, background: bool = True) -> Dict[str, Any]:
+        """Restore the vector store from a snapshot directory.
+        
+        The snapshot's file sizes are checked and it is memory-mapped, and (in
+        background mode) immediately serves queries by brute-force search. A
+        background thread then verifies its checksums, going back to the
+        previously served collection if they fail, and imports its rows into a
+        new Chroma collection, which is then activated; a failed import is
+        retried. Ingestion is refused until the import has finished. In
+        blocking mode the checksums are verified before anything is imported.
+        """
+        embeddings_model = load_manifest(path)["config"]["embedding_model"]
+        store = SnapshotVectorStore(path, self._create_embeddings(embeddings_model))
+        manifest = store.manifest
+        self.restore_status = {
+            "snapshot_id": manifest["snapshot_id"],
+            "path": path,
+            "status": "verifying",
+            "rows": manifest["rows"],
+            "imported": 0,
+            "attempts": 0,
+            "next_retry_at": None,
+            "started_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "error": None
+        }
+        
+        if background:
+            serving = VectorIndex(
+                f"snapshot_{manifest['snapshot_id'][:12]}",
+                manifest["config"],
+                store.embeddings,
+                store,
+                self._create_splitter(manifest["config"])
             )
+            self._attach_query_batcher(serving)
+            with self._index_lock:
+                previous = self.index
+                self.index = serving
+            logger.info(f"Serving snapshot {manifest['snapshot_id']} ({manifest['rows']} chunks) from {path}")
             
-            # Try to load prompt from hub, fallback to custom prompt
+            # With several workers only one imports; the others switch when it activates the result
+            if shared_state_enabled() and not get_state_store().add(
+                "snapshot_imports", manifest["snapshot_id"], {"pid": os.getpid(), "started_at": time.time()}
+            ):
+                self.restore_status["status"] = "importing in another worker"
+            else:
+                threading.Thread(
+                    target=self._restore_in_background, args=(store, previous), name="snapshot-import", daemon=True
+                ).start()
+        else:
             try:
-                prompt = hub.pull("rlm/rag-prompt")
-            except:
-                # Fallback prompt
-                template = """Bạn là một trợ lý AI thông minh cho việc trả lời câu hỏi. Sử dụng thông tin từ ngữ cảnh được cung cấp để trả lời câu hỏi. Nếu bạn không biết câu trả lời, hãy nói rằng bạn không biết. Hãy giữ câu trả lời ngắn gọn và chính xác.
-
-Ngữ cảnh: {context}
-
-Câu hỏi: {question}
-
-Trả lời:"""
-                prompt = ChatPromptTemplate.from_template(template)
-            
-            # Create RAG chain
-            def format_docs(docs):
-                return "\\n\\n".join(doc.page_content for doc in docs)
+                verify_snapshot(path)
+            except Exception as e:
+                self.restore_status.update(status="failed", error=str(e), finished_at=datetime.now().isoformat())
+                raise
+            self.restore_status["status"] = "importing"
+            self.restore_status["attempts"] = 1
+            try:
+                self._import_snapshot(store)
+            except Exception:
+                self.restore_status["status"] = "failed"
+                raise
+        return self.restore_status
+    
+    def _restore_in_background(self, store: SnapshotVectorStore, previous: VectorIndex):
+        """Verify a served snapshot's checksums, then import it, retrying failed imports"""
+        status = self.restore_status
+        try:
+            verify_snapshot(store.path)
+        except Exception as e:
+            # Corrupted content must not keep being served
+            with self._index_lock:
+                if self.index.vectorstore is store:
+                    self.index = previous
+            status.update(status="failed", error=str(e), finished_at=datetime.now().isoformat())
+            logger.error(f"Snapshot {store.snapshot_id} failed verification, serving {previous.name} again: {str(e)}")
+            self._release_snapshot_claim(store.snapshot_id)
+            return
+        
+        for attempt in range(1, SNAPSHOT_IMPORT_ATTEMPTS + 1):
+            status.update(status="importing", imported=0, attempts=attempt, next_retry_at=None, finished_at=None)
+            try:
+                self._import_snapshot(store)
+                return
+            except Exception:
+                if attempt == SNAPSHOT_IMPORT_ATTEMPTS:
+                    status["status"] = "failed"
+                    break
+                delay = SNAPSHOT_IMPORT_RETRY_DELAY * 2 ** (attempt - 1)
+                status["status"] = "retrying"
+                status["next_retry_at"] = datetime.fromtimestamp(time.time() + delay).isoformat()
+                logger.info(f"Retrying the import of snapshot {store.snapshot_id} in {delay:.0f}s")
+                time.sleep(delay)
+        # Still serving the snapshot read-only; a restart tries again
+        self._release_snapshot_claim(store.snapshot_id)
+    
+    @staticmethod
+    def _release_snapshot_claim(snapshot_id: str):
+        if shared_state_enabled():
+            get_state_store().delete("snapshot_imports", snapshot_id)
+    
+    def _import_snapshot(self, store: SnapshotVectorStore):
+        """Copy snapshot rows (with their stored embeddings) into a new collection and activate it"""
+        status = self.restore_status
+        target = None
+        try:
+            target = self.create_index(store.manifest["config"])
+            target.snapshot_id = store.snapshot_id
+            for batch in store.iter_batches(settings.embedding_batch_size * 10):
+                target.vectorstore._collection.add(**batch)
+                status["imported"] += len(batch["ids"])
+            target.vectorstore.persist()
+            self.activate_index(target)
+            status["status"] = "completed"
+            status["error"] = None
+            logger.info(f"Imported snapshot {store.snapshot_id} into {target.name}")
+        except Exception as e:
+            status["error"] = str(e)
+            logger.error(f"Error importing snapshot {store.snapshot_id}: {str(e)}")
+            if target is not None:
+                try:
+                    target.vectorstore.delete_collection()
+                except Exception as drop_error:
+                    logger.warning(f"Could not drop collection {target.name}: {str(drop_error)}")
+            raise
+        finally:
+            status["finished_at"] = datetime.now().isoformat()
+    
+    def _setup_rag_chain(self):
+        """Setup RAG chain"""
+        try:
+            # Load the versioned prompt shipped with the app
+            template = load_prompt_template(settings.prompt_name, settings.prompt_version)
+            prompt = ChatPromptTemplate.from_template(template)
             
+            # Create RAG chain; retrieval happens in query() so it runs only once
             self.rag_chain = (
-                {"context": retriever | format_docs, "question": RunnablePassthrough()}
-                | prompt
-                | self.llm
+                prompt
+                | RunnableLambda(self._invoke_llm)
                 | StrOutputParser()
             )
             
@@ -123,30 +495,44 @@ Trả lời:"""
             logger.error(f"Error setting up RAG chain: {str(e)}")
             raise
     
+    def _embed_query_batch(self, client, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of queries with one scheduled API call"""
+        # The pinned Google client embeds documents and queries with the same task type
+        return self.scheduler.call(
+            "embedding",
+            client.embed_documents,
+            texts,
+            tokens=sum(estimate_tokens(text) for text in texts),
+            priority=Priority.CHAT
+        )
+    
+    def _invoke_llm(self, prompt_value):
+        """Call the LLM through the API scheduler"""
+        tokens = estimate_tokens(prompt_value.to_string()) + (settings.max_tokens or 0)
+        return self.scheduler.call("llm", self.llm.invoke, prompt_value, tokens=tokens)
+    
+    @staticmethod
+    def _format_docs(docs: List[Document]) -> str:
+        return "\n\n".join(doc.page_content for doc in docs)
+    
     def add_documents(self, documents: List[Document]) -> Dict[str, Any]:
         """Add documents to vector store"""
+        with self.write_gate.shared():
+            self.refresh_index(force=True)
+            with api_priority(Priority.INGESTION):
+                return self._add_documents(documents, self.index)
+    
+    def _add_documents(self, documents: List[Document], index: VectorIndex) -> Dict[str, Any]:
         try:
-            # Split documents into chunks
-            chunks = self.text_splitter.split_documents(documents)
-            
-            # Add chunks to vectorstore with filtered metadata
-            doc_ids = []
-            for chunk in chunks:
-                # Generate unique ID for each chunk
-                chunk_id = str(uuid.uuid4())
-                
-                # Filter metadata and add chunk_id
-                filtered_metadata = filter_metadata(chunk.metadata)
-                filtered_metadata["chunk_id"] = chunk_id
-                chunk.metadata = filtered_metadata
-                
-                doc_ids.append(chunk_id)
+            # Split documents into offset chunks sharing their document's filtered metadata
+            metadatas = [filter_metadata(doc.metadata) for doc in documents]
+            chunks = index.splitter.split(documents, metadatas)
             
-            # Add to vectorstore
-            self.vectorstore.add_documents(chunks)
+            # New documents: chunks are numbered from 0
+            doc_ids = self._store_chunks(chunks, index, sequence={})
             
             # Persist the vectorstore
-            self.vectorstore.persist()
+            index.vectorstore.persist()
             
             logger.info(f"Added {len(chunks)} chunks from {len(documents)} documents")
             
@@ -161,28 +547,394 @@ Trả lời:"""
             logger.error(f"Error adding documents: {str(e)}")
             raise
     
+    def add_document_stream(self, parts: Iterable[Document], index: Optional[VectorIndex] = None) -> Dict[str, Any]:
+        """Add documents produced incrementally (pages, sections, text blocks).
+        
+        Parts are buffered up to ``ingest_stream_chars`` characters, then split,
+        embedded and stored before more parts are read, so memory stays flat
+        however large the source is. Chunk IDs are not returned; chunks are
+        numbered from 0 per document. ``index`` defaults to the active
+        collection, in which case the write gate is held for the whole stream.
+        """
+        gate = self.write_gate.shared() if index is None else nullcontext()
+        with gate, api_priority(Priority.INGESTION):
+            if index is None:
+                self.refresh_index(force=True)
+                index = self.index
+            try:
+                parts_added = 0
+                chunks_created = 0
+                buffer: List[Document] = []
+                buffered_chars = 0
+                sequence: Dict[str, int] = {}
+                
+                def flush():
+                    metadatas = [filter_metadata(doc.metadata) for doc in buffer]
+                    chunks = index.splitter.split(buffer, metadatas)
+                    self._store_chunks(chunks, index, sequence)
+                    return len(chunks)
+                
+                for part in parts:
+                    buffer.append(part)
+                    buffered_chars += len(part.page_content)
+                    parts_added += 1
+                    if buffered_chars >= settings.ingest_stream_chars:
+                        chunks_created += flush()
+                        buffer, buffered_chars = [], 0
+                
+                if buffer:
+                    chunks_created += flush()
+                
+                index.vectorstore.persist()
+                
+                logger.info(f"Added {chunks_created} chunks from {parts_added} streamed parts")
+                
+                return {
+                    "status": "success",
+                    "documents_added": parts_added,
+                    "chunks_created": chunks_created
+                }
+                
+            except Exception as e:
+                logger.error(f"Error adding document stream: {str(e)}")
+                raise
+    
+    def _store_chunks(
+        self,
+        chunks: List[Chunk],
+        index: VectorIndex,
+        sequence: Optional[Dict[str, int]] = None
+    ) -> List[str]:
+        """Embed and store chunks, materializing their text one batch at a time.
+        
+        With ``sequence`` (next chunk number per doc_id, updated in place)
+        chunks get the IDs ``{doc_id}:{n}``, so a document's chunks can be
+        looked up by ID; without it (documents indexed before chunks were
+        numbered) they get random IDs.
+        """
+        doc_ids = []
+        batch_size = settings.embedding_batch_size
+        for i in range(0, len(chunks), batch_size):
+            batch = chunks[i:i + batch_size]
+            batch_ids = []
+            for chunk in batch:
+                doc_id = chunk.metadata.get("doc_id")
+                if sequence is None or not doc_id:
+                    batch_ids.append(str(uuid.uuid4()))
+                else:
+                    seq = sequence.get(doc_id, 0)
+                    batch_ids.append(chunk_id_for(doc_id, seq))
+                    sequence[doc_id] = seq + 1
+            if index is self.index:
+                self.write_gate.touch(chunk.metadata.get("doc_id") for chunk in batch)
+            index.vectorstore.add_texts(
+                texts=[chunk.text for chunk in batch],
+                metadatas=[{**chunk.metadata, "chunk_id": chunk_id} for chunk, chunk_id in zip(batch, batch_ids)],
+                ids=batch_ids
+            )
+            doc_ids.extend(batch_ids)
+        if chunks and index is self.index:
+            self._bump_knowledge_base_version()
+        return doc_ids
+    
+    def _bump_knowledge_base_version(self):
+        """Record that the active collection's content changed"""
+        if shared_state_enabled():
+            get_state_store().update("index", "kb_version", lambda version: (version or 0) + 1)
+        else:
+            self._kb_version += 1
+    
+    def knowledge_base_version(self) -> int:
+        """Counter of changes to the active collection's content (shared between workers)"""
+        if shared_state_enabled():
+            return get_state_store().get("index", "kb_version", 0)
+        return self._kb_version
+    
+    def retrieval_signature(self) -> Tuple:
+        """Parameters that shape retrieval and generation, used in coalescing and cache keys"""
+        self.refresh_index()
+        rerank = (settings.reranker, settings.rerank_candidates, settings.rerank_top_k) if self.rerank_stage else None
+        return (
+            settings.max_retrieval_docs, settings.min_relevance_score, rerank,
+            settings.prompt_name, settings.prompt_version, self.index.name
+        )
+    
+    def retrieve(
+        self,
+        question: str,
+        embedding: Optional[List[float]] = None,
+        index: Optional[VectorIndex] = None
+    ) -> List[Document]:
+        """Retrieve the chunks to answer from, reranked when a reranker is configured.
+        
+        Chunks below ``min_relevance_score`` are dropped, so the result may be empty.
+        ``embedding`` is the question's embedding if it was already computed;
+        ``index`` is the collection to search (the active one by default).
+        """
+        if self.rerank_stage is None:
+            k = settings.max_retrieval_docs
+        else:
+            # Over-fetch candidates for the reranker to choose from
+            k = max(settings.rerank_candidates, settings.rerank_top_k)
+        
+        # The active collection may be swapped meanwhile, so search the index we just read
+        index = index or self.index
+        if embedding is None:
+            embedding = index.embeddings.embed_query(question)
+        results = index.search_by_vector(embedding, k)
+        docs = []
+        for doc, distance in results:
+            relevance = relevance_from_distance(distance)
+            if relevance < settings.min_relevance_score:
+                continue
+            doc.metadata["relevance_score"] = round(relevance, 4)
+            docs.append(doc)
+        
+        if self.rerank_stage is not None and docs:
+            docs = self.rerank_stage.rerank(question, docs, settings.rerank_top_k, scope=index.name)
+        return docs
+    
     def query(self, question: str) -> Tuple[str, List[Document]]:
         """Query the RAG system"""
+        answer = self.query_with_details(question)
+        return answer.answer, answer.sources
+    
+    def query_with_details(self, question: str) -> RAGAnswer:
+        """Query the RAG system, telling whether the answer was cached"""
         try:
-            # Get retriever for source documents
-            retriever = self.vectorstore.as_retriever(
-                search_kwargs={"k": settings.max_retrieval_docs}
-            )
+            # Scope of semantic cache entries: knowledge base content and retrieval/prompt settings
+            scope = (self.knowledge_base_version(),) + self.retrieval_signature()
+            # Chunk IDs repeat across collections (a re-index numbers chunks from 0 again),
+            # so the collection is part of the answer cache key
+            index = self.index
+            embedding = index.embeddings.embed_query(question)
+            with self._stats_lock:
+                self._query_stats["queries"] += 1
+            
+            near_duplicate = None
+            if self.semantic_cache is not None:
+                near_duplicate, similarity = self.semantic_cache.lookup(embedding, scope)
+                if near_duplicate is not None and self.semantic_cache.serving:
+                    logger.info(f"Semantic cache hit (similarity {similarity:.4f}): {near_duplicate.question!r}")
+                    return RAGAnswer(near_duplicate.answer, near_duplicate.sources, cached=True)
             
             # Get source documents
-            source_docs = retriever.invoke(question)
+            source_docs = self.retrieve(question, embedding, index)
+            
+            if not source_docs:
+                # Nothing to answer from: skip the LLM round trip that would only say "I don't know"
+                with self._stats_lock:
+                    self._query_stats["no_relevant_context"] += 1
+                logger.info("No relevant context found, answering without calling the LLM")
+                return RAGAnswer(NO_RELEVANT_CONTEXT_ANSWERS[detect_language(question)], [])
+            
+            # Same question, prompt and chunks: the answer (at temperature 0) would be the same
+            chunk_ids = sorted(chunk_key(doc) for doc in source_docs)
+            cache_key = (
+                normalize_question(question), settings.llm_model, settings.prompt_name, settings.prompt_version,
+                index.name, tuple(chunk_ids)
+            )
+            if near_duplicate is not None:
+                self.semantic_cache.observe(near_duplicate, tuple(chunk_ids))
+            
+            response = self.answer_cache.get(cache_key)
+            if response is not None:
+                logger.info(f"Answer cache hit, found {len(source_docs)} source documents")
+                self._remember_semantic(question, embedding, scope, response, source_docs, chunk_ids)
+                return RAGAnswer(response, source_docs, cached=True)
             
             # Generate response using RAG chain
-            response = self.rag_chain.invoke(question)
+            response = self.rag_chain.invoke({
+                "context": self._format_docs(source_docs),
+                "question": question
+            })
+            self.answer_cache.put(cache_key, response, chunk_ids)
+            self._remember_semantic(question, embedding, scope, response, source_docs, chunk_ids)
             
             logger.info(f"Query processed successfully, found {len(source_docs)} source documents")
             
-            return response, source_docs
+            return RAGAnswer(response, source_docs)
             
         except Exception as e:
             logger.error(f"Error processing query: {str(e)}")
             raise
     
+    def _remember_semantic(self, question, embedding, scope, response, source_docs, chunk_ids):
+        if self.semantic_cache is not None:
+            entry = SemanticCacheEntry(question, response, source_docs, tuple(chunk_ids))
+            self.semantic_cache.put(embedding, scope, entry)
+    
+    def delete_document_chunks(self, doc_id: str, chunk_seq: Optional[int] = None) -> int:
+        """Remove a document's chunks from the active collection and the answers built on them.
+        
+        ``chunk_seq`` is the document's next chunk number from the registry
+        (see ``document_chunk_ids``).
+        """
+        with self.write_gate.shared():
+            self.refresh_index(force=True)
+            collection = getattr(self.index.vectorstore, "_collection", None)
+            if collection is None:
+                # A snapshot being imported is read-only
+                raise RuntimeError("The active index is read-only while a snapshot is being imported")
+            
+            self.write_gate.touch([doc_id])
+            chunk_ids = document_chunk_ids(collection, doc_id, chunk_seq)
+            invalidated = self._remove_chunks(collection, chunk_ids)
+        logger.info(f"Deleted {len(chunk_ids)} chunks of document {doc_id}, invalidated {invalidated} cached answers")
+        return len(chunk_ids)
+    
+    def _remove_chunks(self, collection, chunk_ids: List[str]) -> int:
+        """Delete chunks from the active collection and the cached answers built on them"""
+        if chunk_ids:
+            collection.delete(ids=chunk_ids)
+            self._bump_knowledge_base_version()
+        invalidated = self.answer_cache.invalidate_chunks(chunk_ids)
+        if self.semantic_cache is not None:
+            invalidated += self.semantic_cache.invalidate_chunks(chunk_ids)
+        return invalidated
+    
+    def update_document_chunks(
+        self,
+        doc_id: str,
+        documents: List[Document],
+        chunk_seq: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Re-chunk a changed document, embedding only the chunks whose text is new.
+        
+        Chunks whose text is unchanged keep their IDs and embeddings (their
+        metadata is updated if it changed, e.g. the fetch time). New chunks
+        are stored before the ones that disappeared are deleted, so the
+        document stays searchable throughout. New chunks are numbered from
+        ``chunk_seq``; the result's ``chunk_seq`` is the document's next chunk
+        number to record in the registry.
+        """
+        with self.write_gate.shared(), api_priority(Priority.INGESTION):
+            self.refresh_index(force=True)
+            index = self.index
+            collection = getattr(index.vectorstore, "_collection", None)
+            if collection is None:
+                raise RuntimeError("The active index is read-only while a snapshot is being imported")
+            
+            self.write_gate.touch([doc_id])
+            metadatas = [filter_metadata(doc.metadata) for doc in documents]
+            chunks = index.splitter.split(documents, metadatas)
+            
+            unused: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+            existing_ids = document_chunk_ids(collection, doc_id, chunk_seq)
+            for start in range(0, len(existing_ids), settings.embedding_batch_size * 10):
+                existing = collection.get(
+                    ids=existing_ids[start:start + settings.embedding_batch_size * 10], include=["documents", "metadatas"]
+                )
+                for chunk_id, text, metadata in zip(existing["ids"], existing["documents"], existing["metadatas"]):
+                    unused.setdefault(text or "", []).append((chunk_id, metadata or {}))
+            new_chunks = []
+            retagged_ids, retagged_metadatas = [], []
+            replaced: Set[str] = set()
+            for chunk in chunks:
+                kept = unused.get(chunk.text)
+                if kept:
+                    chunk_id, old_metadata = kept.pop()
+                    metadata = {**chunk.metadata, "chunk_id": chunk_id}
+                    if metadata != old_metadata:
+                        retagged_ids.append(chunk_id)
+                        retagged_metadatas.append(metadata)
+                        if old_metadata.keys() - metadata.keys():
+                            replaced.add(chunk_id)
+                else:
+                    new_chunks.append(chunk)
+            removed = [chunk_id for kept in unused.values() for chunk_id, _ in kept]
+            
+            sequence = {doc_id: chunk_seq} if chunk_seq is not None else None
+            self._store_chunks(new_chunks, index, sequence)
+            self._retag_chunks(collection, retagged_ids, retagged_metadatas, replaced)
+            invalidated = self._remove_chunks(collection, removed)
+            index.vectorstore.persist()
+        
+        logger.info(
+            f"Updated document {doc_id}: {len(new_chunks)} new, {len(chunks) - len(new_chunks)} unchanged and "
+            f"{len(removed)} removed chunks, invalidated {invalidated} cached answers"
+        )
+        return {
+            "chunks_total": len(chunks),
+            "chunks_added": len(new_chunks),
+            "chunks_kept": len(chunks) - len(new_chunks),
+            "chunks_removed": len(removed),
+            "chunk_seq": sequence[doc_id] if sequence is not None else None
+        }
+    
+    def _retag_chunks(self, collection, chunk_ids: List[str], metadatas: List[Dict[str, Any]], replaced: Set[str]):
+        """Set the metadata of stored chunks, keeping their text and embeddings.
+        
+        Chroma merges updated metadata into the stored one, so chunks that lose
+        a key (``replaced``) are re-added with their stored embedding instead.
+        """
+        batch_size = settings.embedding_batch_size * 10
+        updates = [(chunk_id, metadata) for chunk_id, metadata in zip(chunk_ids, metadatas) if chunk_id not in replaced]
+        for start in range(0, len(updates), batch_size):
+            batch = updates[start:start + batch_size]
+            collection.update(ids=[chunk_id for chunk_id, _ in batch], metadatas=[metadata for _, metadata in batch])
+        
+        replacements = [(chunk_id, metadata) for chunk_id, metadata in zip(chunk_ids, metadatas) if chunk_id in replaced]
+        for start in range(0, len(replacements), batch_size):
+            new_metadata = dict(replacements[start:start + batch_size])
+            stored = collection.get(ids=list(new_metadata), include=["documents", "embeddings"])
+            collection.delete(ids=stored["ids"])
+            collection.add(
+                ids=stored["ids"],
+                embeddings=stored["embeddings"],
+                documents=stored["documents"],
+                metadatas=[new_metadata[chunk_id] for chunk_id in stored["ids"]]
+            )
+    
+    def get_document_chunks(
+        self,
+        doc_id: str,
+        offset: int = 0,
+        limit: int = 50,
+        include_norms: bool = False,
+        include_token_counts: bool = False,
+        chunk_seq: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """A page of a document's chunks in the active collection, looked up by chunk ID"""
+        self.refresh_index()
+        collection = getattr(self.index.vectorstore, "_collection", None)
+        if collection is None:
+            # A snapshot being imported has no metadata index to filter on
+            raise RuntimeError("Chunks can't be browsed while a snapshot is being imported")
+        
+        # IDs only for the total, then the page's content (and embeddings if asked for)
+        chunk_ids = document_chunk_ids(collection, doc_id, chunk_seq)
+        page_ids = chunk_ids[offset:offset + limit]
+        chunks = []
+        if page_ids:
+            include = ["documents", "metadatas"] + (["embeddings"] if include_norms else [])
+            result = collection.get(ids=page_ids, include=include)
+            norms = np.linalg.norm(np.asarray(result["embeddings"], dtype=np.float32), axis=1) if include_norms else None
+            position = {chunk_id: i for i, chunk_id in enumerate(page_ids)}
+            rows = sorted(range(len(result["ids"])), key=lambda row: position[result["ids"][row]])
+            for row in rows:
+                content = result["documents"][row] or ""
+                chunks.append({
+                    "chunk_id": result["ids"][row],
+                    "doc_id": doc_id,
+                    "content": content,
+                    "metadata": result["metadatas"][row] or {},
+                    "embedding_status": "embedded",
+                    "embedding_norm": round(float(norms[row]), 6) if norms is not None else None,
+                    "token_count": estimate_tokens(content) if include_token_counts else None
+                })
+        return {"doc_id": doc_id, "chunks": chunks, "total": len(chunk_ids), "offset": offset, "limit": limit}
+    
+    def get_query_stats(self) -> Dict[str, Any]:
+        """How many queries were answered without the LLM for lack of relevant context"""
+        with self._stats_lock:
+            stats = dict(self._query_stats)
+        stats["min_relevance_score"] = settings.min_relevance_score
+        stats["no_relevant_context_rate"] = round(
+            stats["no_relevant_context"] / stats["queries"], 4
+        ) if stats["queries"] else 0.0
+        return stats
+    
     def similarity_search(self, query: str, k: int = 4) -> List[Document]:
         """Perform similarity search"""
         try:
@@ -196,12 +948,15 @@ Trả lời:"""
         """Get vector store statistics"""
         try:
             # Get collection info
-            collection = self.vectorstore._collection
-            count = collection.count()
+            self.refresh_index()
+            count = self.index.count()
             
             return {
                 "total_chunks": count,
-                "vectorstore_path": settings.vector_store_path
+                "vectorstore_path": settings.vector_store_path,
+                "collection": self.index.name,
+                "index_config": self.index.config,
+                "snapshot_restore": self.restore_status
             }
             
         except Exception as e:
@@ -211,17 +966,12 @@ Trả lời:"""
     def clear_vectorstore(self) -> Dict[str, Any]:
         """Clear all documents from vector store"""
         try:
-            # Delete and recreate vectorstore
-            import shutil
-            if os.path.exists(settings.vector_store_path):
-                shutil.rmtree(settings.vector_store_path)
-            
-            # Reinitialize vectorstore
-            self._initialize_vectorstore()
+            # Switch to a new empty collection; the old one stays available for rollback
+            self.activate_index(self.create_index(self.index.config))
             
             logger.info("Vector store cleared successfully")
             
-            return {"status": "success", "message": "Vector store cleared"}
+            return {"status": "success", "message": "Vector store cleared (previous collection kept for rollback)"}
             
         except Exception as e:
             logger.error(f"Error clearing vectorstore: {str(e)}")
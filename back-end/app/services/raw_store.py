@@ -0,0 +1,164 @@
+from typing import Any, BinaryIO, Dict, Iterator, Optional, TextIO, Tuple
+from contextlib import contextmanager
+import gzip
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+COPY_BLOCK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+class RawDocumentStore:
+    """Content-addressed store for the original content of ingested documents.
+
+    Each object is gzip-compressed and stored once under
+    ``<root>/<first two hex digits>/<sha256>.gz``, where the hash is taken over
+    the uncompressed bytes. Writes go to a temporary file that is renamed into
+    place, so a concurrent reader never sees a partial object and storing
+    identical content twice is a no-op.
+
+    With ``counters`` (``app.services.usage_stats.Counters``) the object count
+    and compressed size are kept up to date on every write, instead of being
+    computed by walking the store.
+    """
+
+    def __init__(self, root: str, counters: Optional[Any] = None):
+        self.root = root
+        self.counters = counters
+        if counters is not None:
+            # Objects stored before totals were kept
+            counters.initialize("raw_store", lambda: {
+                f"raw_store.{key}": value for key, value in self._walk_stats().items()
+            })
+
+    def path_for(self, content_hash: str) -> str:
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.gz")
+
+    def exists(self, content_hash: str) -> bool:
+        return os.path.exists(self.path_for(content_hash))
+
+    def put_text(self, text: str) -> Tuple[str, int]:
+        """Store text (UTF-8) and return its content hash and uncompressed size"""
+        return self.put_stream(io.BytesIO(text.encode("utf-8")))
+
+    def put_file(self, path: str) -> Tuple[str, int]:
+        """Store a file's content and return its content hash and uncompressed size"""
+        with open(path, "rb") as f:
+            return self.put_stream(f)
+
+    def put_stream(self, stream: BinaryIO) -> Tuple[str, int]:
+        """Hash and compress a binary stream in one pass.
+
+        Returns the content hash and the uncompressed size. If the content is
+        already stored, the freshly written copy is discarded.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0) as out:
+                while True:
+                    block = stream.read(COPY_BLOCK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    size += len(block)
+                    out.write(block)
+
+            content_hash = digest.hexdigest()
+            path = self.path_for(content_hash)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                logger.info(f"Raw content {content_hash[:12]} already stored")
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                compressed = os.path.getsize(path)
+                if self.counters is not None:
+                    self.counters.add("raw_store.objects")
+                    self.counters.add("raw_store.compressed_bytes", compressed)
+                logger.info(f"Stored raw content {content_hash[:12]} ({size} bytes, {compressed} compressed)")
+            return content_hash, size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def open(self, content_hash: str) -> BinaryIO:
+        """Open stored content for streaming reads (decompressed on the fly)"""
+        path = self.path_for(content_hash)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Raw content {content_hash} not found")
+        return gzip.open(path, "rb")
+
+    def open_text(self, content_hash: str) -> TextIO:
+        """Open stored content as UTF-8 text"""
+        return io.TextIOWrapper(self.open(content_hash), encoding="utf-8", errors="replace")
+
+    def read_text(self, content_hash: str) -> str:
+        with self.open_text(content_hash) as f:
+            return f.read()
+
+    def iter_text(self, content_hash: str, block_chars: int = 1_000_000) -> Iterator[str]:
+        """Yield stored text in blocks of at most ``block_chars`` characters"""
+        with self.open_text(content_hash) as f:
+            while True:
+                block = f.read(block_chars)
+                if not block:
+                    break
+                yield block
+
+    @contextmanager
+    def materialize(self, content_hash: str, suffix: str = ""):
+        """Decompress stored content to a temporary file and yield its path.
+
+        For readers that need random access (PDFs); the file is removed on exit.
+        """
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as out, self.open(content_hash) as src:
+                shutil.copyfileobj(src, out, COPY_BLOCK_SIZE)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def delete(self, content_hash: str) -> bool:
+        """Remove stored content; returns whether it existed"""
+        path = self.path_for(content_hash)
+        if not os.path.exists(path):
+            return False
+        compressed = os.path.getsize(path)
+        os.remove(path)
+        if self.counters is not None:
+            self.counters.add("raw_store.objects", -1)
+            self.counters.add("raw_store.compressed_bytes", -compressed)
+        logger.info(f"Deleted raw content {content_hash[:12]}")
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the number of stored objects and their compressed size"""
+        if self.counters is not None:
+            return {
+                "objects": self.counters.get("raw_store.objects"),
+                "compressed_bytes": self.counters.get("raw_store.compressed_bytes")
+            }
+        return self._walk_stats()
+
+    def _walk_stats(self) -> Dict[str, int]:
+        objects = 0
+        compressed_bytes = 0
+        if os.path.isdir(self.root):
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    if name.endswith(".gz"):
+                        objects += 1
+                        compressed_bytes += os.path.getsize(os.path.join(directory, name))
+        return {"objects": objects, "compressed_bytes": compressed_bytes}
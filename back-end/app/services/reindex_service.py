@@ -0,0 +1,355 @@
+from typing import Any, Dict, List, Optional, Set
+from datetime import datetime
+import logging
+import os
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.state_store import get_state_store, shared_state_enabled
+from app.models.document import DocumentStatus
+from app.services.api_scheduler import Priority, api_priority
+from app.services.document_service import DocumentService
+from app.services.rag_service import RAGService
+from app.services.vector_index import VectorIndex, document_chunk_ids
+
+logger = logging.getLogger(__name__)
+
+# Catch-up passes for documents ingested while the job runs
+MAX_CATCH_UP_ROUNDS = 10
+
+# Chunks read from the active collection per request when copying a document
+COPY_BATCH_SIZE = 500
+
+# A shared job whose worker hasn't reported for this long is considered dead
+JOB_HEARTBEAT_TIMEOUT = 120.0
+
+class ReindexService:
+    """Rebuilds the vector store into a shadow collection under the current settings.
+
+    The job runs in a background thread and streams every document back from
+    the raw content store into a new collection, while queries and new
+    uploads keep using the active one. When every document has been indexed
+    the new collection is activated atomically; the old one is kept for
+    rollback. Documents without stored content (ingested before the content
+    store existed) have their existing chunks copied over instead.
+    
+    Documents written to the active collection while the job runs (uploads,
+    refreshes, deletions, imports, in any worker) are reported by the RAG
+    service's write gate; their chunks in the new collection are dropped and
+    they are indexed again from their current content. The last sync and the
+    switch happen with the gate held exclusively, so no write can land in the
+    old collection in between.
+    
+    With several workers the job state lives in the shared state database, so
+    any worker can report progress or cancel the job and only one job runs.
+    """
+
+    def __init__(self, rag_service: RAGService, document_service: DocumentService):
+        self.rag_service = rag_service
+        self.document_service = document_service
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._cancel = threading.Event()
+        self.job: Optional[Dict[str, Any]] = None
+
+    def start(self, chunks_per_minute: Optional[int] = None) -> Dict[str, Any]:
+        """Start a re-index job (fails if one is already running)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                raise RuntimeError("A re-index job is already running")
+
+            self._cancel.clear()
+            job = {
+                "job_id": str(uuid.uuid4()),
+                "status": "running",
+                "source_collection": self.rag_service.index.name,
+                "target_collection": None,
+                "config": None,
+                "chunks_per_minute": settings.reindex_chunks_per_minute if chunks_per_minute is None else chunks_per_minute,
+                "total_documents": 0,
+                "processed_documents": 0,
+                "copied_documents": 0,
+                "changed_documents": 0,
+                "failed_documents": [],
+                "chunks_created": 0,
+                "started_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "error": None
+            }
+            if shared_state_enabled():
+                self._claim(job)
+            self.job = job
+            self._thread = threading.Thread(target=self._run, name="reindex", daemon=True)
+            self._thread.start()
+            logger.info(f"Started re-index job {self.job['job_id']}")
+            return self.get_status()
+
+    def _claim(self, job: Dict[str, Any]):
+        """Register the job in the shared state, unless another worker runs one"""
+        def claim(current):
+            if (
+                current and current.get("status") == "running"
+                and time.time() - current.get("heartbeat", 0) < JOB_HEARTBEAT_TIMEOUT
+            ):
+                raise RuntimeError("A re-index job is already running")
+            return {**job, "pid": os.getpid(), "heartbeat": time.time(), "cancel_requested": False}
+
+        get_state_store().update("jobs", "reindex", claim)
+
+    def _publish(self):
+        """Share the job's progress and pick up cancel requests from other workers"""
+        if not shared_state_enabled():
+            return
+        job = self.job
+
+        def publish(current):
+            cancel_requested = bool(current and current.get("job_id") == job["job_id"] and current.get("cancel_requested"))
+            return {**job, "pid": os.getpid(), "heartbeat": time.time(), "cancel_requested": cancel_requested}
+
+        if get_state_store().update("jobs", "reindex", publish)["cancel_requested"]:
+            self._cancel.set()
+
+    def cancel(self) -> Dict[str, Any]:
+        """Stop the running job; the shadow collection is dropped and nothing is switched"""
+        if self._thread is not None and self._thread.is_alive():
+            self._cancel.set()
+            return {"status": "success", "message": "Re-index job is being cancelled"}
+
+        if shared_state_enabled():
+            def request_cancel(current):
+                if not current or current.get("status") != "running":
+                    raise LookupError("No re-index job is running")
+                return {**current, "cancel_requested": True}
+            try:
+                get_state_store().update("jobs", "reindex", request_cancel)
+                return {"status": "success", "message": "Re-index job is being cancelled"}
+            except LookupError:
+                pass
+        return {"status": "error", "message": "No re-index job is running"}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get the progress of the current (or last) job"""
+        job = self.job
+        if shared_state_enabled():
+            job = get_state_store().get("jobs", "reindex") or job
+        if job is None:
+            return {"status": "idle"}
+        job = dict(job)
+        job["failed_documents"] = list(job["failed_documents"])
+        if job["total_documents"]:
+            job["progress"] = round(job["processed_documents"] / job["total_documents"], 4)
+        else:
+            job["progress"] = 1.0 if job["status"] == "completed" else 0.0
+        return job
+
+    def _completed_doc_ids(self) -> List[str]:
+        return [
+            doc_id for doc_id, doc_data in list(self.document_service.documents_db.items())
+            if doc_data.get("status") == DocumentStatus.COMPLETED.value
+        ]
+
+    def _has_processing_documents(self) -> bool:
+        return any(
+            doc_data.get("status") == DocumentStatus.PROCESSING.value
+            for doc_data in list(self.document_service.documents_db.values())
+        )
+
+    def _run(self):
+        job = self.job
+        gate = self.rag_service.write_gate
+        target: Optional[VectorIndex] = None
+        chunk_counts: Dict[str, int] = {}
+        gate.start_tracking()
+        try:
+            target = self.rag_service.create_index()
+            job["target_collection"] = target.name
+            job["config"] = target.config
+
+            done: Set[str] = set()
+            pending: List[str] = []
+            for _ in range(MAX_CATCH_UP_ROUNDS):
+                self._sync_changed(gate.drain(), done, target, chunk_counts)
+                pending = [doc_id for doc_id in self._completed_doc_ids() if doc_id not in done]
+                if not pending:
+                    if not self._has_processing_documents():
+                        break
+                    # Let uploads that are still being ingested finish first
+                    self._cancel.wait(1.0)
+                    continue
+                self._reindex_pending(pending, done, target, chunk_counts)
+            else:
+                pending = [doc_id for doc_id in self._completed_doc_ids() if doc_id not in done]
+
+            if self._cancel.is_set():
+                raise InterruptedError("Re-index job cancelled")
+            if pending:
+                raise RuntimeError(
+                    f"{len(pending)} documents were still being added after {MAX_CATCH_UP_ROUNDS} catch-up rounds"
+                )
+
+            # Hold writes to the active collection until the switch: documents
+            # added or changed since the last round are brought over first
+            with gate.exclusive():
+                self._sync_changed(gate.drain(), done, target, chunk_counts)
+                self._reindex_pending(
+                    [doc_id for doc_id in self._completed_doc_ids() if doc_id not in done], done, target, chunk_counts,
+                    throttle=False
+                )
+                if job["failed_documents"]:
+                    # Switching now would drop these documents from search
+                    raise RuntimeError(f"{len(job['failed_documents'])} documents could not be re-indexed")
+
+                self.rag_service.activate_index(target)
+                self._update_chunk_counts(chunk_counts)
+            job["status"] = "completed"
+            logger.info(
+                f"Re-index job {job['job_id']} completed: {job['processed_documents']} documents, "
+                f"{job['chunks_created']} chunks in {target.name}"
+            )
+
+        except Exception as e:
+            job["status"] = "cancelled" if isinstance(e, InterruptedError) else "failed"
+            job["error"] = str(e)
+            logger.error(f"Re-index job {job['job_id']} {job['status']}: {str(e)}")
+            if target is not None:
+                try:
+                    self.rag_service.drop_index(target)
+                except Exception as drop_error:
+                    logger.warning(f"Could not drop shadow collection {target.name}: {str(drop_error)}")
+        finally:
+            gate.stop_tracking()
+            job["finished_at"] = datetime.now().isoformat()
+            self._publish()
+
+    def _reindex_pending(
+        self,
+        pending: List[str],
+        done: Set[str],
+        target: VectorIndex,
+        chunk_counts: Dict[str, int],
+        throttle: bool = True
+    ):
+        job = self.job
+        job["total_documents"] += len(pending)
+        for doc_id in pending:
+            if self._cancel.is_set():
+                raise InterruptedError("Re-index job cancelled")
+            self._reindex_document(doc_id, target, chunk_counts, throttle)
+            done.add(doc_id)
+            job["processed_documents"] += 1
+            self._publish()
+
+    def _sync_changed(self, doc_ids: Set[str], done: Set[str], target: VectorIndex, chunk_counts: Dict[str, int]):
+        """Drop the target's chunks of documents written to the active collection, so they are indexed again.
+
+        The next pass over the pending documents splits them again from the
+        content store under the new settings; deleted documents are just
+        gone. Writers publish their keys once the registry is updated too, so
+        the registry is current for every drained document.
+        """
+        job = self.job
+        collection = target.vectorstore._collection
+        for doc_id in doc_ids:
+            if self._cancel.is_set():
+                raise InterruptedError("Re-index job cancelled")
+            try:
+                stale_ids = document_chunk_ids(collection, doc_id, chunk_counts.get(doc_id))
+                if stale_ids:
+                    collection.delete(ids=stale_ids)
+            except Exception as e:
+                # Left as it is, the document would keep chunks of its old content in the new collection
+                logger.error(f"Error syncing changed document {doc_id}: {str(e)}")
+                if doc_id not in job["failed_documents"]:
+                    job["failed_documents"].append(doc_id)
+                continue
+            if doc_id in done:
+                done.discard(doc_id)
+                job["total_documents"] -= 1
+                job["processed_documents"] -= 1
+            if doc_id in job["failed_documents"]:
+                job["failed_documents"].remove(doc_id)
+            job["chunks_created"] -= chunk_counts.pop(doc_id, 0)
+            job["changed_documents"] += 1
+        if doc_ids:
+            self._publish()
+
+    def _reindex_document(self, doc_id: str, target: VectorIndex, chunk_counts: Dict[str, int], throttle: bool = True):
+        """Index one document into the target collection, then pause to respect the throttle"""
+        job = self.job
+        started = time.monotonic()
+        try:
+            doc_data = self.document_service.documents_db.get(doc_id)
+            if doc_data is None:
+                return  # Deleted meanwhile
+
+            if doc_data.get("content_hash"):
+                # Chunks are numbered from 0 in the new collection
+                result = self.rag_service.add_document_stream(
+                    self.document_service.iter_document_parts(doc_id), index=target
+                )
+                chunks = result["chunks_created"]
+            else:
+                chunks = self._copy_chunks(doc_id, doc_data.get("chunk_seq"), target)
+                job["copied_documents"] += 1
+
+            chunk_counts[doc_id] = chunks
+            job["chunks_created"] += chunks
+        except Exception as e:
+            logger.error(f"Error re-indexing document {doc_id}: {str(e)}")
+            job["failed_documents"].append(doc_id)
+            return
+
+        # Throttle: spread the embedding calls so chat traffic keeps its quota
+        rate = job["chunks_per_minute"]
+        if throttle and rate and chunks:
+            remaining = chunks * 60.0 / rate - (time.monotonic() - started)
+            if remaining > 0:
+                self._cancel.wait(remaining)
+
+    def _copy_chunks(self, doc_id: str, chunk_seq: Optional[int], target: VectorIndex) -> int:
+        """Copy a document's existing chunks, keeping their IDs (no stored original to re-split)"""
+        source = self.rag_service.index
+        same_model = source.config["embedding_model"] == target.config["embedding_model"]
+        include = ["documents", "metadatas"] + (["embeddings"] if same_model else [])
+        chunk_ids = document_chunk_ids(source.vectorstore._collection, doc_id, chunk_seq)
+        copied = 0
+        for start in range(0, len(chunk_ids), COPY_BATCH_SIZE):
+            data = source.vectorstore._collection.get(ids=chunk_ids[start:start + COPY_BATCH_SIZE], include=include)
+            self._add_copied(data, same_model, target)
+            copied += len(data["ids"])
+        target.vectorstore.persist()
+        return copied
+
+    def _add_copied(self, data: Dict[str, Any], same_model: bool, target: VectorIndex):
+        if not data["ids"]:
+            return
+        with api_priority(Priority.INGESTION):
+            if same_model:
+                # Same embedding model: reuse the vectors, no API calls
+                target.vectorstore._collection.add(
+                    ids=data["ids"],
+                    embeddings=data["embeddings"],
+                    metadatas=data["metadatas"],
+                    documents=data["documents"]
+                )
+            else:
+                target.vectorstore.add_texts(
+                    texts=data["documents"],
+                    metadatas=data["metadatas"],
+                    ids=data["ids"]
+                )
+
+    def _update_chunk_counts(self, chunk_counts: Dict[str, int]):
+        for doc_id, chunks in chunk_counts.items():
+            doc_data = self.document_service.documents_db.get(doc_id)
+            if doc_data is not None:
+                doc_data["chunk_count"] = chunks
+                if doc_data.get("content_hash"):
+                    # Re-split documents are numbered from 0 in the new collection; numbers are
+                    # never lowered, so the previous collection stays consistent after a rollback
+                    doc_data["chunk_seq"] = max(doc_data.get("chunk_seq") or 0, chunks)
+                doc_data["updated_at"] = datetime.now().isoformat()
+                self.document_service.documents_db[doc_id] = doc_data
+        self.document_service._save_documents_db()
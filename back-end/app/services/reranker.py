@@ -0,0 +1,272 @@
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import importlib.util
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.vector_index import chunk_key
+from app.utils.helpers import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Words that say nothing about relevance (English and Vietnamese)
+_STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it of on or that the this to was what when
+where which who why will with you your
+à ạ ai bị các cái cho có của cũng đã đang để được gì hay không là làm lại mà một này nào nếu như những
+nhưng ra rằng rất sao sẽ tại thì theo trong từ và vậy về vì với
+""".split())
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(unicodedata.normalize("NFC", text).casefold())
+
+def content_terms(tokens: List[str]) -> List[str]:
+    return [token for token in tokens if token not in _STOPWORDS]
+
+class Reranker:
+    """Scores (query, chunk) pairs; scores are in [0, 1] and independent of the other chunks"""
+
+    name = "base"
+    # Chunks scored per call, so the latency budget is checked between calls
+    batch_size = 64
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        raise NotImplementedError
+
+class LexicalReranker(Reranker):
+    """CPU-only scoring from lexical features of the query and the chunk.
+
+    Combines saturated term frequency of the query's content words (BM25
+    without corpus statistics), how many of those words the chunk covers,
+    query bigrams found verbatim in the chunk, and matches in the title and
+    section headers.
+    """
+
+    name = "lexical"
+    # Chunks are scored one by one, so small batches cost nothing and keep the budget checked
+    batch_size = 4
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, average_length: Optional[int] = None):
+        self.k1 = k1
+        self.b = b
+        # Chunks are close to chunk_size characters, about 5 characters per word
+        self.average_length = average_length or max(settings.chunk_size // 5, 1)
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        query_tokens = tokenize(query)
+        terms = list(dict.fromkeys(content_terms(query_tokens))) or list(dict.fromkeys(query_tokens))
+        bigrams = {pair for pair in zip(query_tokens, query_tokens[1:]) if not set(pair) <= _STOPWORDS}
+        if not terms:
+            return [0.0] * len(documents)
+        return [self._score_one(terms, bigrams, doc) for doc in documents]
+
+    def _score_one(self, terms: List[str], bigrams, doc: Document) -> float:
+        tokens = tokenize(doc.page_content)
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        length_norm = 1 - self.b + self.b * len(tokens) / self.average_length
+        saturation = sum(
+            counts[term] * (self.k1 + 1) / (counts[term] + self.k1 * length_norm)
+            for term in terms if term in counts
+        ) / ((self.k1 + 1) * len(terms))
+        coverage = sum(1 for term in terms if term in counts) / len(terms)
+
+        phrase = 0.0
+        if bigrams:
+            chunk_bigrams = set(zip(tokens, tokens[1:]))
+            phrase = len(bigrams & chunk_bigrams) / len(bigrams)
+
+        header_text = " ".join(
+            str(value) for key, value in doc.metadata.items()
+            if key == "title" or key.startswith("Header")
+        )
+        header = 0.0
+        if header_text:
+            header_tokens = set(tokenize(header_text))
+            header = sum(1 for term in terms if term in header_tokens) / len(terms)
+
+        return 0.4 * saturation + 0.3 * coverage + 0.2 * phrase + 0.1 * header
+
+class CrossEncoderReranker(Reranker):
+    """Local cross-encoder (sentence-transformers) on the CPU.
+
+    The model loads in the background on startup; until it is ready, scoring
+    raises and retrieval keeps the vector order.
+    """
+
+    name = "cross-encoder"
+    batch_size = 8
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        threading.Thread(target=self._load, name="cross-encoder-load", daemon=True).start()
+
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+
+            self._model = CrossEncoder(self.model_name, device="cpu")
+            logger.info(f"Loaded cross-encoder {self.model_name}")
+        except Exception as e:
+            logger.error(f"Error loading cross-encoder {self.model_name}: {str(e)}")
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        if self._model is None:
+            raise RuntimeError("Cross-encoder is not loaded")
+        logits = self._model.predict([(query, doc.page_content) for doc in documents], batch_size=self.batch_size)
+        return [1 / (1 + math.exp(-float(logit))) for logit in logits]
+
+class ScoreCache:
+    """Thread-safe LRU of reranker scores"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._scores: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def put(self, key: Hashable, score: float):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+class RerankStage:
+    """Second retrieval pass: rescore over-fetched candidates and keep the best.
+
+    The final score blends the reranker's score with the candidate's vector
+    rank. Reranker scores are cached per (collection, query, chunk). If
+    scoring doesn't finish within the latency budget, or fails, the vector
+    order is kept.
+    """
+
+    def __init__(
+        self,
+        reranker: Reranker,
+        budget_ms: float = 200.0,
+        vector_weight: float = 0.3,
+        cache_size: int = 10000
+    ):
+        self.reranker = reranker
+        self.budget = budget_ms / 1000
+        self.vector_weight = vector_weight
+        self.cache = ScoreCache(cache_size)
+        self._stats_lock = threading.Lock()
+        self._queries = 0
+        self._candidates = 0
+        self._cache_hits = 0
+        self._fallbacks = 0
+        self._total_time = 0.0
+
+    def rerank(self, query: str, documents: List[Document], top_k: int, scope: Hashable = None) -> List[Document]:
+        """The ``top_k`` best of ``documents`` (which are in vector order).
+
+        ``scope`` is the collection the documents come from: chunk IDs repeat
+        across collections, so cached scores are kept per collection.
+        """
+        if not documents:
+            return documents
+        started = time.monotonic()
+        deadline = started + self.budget
+        question = normalize_question(query)
+        keys = [(self.reranker.name, scope, question, chunk_key(doc)) for doc in documents]
+
+        scores: List[Optional[float]] = [self.cache.get(key) for key in keys]
+        hits = sum(1 for score in scores if score is not None)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        fallback = False
+        try:
+            for start in range(0, len(missing), self.reranker.batch_size):
+                if time.monotonic() > deadline:
+                    fallback = True
+                    break
+                batch = missing[start:start + self.reranker.batch_size]
+                for i, score in zip(batch, self.reranker.score(query, [documents[i] for i in batch])):
+                    scores[i] = score
+                    self.cache.put(keys[i], score)
+        except Exception as e:
+            logger.warning(f"Reranking failed, keeping vector order: {str(e)}")
+            fallback = True
+
+        if fallback:
+            result = documents[:top_k]
+        else:
+            count = len(documents)
+            ranked: List[Tuple[float, int]] = []
+            for rank, score in enumerate(scores):
+                prior = 1 - rank / count
+                ranked.append(((1 - self.vector_weight) * score + self.vector_weight * prior, rank))
+            ranked.sort(key=lambda item: (-item[0], item[1]))
+            result = []
+            for final_score, rank in ranked[:top_k]:
+                doc = documents[rank]
+                doc.metadata["rerank_score"] = round(final_score, 4)
+                result.append(doc)
+
+        with self._stats_lock:
+            self._queries += 1
+            self._candidates += len(documents)
+            self._cache_hits += hits
+            self._fallbacks += fallback
+            self._total_time += time.monotonic() - started
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "reranker": self.reranker.name,
+                "budget_ms": round(self.budget * 1000, 3),
+                "queries": self._queries,
+                "candidates": self._candidates,
+                "cache_hits": self._cache_hits,
+                "cache_hit_rate": round(self._cache_hits / self._candidates, 4) if self._candidates else 0.0,
+                "cache_size": len(self.cache),
+                "fallbacks": self._fallbacks,
+                "average_time_ms": round(self._total_time / self._queries * 1000, 3) if self._queries else 0.0
+            }
+
+def create_rerank_stage() -> Optional[RerankStage]:
+    """Rerank stage from the settings (None when reranking is disabled)"""
+    name = settings.reranker.lower()
+    if name == "none":
+        return None
+    if name == "cross-encoder":
+        if importlib.util.find_spec("sentence_transformers") is not None:
+            reranker = CrossEncoderReranker(settings.cross_encoder_model)
+        else:
+            logger.warning("sentence-transformers is not installed, using the lexical reranker")
+            reranker = LexicalReranker()
+    elif name == "lexical":
+        reranker = LexicalReranker()
+    else:
+        raise ValueError(f"Unknown reranker: {settings.reranker}")
+    return RerankStage(
+        reranker,
+        budget_ms=settings.rerank_budget_ms,
+        vector_weight=settings.rerank_vector_weight,
+        cache_size=settings.rerank_cache_size
+    )
@@ -0,0 +1,152 @@
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+import logging
+import threading
+import time
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Best-match similarity histogram buckets (lower bounds)
+SIMILARITY_BUCKETS = (0.0, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99)
+
+class SemanticCacheEntry(NamedTuple):
+    question: str
+    answer: str
+    sources: List[Document]
+    chunk_ids: Tuple[str, ...]
+
+class SemanticCache:
+    """Recent questions' embeddings with their answers, for near-duplicate reuse.
+
+    Embeddings are kept normalized in one matrix, so a lookup is a single
+    matrix-vector product. Entries belong to a scope (knowledge base version,
+    retrieval and prompt settings); a lookup in another scope empties the
+    cache. The oldest entry is overwritten when it is full.
+
+    In ``observe`` mode lookups never serve answers, but the best similarity
+    of each lookup is recorded together with whether the near duplicate
+    would have been answered from the same chunks, to choose a threshold.
+    """
+
+    def __init__(self, max_size: int = 1000, threshold: float = 0.95, ttl: float = 3600.0, mode: str = "observe"):
+        if mode not in ("on", "observe"):
+            raise ValueError(f"Unknown semantic cache mode: {mode}")
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._scope: Optional[Hashable] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._expires = np.zeros(max_size, dtype=np.float64)
+        self._entries: List[Optional[SemanticCacheEntry]] = [None] * max_size
+        self._next = 0
+        self._lookups = 0
+        self._hits = 0
+        self._histogram = [0] * len(SIMILARITY_BUCKETS)
+        self._observed_near = 0
+        self._observed_agreeing = 0
+
+    @property
+    def serving(self) -> bool:
+        return self.mode == "on"
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _reset(self, scope: Hashable):
+        self._scope = scope
+        self._expires[:] = 0
+        self._entries = [None] * self.max_size
+        self._next = 0
+
+    def lookup(self, embedding: List[float], scope: Hashable) -> Tuple[Optional[SemanticCacheEntry], float]:
+        """Closest live entry at or above the threshold (or None) and the best similarity seen"""
+        if self.max_size <= 0:
+            return None, 0.0
+        query = self._normalize(embedding)
+        with self._lock:
+            if scope != self._scope:
+                self._reset(scope)
+            self._lookups += 1
+            live = self._expires > time.monotonic()
+            if self._vectors is None or not live.any() or self._vectors.shape[1] != query.shape[0]:
+                self._record(0.0)
+                return None, 0.0
+            similarities = np.where(live, self._vectors @ query, -1.0)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            self._record(similarity)
+            if similarity < self.threshold:
+                return None, similarity
+            if self.serving:
+                self._hits += 1
+            return self._entries[best], similarity
+
+    def _record(self, similarity: float):
+        for i in range(len(SIMILARITY_BUCKETS) - 1, -1, -1):
+            if similarity >= SIMILARITY_BUCKETS[i]:
+                self._histogram[i] += 1
+                return
+
+    def observe(self, entry: SemanticCacheEntry, chunk_ids: Tuple[str, ...]):
+        """Record whether a near duplicate found in observe mode was answered from the same chunks"""
+        with self._lock:
+            self._observed_near += 1
+            self._observed_agreeing += entry.chunk_ids == chunk_ids
+
+    def put(self, embedding: List[float], scope: Hashable, entry: SemanticCacheEntry):
+        if self.max_size <= 0:
+            return
+        vector = self._normalize(embedding)
+        with self._lock:
+            if scope != self._scope:
+                self._reset(scope)
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+                self._expires[:] = 0
+            slot = self._next
+            self._next = (slot + 1) % self.max_size
+            self._vectors[slot] = vector
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._entries[slot] = entry
+
+    def invalidate_chunks(self, chunk_ids: List[str]) -> int:
+        """Drop entries answered from any of these chunks"""
+        removed = set(chunk_ids)
+        count = 0
+        with self._lock:
+            for slot, entry in enumerate(self._entries):
+                if entry is not None and removed.intersection(entry.chunk_ids):
+                    self._entries[slot] = None
+                    self._expires[slot] = 0
+                    count += 1
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = int((self._expires > time.monotonic()).sum())
+            histogram = {}
+            for i, lower in enumerate(SIMILARITY_BUCKETS):
+                upper = SIMILARITY_BUCKETS[i + 1] if i + 1 < len(SIMILARITY_BUCKETS) else 1.0
+                histogram[f"{lower:g}-{upper:g}"] = self._histogram[i]
+            return {
+                "mode": self.mode,
+                "threshold": self.threshold,
+                "size": live,
+                "max_size": self.max_size,
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "hit_rate": round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+                "best_similarity_histogram": histogram,
+                # Observe mode: near duplicates above the threshold, and how many retrieved the same chunks
+                "observed_near_duplicates": self._observed_near,
+                "observed_same_chunks_rate": round(
+                    self._observed_agreeing / self._observed_near, 4
+                ) if self._observed_near else 0.0
+            }
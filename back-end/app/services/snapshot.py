@@ -0,0 +1,287 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+NORMS_FILE = "norms.npy"
+STRING_COLUMNS = ("ids", "documents", "metadatas")
+SEARCH_BLOCK_ROWS = 65536
+
+class SnapshotError(ValueError):
+    """Invalid or corrupted snapshot"""
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class _StringColumnWriter:
+    """Writes a string column as one UTF-8 blob plus an int64 offsets array"""
+
+    def __init__(self, directory: str, name: str, rows: int):
+        self.data_path = os.path.join(directory, f"{name}.bin")
+        self.offsets_path = os.path.join(directory, f"{name}.offsets.npy")
+        self._data = open(self.data_path, "wb")
+        self._offsets = np.lib.format.open_memmap(self.offsets_path, mode="w+", dtype=np.int64, shape=(rows + 1,))
+        self._offsets[0] = 0
+        self._row = 0
+        self._position = 0
+
+    def extend(self, values: Iterable[str]):
+        for value in values:
+            encoded = value.encode("utf-8")
+            self._data.write(encoded)
+            self._position += len(encoded)
+            self._row += 1
+            self._offsets[self._row] = self._position
+
+    def close(self) -> List[str]:
+        self._data.close()
+        self._offsets.flush()
+        del self._offsets
+        return [self.data_path, self.offsets_path]
+
+class _StringColumn:
+    """Memory-mapped string column; rows are decoded on access"""
+
+    def __init__(self, directory: str, name: str):
+        self.offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r")
+        data_path = os.path.join(directory, f"{name}.bin")
+        if os.path.getsize(data_path):
+            self.data = np.memmap(data_path, dtype=np.uint8, mode="r")
+        else:
+            self.data = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        return self.data[int(self.offsets[row]):int(self.offsets[row + 1])].tobytes().decode("utf-8")
+
+def export_snapshot(
+    collection,
+    out_dir: str,
+    config: Dict[str, Any],
+    dtype: str = "float16",
+    page_size: int = 1000
+) -> Dict[str, Any]:
+    """Write a Chroma collection to a snapshot directory.
+
+    Embeddings go to one contiguous ``.npy`` block (float16 or float32)
+    together with their squared norms; ids, chunk text and metadata (JSON)
+    go to string columns (UTF-8 blob + offsets). The manifest records the
+    index config and a SHA-256 for every file.
+    """
+    if dtype not in ("float16", "float32"):
+        raise ValueError("dtype must be float16 or float32")
+
+    rows = collection.count()
+    os.makedirs(out_dir, exist_ok=True)
+    if os.path.exists(os.path.join(out_dir, MANIFEST_FILE)):
+        raise FileExistsError(f"{out_dir} already contains a snapshot")
+
+    dimension = 0
+    if rows:
+        first = collection.get(limit=1, include=["embeddings"])
+        dimension = len(first["embeddings"][0])
+
+    embeddings = np.lib.format.open_memmap(
+        os.path.join(out_dir, EMBEDDINGS_FILE), mode="w+", dtype=np.dtype(dtype), shape=(rows, dimension)
+    )
+    norms = np.lib.format.open_memmap(
+        os.path.join(out_dir, NORMS_FILE), mode="w+", dtype=np.float32, shape=(rows,)
+    )
+    columns = {name: _StringColumnWriter(out_dir, name, rows) for name in STRING_COLUMNS}
+
+    written = 0
+    while written < rows:
+        page = collection.get(
+            limit=page_size, offset=written, include=["embeddings", "documents", "metadatas"]
+        )
+        count = len(page["ids"])
+        if count == 0:
+            break
+        block = np.asarray(page["embeddings"], dtype=np.float32)
+        stored = block.astype(dtype)
+        embeddings[written:written + count] = stored
+        # Norms of the stored (possibly rounded) vectors, so distances match at search time
+        stored = stored.astype(np.float32)
+        norms[written:written + count] = np.einsum("ij,ij->i", stored, stored)
+        columns["ids"].extend(page["ids"])
+        columns["documents"].extend(text or "" for text in page["documents"])
+        columns["metadatas"].extend(json.dumps(meta or {}, ensure_ascii=False) for meta in page["metadatas"])
+        written += count
+        logger.info(f"Exported {written}/{rows} chunks")
+
+    if written != rows:
+        raise SnapshotError(f"Collection changed during export ({written} of {rows} rows read)")
+
+    embeddings.flush()
+    norms.flush()
+    del embeddings, norms
+    files = [EMBEDDINGS_FILE, NORMS_FILE]
+    for column in columns.values():
+        files.extend(os.path.basename(path) for path in column.close())
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "snapshot_id": uuid.uuid4().hex,
+        "created_at": datetime.now().isoformat(),
+        "collection": collection.name,
+        "config": config,
+        "rows": rows,
+        "dimension": dimension,
+        "dtype": dtype,
+        "files": {
+            name: {"sha256": _sha256_file(os.path.join(out_dir, name)), "bytes": os.path.getsize(os.path.join(out_dir, name))}
+            for name in files
+        }
+    }
+    tmp_manifest = os.path.join(out_dir, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_manifest, os.path.join(out_dir, MANIFEST_FILE))
+
+    logger.info(f"Exported snapshot {manifest['snapshot_id']} ({rows} chunks) to {out_dir}")
+    return manifest
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise SnapshotError(f"No snapshot manifest in {path}")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')}")
+    return manifest
+
+def verify_snapshot(path: str, checksums: bool = True) -> Dict[str, Any]:
+    """Check every file against the manifest's size and SHA-256; returns the manifest.
+
+    With ``checksums=False`` only sizes are checked, which is instant but
+    doesn't catch corrupted content.
+    """
+    manifest = load_manifest(path)
+    for name, expected in manifest["files"].items():
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            raise SnapshotError(f"Snapshot file {name} is missing")
+        if os.path.getsize(file_path) != expected["bytes"]:
+            raise SnapshotError(f"Snapshot file {name} has the wrong size")
+    if checksums:
+        for name, expected in manifest["files"].items():
+            if _sha256_file(os.path.join(path, name)) != expected["sha256"]:
+                raise SnapshotError(f"Snapshot file {name} failed its checksum")
+    return manifest
+
+class SnapshotVectorStore(VectorStore):
+    """Read-only vector store served straight from a memory-mapped snapshot.
+
+    Search is brute force over the mapped embedding block (L2 distance, like
+    the Chroma collections), processed in fixed-size row blocks so only the
+    pages being scanned are resident. Meant to bridge the time until the
+    snapshot has been imported into a Chroma collection.
+
+    Opening the store only checks file sizes against the manifest; pass
+    ``checksums=True`` to hash every file first (``verify_snapshot`` does the
+    same separately, e.g. in the background).
+    """
+
+    def __init__(self, path: str, embedding: Embeddings, checksums: bool = False):
+        self.path = path
+        self.manifest = verify_snapshot(path, checksums)
+        self.embedding = embedding
+        self.vectors = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, NORMS_FILE), mmap_mode="r")
+        self.columns = {name: _StringColumn(path, name) for name in STRING_COLUMNS}
+        if not (len(self.vectors) == len(self.norms) == self.manifest["rows"]):
+            raise SnapshotError("Snapshot arrays do not match the manifest row count")
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def snapshot_id(self) -> str:
+        return self.manifest["snapshot_id"]
+
+    def count(self) -> int:
+        return len(self.vectors)
+
+    def row(self, i: int) -> Tuple[str, Document]:
+        """Get the id and document of a row"""
+        metadata = json.loads(self.columns["metadatas"][i])
+        return self.columns["ids"][i], Document(page_content=self.columns["documents"][i], metadata=metadata)
+
+    def iter_batches(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Yield rows in batches shaped like Chroma's ``add`` arguments"""
+        for start in range(0, self.count(), batch_size):
+            end = min(start + batch_size, self.count())
+            yield {
+                "ids": [self.columns["ids"][i] for i in range(start, end)],
+                "embeddings": np.asarray(self.vectors[start:end], dtype=np.float32).tolist(),
+                "metadatas": [json.loads(self.columns["metadatas"][i]) for i in range(start, end)],
+                "documents": [self.columns["documents"][i] for i in range(start, end)]
+            }
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        if self.count() == 0 or k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(query @ query)
+        best_rows = np.empty(0, dtype=np.int64)
+        best_distances = np.empty(0, dtype=np.float32)
+        for start in range(0, self.count(), SEARCH_BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            distances = self.norms[start:start + len(block)] - 2.0 * (block @ query) + query_norm
+            if len(distances) > k:
+                top = np.argpartition(distances, k)[:k]
+            else:
+                top = np.arange(len(distances))
+            best_rows = np.concatenate([best_rows, top + start])
+            best_distances = np.concatenate([best_distances, distances[top]])
+            if len(best_rows) > k:
+                keep = np.argpartition(best_distances, k)[:k]
+                best_rows, best_distances = best_rows[keep], best_distances[keep]
+        order = np.argsort(best_distances)
+        return [(self.row(int(best_rows[i]))[1], float(max(best_distances[i], 0.0))) for i in order]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def persist(self):
+        """Nothing to persist (read-only)"""
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise RuntimeError("The index is being restored from a snapshot; try again once the restore has finished")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        raise TypeError(
+            "Snapshot vector stores are read-only and can't be built from texts; "
+            "export a collection with export_snapshot and open the directory instead"
+        )
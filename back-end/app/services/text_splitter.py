@@ -0,0 +1,283 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from collections import deque
+from functools import lru_cache
+import logging
+import re
+
+from langchain_core.documents import Document
+
+from app.utils.process_pool import available_cpus, get_process_pool
+
+logger = logging.getLogger(__name__)
+
+Span = Tuple[int, int]
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+class Chunk:
+    """A chunk of a source text, stored as offsets instead of a copy.
+
+    The text is only sliced out of the source when ``text`` is read, and the
+    metadata dictionary is shared with every other chunk of the same document.
+    """
+
+    __slots__ = ("source", "start", "end", "metadata")
+
+    def __init__(self, source: str, start: int, end: int, metadata: Dict[str, Any]):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.metadata = metadata
+
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.text, metadata=dict(self.metadata))
+
+class OffsetTextSplitter:
+    """Recursive character splitter that works on (start, end) offsets.
+
+    Produces exactly the chunks of LangChain's ``RecursiveCharacterTextSplitter``
+    with its defaults (separators kept at the start of the following piece,
+    merged pieces stripped of surrounding whitespace), but never builds
+    intermediate substrings: pieces and chunks are offsets into the source
+    and lengths are offset differences.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int, separators: Optional[Sequence[str]] = None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators or DEFAULT_SEPARATORS)
+        self._patterns = {sep: re.compile(re.escape(sep)) for sep in self.separators if sep}
+
+    def split_spans(self, text: str, start: int = 0, end: Optional[int] = None) -> List[Span]:
+        """Compute chunk offsets for ``text[start:end]``"""
+        return self._split(text, start, len(text) if end is None else end, self.separators)
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def _split(self, text: str, start: int, end: int, separators: List[str]) -> List[Span]:
+        # Use the first separator that occurs in this range
+        separator = separators[-1]
+        remaining: List[str] = []
+        for i, sep in enumerate(separators):
+            if sep == "":
+                separator = sep
+                break
+            if self._patterns[sep].search(text, start, end):
+                separator = sep
+                remaining = separators[i + 1:]
+                break
+
+        chunks: List[Span] = []
+        good: List[Span] = []
+        for piece in self._pieces(text, start, end, separator):
+            if piece[1] - piece[0] < self.chunk_size:
+                good.append(piece)
+                continue
+            if good:
+                chunks.extend(self._merge(text, good))
+                good = []
+            if not remaining:
+                chunks.append(piece)
+            else:
+                chunks.extend(self._split(text, piece[0], piece[1], remaining))
+        if good:
+            chunks.extend(self._merge(text, good))
+        return chunks
+
+    def _pieces(self, text: str, start: int, end: int, separator: str) -> List[Span]:
+        """Cut the range before each separator occurrence (the separator starts the next piece)"""
+        if not separator:
+            return [(i, i + 1) for i in range(start, end)]
+
+        pieces = []
+        previous = start
+        for match in self._patterns[separator].finditer(text, start, end):
+            if match.start() > previous:
+                pieces.append((previous, match.start()))
+            previous = match.start()
+        if end > previous:
+            pieces.append((previous, end))
+        return pieces
+
+    def _merge(self, text: str, pieces: List[Span]) -> List[Span]:
+        """Merge consecutive pieces into chunks of at most chunk_size with overlap"""
+        chunks = []
+        current: deque = deque()
+        total = 0
+        for piece in pieces:
+            length = piece[1] - piece[0]
+            if total + length > self.chunk_size:
+                if total > self.chunk_size:
+                    logger.warning(
+                        f"Created a chunk of size {total}, which is longer than the specified {self.chunk_size}"
+                    )
+                if current:
+                    chunk = self._strip(text, current[0][0], current[-1][1])
+                    if chunk:
+                        chunks.append(chunk)
+                    while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                        first = current.popleft()
+                        total -= first[1] - first[0]
+            current.append(piece)
+            total += length
+        if current:
+            chunk = self._strip(text, current[0][0], current[-1][1])
+            if chunk:
+                chunks.append(chunk)
+        return chunks
+
+    @staticmethod
+    def _strip(text: str, start: int, end: int) -> Optional[Span]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
+
+# Worker side (kept free of app imports so spawned processes start quickly)
+
+@lru_cache(maxsize=8)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> OffsetTextSplitter:
+    return OffsetTextSplitter(chunk_size, chunk_overlap)
+
+def _split_spans(texts: List[str], chunk_size: int, chunk_overlap: int) -> List[List[Span]]:
+    """Compute chunk offsets for each text (runs in a worker process)"""
+    splitter = _get_splitter(chunk_size, chunk_overlap)
+    return [splitter.split_spans(text) for text in texts]
+
+def shard_spans(text: str, shard_size: int) -> List[Span]:
+    """Cut a large text into shards at paragraph (or line, or word) boundaries"""
+    if len(text) <= shard_size:
+        return [(0, len(text))]
+
+    shards = []
+    start = 0
+    while len(text) - start > shard_size:
+        end = start + shard_size
+        for separator in ("\n\n", "\n", " "):
+            cut = text.rfind(separator, start + shard_size // 2, end)
+            if cut != -1:
+                break
+        else:
+            cut = end
+        shards.append((start, cut))
+        start = cut
+    shards.append((start, len(text)))
+    return shards
+
+_WHITESPACE = re.compile(r"\s")
+
+def overlap_start(text: str, start: int, chunk_overlap: int) -> int:
+    """Where a shard starting at ``start`` should begin so its first chunk overlaps the previous shard.
+
+    That is the first word boundary at most ``chunk_overlap`` characters
+    back, as the overlap of a chunk is made of whole pieces.
+    """
+    match = _WHITESPACE.search(text, max(start - chunk_overlap, 0), start)
+    return match.start() if match else start
+
+class ParallelSplitter:
+    """Splits documents into offset chunks, fanning large inputs out to the process pool.
+
+    Inputs below ``min_parallel_chars`` are split inline to avoid pickling
+    overhead. Larger inputs are sharded (big documents are cut at paragraph,
+    line or word boundaries) and split across the pool; workers only send
+    back offsets. Chunk order and metadata are preserved.
+
+    The result is not identical to the inline splitter's: the greedy merge
+    restarts at each shard, so after a shard boundary chunks can be cut at
+    other places (until a piece too long to merge restarts the inline merge
+    too). Each shard after the first starts up to ``chunk_overlap``
+    characters early, so the chunks still overlap across the boundary;
+    chunks that fall entirely in that lead are dropped as duplicates.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        workers: int = 0,
+        min_parallel_chars: int = 200_000,
+        shard_chars: int = 100_000
+    ):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.workers = workers or available_cpus()
+        self.min_parallel_chars = min_parallel_chars
+        self.shard_chars = max(shard_chars, chunk_size * 4)
+
+    def split(self, documents: List[Document], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[Chunk]:
+        """Split documents into chunks.
+
+        ``metadatas`` overrides the metadata attached to each document's
+        chunks (shared, not copied); by default the document metadata is used.
+        """
+        if metadatas is None:
+            metadatas = [doc.metadata for doc in documents]
+
+        total_chars = sum(len(doc.page_content) for doc in documents)
+        if self.workers <= 1 or total_chars < self.min_parallel_chars:
+            splitter = _get_splitter(self.chunk_size, self.chunk_overlap)
+            return [
+                Chunk(doc.page_content, start, end, metadata)
+                for doc, metadata in zip(documents, metadatas)
+                for start, end in splitter.split_spans(doc.page_content)
+            ]
+
+        # One task per shard, tagged with its document index, boundary and offset
+        shards: List[Tuple[int, int, int, int]] = []
+        for i, doc in enumerate(documents):
+            shards.extend(
+                (i, start, overlap_start(doc.page_content, start, self.chunk_overlap) if start else 0, end)
+                for start, end in shard_spans(doc.page_content, self.shard_chars)
+            )
+
+        # Group shards into roughly even batches, a few per worker
+        target = max(self.shard_chars, total_chars // (self.workers * 4))
+        batches: List[List[Tuple[int, int, int, int]]] = [[]]
+        batch_chars = 0
+        for shard in shards:
+            if batch_chars >= target:
+                batches.append([])
+                batch_chars = 0
+            batches[-1].append(shard)
+            batch_chars += shard[3] - shard[2]
+
+        pool = get_process_pool(self.workers)
+        futures = [
+            pool.submit(
+                _split_spans,
+                [documents[i].page_content[offset:end] for i, _, offset, end in batch],
+                self.chunk_size,
+                self.chunk_overlap
+            )
+            for batch in batches
+        ]
+
+        chunks: List[Chunk] = []
+        for batch, future in zip(batches, futures):
+            for (i, boundary, offset, _), spans in zip(batch, future.result()):
+                source = documents[i].page_content
+                chunks.extend(
+                    Chunk(source, offset + start, offset + end, metadatas[i])
+                    for start, end in spans if offset + end > boundary
+                )
+
+        logger.info(f"Split {len(documents)} documents ({total_chars} chars) in {len(batches)} parallel batches")
+        return chunks
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """Split documents into LangChain documents (materializes every chunk)"""
+        return [chunk.to_document() for chunk in self.split(documents)]
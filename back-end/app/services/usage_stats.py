@@ -0,0 +1,220 @@
+from typing import Any, Callable, Dict, List, Optional
+from datetime import datetime
+from functools import lru_cache
+import bisect
+import logging
+import math
+import threading
+import time
+
+from app.core.state_store import StateStore, get_state_store, shared_state_enabled
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram bucket upper bounds in seconds: 1 ms to about 20 minutes, 25% apart
+LATENCY_BOUNDS = [0.001 * 1.25 ** i for i in range(64)]
+
+class LatencyHistogram:
+    """Fixed log-spaced histogram; percentiles are accurate to one bucket (25%)"""
+
+    __slots__ = ("counts", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BOUNDS) + 1)
+        self.total = 0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BOUNDS, seconds)] += 1
+        self.total += 1
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.total:
+            return None
+        rank = max(math.ceil(q * self.total), 1)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BOUNDS[min(i, len(LATENCY_BOUNDS) - 1)]
+        return LATENCY_BOUNDS[-1]
+
+class _Bucket:
+    __slots__ = ("period", "count", "total", "latency")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.count = 0
+        self.total = 0.0
+        self.latency: Optional[LatencyHistogram] = None
+
+class TimeSeries:
+    """Event counts, value sums and latency percentiles rolled up per minute and per hour.
+
+    Keeps the last 60 minutes and the last 24 hours in fixed rings, so
+    recording an event and reading the rollups are both constant time.
+    """
+
+    MINUTES = 60
+    HOURS = 24
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._minutes: List[Optional[_Bucket]] = [None] * self.MINUTES
+        self._hours: List[Optional[_Bucket]] = [None] * self.HOURS
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _slot(ring: List[Optional[_Bucket]], period: int) -> _Bucket:
+        index = period % len(ring)
+        bucket = ring[index]
+        if bucket is None or bucket.period != period:
+            bucket = ring[index] = _Bucket(period)
+        return bucket
+
+    def record(self, value: float = 1.0, latency: Optional[float] = None):
+        now = self._clock()
+        with self._lock:
+            for ring, period in ((self._minutes, int(now // 60)), (self._hours, int(now // 3600))):
+                bucket = self._slot(ring, period)
+                bucket.count += 1
+                bucket.total += value
+                if latency is not None:
+                    if bucket.latency is None:
+                        bucket.latency = LatencyHistogram()
+                    bucket.latency.add(latency)
+
+    @staticmethod
+    def _summary(buckets: List[_Bucket], seconds: int) -> List[Dict[str, Any]]:
+        rows = []
+        for bucket in sorted(buckets, key=lambda b: b.period):
+            row = {
+                "start": datetime.fromtimestamp(bucket.period * seconds).isoformat(),
+                "count": bucket.count,
+                "total": round(bucket.total, 3)
+            }
+            if bucket.latency is not None:
+                for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                    row[f"latency_{name}"] = round(bucket.latency.percentile(q), 4)
+            rows.append(row)
+        return rows
+
+    def rollups(self) -> Dict[str, Any]:
+        """Non-empty buckets of the last hour (per minute) and day (per hour), oldest first"""
+        now = self._clock()
+        minute, hour = int(now // 60), int(now // 3600)
+        with self._lock:
+            minutes = [b for b in self._minutes if b is not None and minute - b.period < self.MINUTES]
+            hours = [b for b in self._hours if b is not None and hour - b.period < self.HOURS]
+            last_hour = LatencyHistogram()
+            for bucket in minutes:
+                if bucket.latency is not None:
+                    last_hour.merge(bucket.latency)
+            summary = {
+                "last_hour": {
+                    "count": sum(b.count for b in minutes),
+                    "total": round(sum(b.total for b in minutes), 3)
+                },
+                "per_minute": self._summary(minutes, 60),
+                "per_hour": self._summary(hours, 3600)
+            }
+            if last_hour.total:
+                for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                    summary["last_hour"][f"latency_{name}"] = round(last_hour.percentile(q), 4)
+            return summary
+
+class Counters:
+    """Running totals updated on every write.
+
+    In multi-worker mode they live in the shared state database (atomic
+    increments) so every worker reports the same totals.
+    """
+
+    NAMESPACE = "stats"
+
+    def __init__(self, store: Optional[StateStore] = None):
+        self.store = store
+        self._values: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, amount: int = 1):
+        if not amount:
+            return
+        if self.store is not None:
+            self.store.increment(self.NAMESPACE, key, amount)
+            return
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, key: str) -> int:
+        if self.store is not None:
+            return self.store.get(self.NAMESPACE, key, 0)
+        return self._values.get(key, 0)
+
+    def with_prefix(self, prefix: str) -> Dict[str, int]:
+        """Counters under ``prefix`` (without it), skipping zeros"""
+        if self.store is not None:
+            items = self.store.items(self.NAMESPACE)
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return {key[len(prefix):]: value for key, value in items if key.startswith(prefix) and value}
+
+    def initialize(self, name: str, compute: Callable[[], Dict[str, int]]):
+        """Set a group of counters from a full count, once.
+
+        Called at startup; in multi-worker mode only the first worker to start
+        on a fresh state database counts, the others reuse its totals.
+        """
+        if self.store is not None:
+            if not self.store.add(self.NAMESPACE, f"initialized.{name}", True):
+                return
+        values = compute()
+        for key, value in values.items():
+            if self.store is not None:
+                self.store.set(self.NAMESPACE, key, value)
+            else:
+                with self._lock:
+                    self._values[key] = value
+
+    def reset(self, prefix: str):
+        """Zero the counters under ``prefix``"""
+        if self.store is not None:
+            for key, _ in self.store.items(self.NAMESPACE):
+                if key.startswith(prefix):
+                    self.store.set(self.NAMESPACE, key, 0)
+            return
+        with self._lock:
+            for key in self._values:
+                if key.startswith(prefix):
+                    self._values[key] = 0
+
+class UsageStats:
+    """Counters plus per-minute/per-hour activity series (the series are per worker)"""
+
+    def __init__(self, counters: Counters):
+        self.counters = counters
+        self._series: Dict[str, TimeSeries] = {}
+        self._lock = threading.Lock()
+
+    def series(self, name: str) -> TimeSeries:
+        series = self._series.get(name)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(name, TimeSeries())
+        return series
+
+    def record(self, name: str, value: float = 1.0, latency: Optional[float] = None):
+        self.series(name).record(value, latency)
+
+    def rollups(self, *names: str) -> Dict[str, Any]:
+        return {name: self.series(name).rollups() for name in names}
+
+@lru_cache(maxsize=None)
+def get_usage_stats() -> UsageStats:
+    """Get the process-wide usage statistics"""
+    return UsageStats(Counters(get_state_store() if shared_state_enabled() else None))
@@ -0,0 +1,141 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_STATE_FILE = "index_state.json"
+
+# LangChain's default Chroma collection, used before collections were versioned
+LEGACY_COLLECTION = "langchain"
+
+class VectorIndex:
+    """A Chroma collection together with the settings it was built with.
+
+    The collection's embeddings and text splitter always match its config,
+    so documents added later are chunked and embedded like the rest of the
+    collection, and queries are embedded with the same model.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        config: Dict[str, Any],
+        embeddings,
+        vectorstore,
+        splitter,
+        snapshot_id: Optional[str] = None
+    ):
+        self.name = name
+        self.config = config
+        self.embeddings = embeddings
+        self.vectorstore = vectorstore
+        self.splitter = splitter
+        self.snapshot_id = snapshot_id
+    
+    def count(self) -> int:
+        """Number of chunks in the collection"""
+        collection = getattr(self.vectorstore, "_collection", None)
+        if collection is not None:
+            return collection.count()
+        return self.vectorstore.count()
+    
+    def search_by_vector(self, embedding: List[float], k: int) -> List[Tuple[Any, float]]:
+        """Nearest chunks to an embedding, with their squared L2 distances"""
+        if hasattr(self.vectorstore, "similarity_search_by_vector_with_score"):
+            # Snapshot served memory-mapped
+            return self.vectorstore.similarity_search_by_vector_with_score(embedding, k=k)
+        # Chroma returns distances despite the method name
+        return self.vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+
+def chunk_key(doc) -> str:
+    """Stable identifier of a retrieved chunk"""
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id:
+        return chunk_id
+    # Chunks stored before chunk ids were recorded
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+# Candidate chunk IDs looked up per request
+CHUNK_ID_BATCH = 5000
+
+def chunk_id_for(doc_id: str, seq: int) -> str:
+    """ID of a document's ``seq``-th chunk (numbers are never reused within a document)"""
+    return f"{doc_id}:{seq}"
+
+def _chunk_seq(chunk_id: str) -> int:
+    try:
+        return int(chunk_id.rsplit(":", 1)[1])
+    except (IndexError, ValueError):
+        return -1
+
+def document_chunk_ids(collection, doc_id: str, chunk_seq: Optional[int]) -> List[str]:
+    """IDs of a document's chunks in a Chroma collection, in chunk order.
+
+    ``chunk_seq`` is the document's next chunk number from the registry; the
+    candidate IDs ``{doc_id}:0`` ... are looked up through Chroma's ID index.
+    Documents indexed before chunk IDs were numbered (no ``chunk_seq``), or
+    whose chunks in this collection predate the numbering (a rolled-back
+    collection), fall back to a scan of the chunk metadata.
+    """
+    if chunk_seq is not None:
+        found: List[str] = []
+        for start in range(0, chunk_seq, CHUNK_ID_BATCH):
+            candidates = [chunk_id_for(doc_id, seq) for seq in range(start, min(start + CHUNK_ID_BATCH, chunk_seq))]
+            found.extend(collection.get(ids=candidates, include=[])["ids"])
+        if found or chunk_seq == 0:
+            return sorted(found, key=_chunk_seq)
+    return collection.get(where={"doc_id": doc_id}, include=[])["ids"]
+
+def relevance_from_distance(distance: float) -> float:
+    """Relevance in [0, 1] from a squared L2 distance (Chroma's default space).
+    
+    Embeddings are unit length, so the squared distance is 2 - 2 * cosine.
+    """
+    return min(max(1.0 - distance / 2.0, 0.0), 1.0)
+
+def current_index_config() -> Dict[str, Any]:
+    """Index settings from the current configuration"""
+    return {
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "embedding_model": settings.embedding_model
+    }
+
+def new_collection_name() -> str:
+    return f"rag_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+def index_entry(name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    return {"collection": name, "config": config, "activated_at": datetime.now().isoformat()}
+
+def load_index_state(path: str) -> Optional[Dict[str, Any]]:
+    """Load the active/previous collection pointer (None if not written yet)"""
+    state_file = os.path.join(path, INDEX_STATE_FILE)
+    if not os.path.exists(state_file):
+        return None
+    with open(state_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def index_state_version(path: str) -> Optional[int]:
+    """Modification time of the pointer file, to notice switches made by other workers"""
+    try:
+        return os.stat(os.path.join(path, INDEX_STATE_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def save_index_state(path: str, state: Dict[str, Any]):
+    """Write the collection pointer atomically (temp file + rename)"""
+    os.makedirs(path, exist_ok=True)
+    state_file = os.path.join(path, INDEX_STATE_FILE)
+    tmp_file = f"{state_file}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, state_file)
@@ -0,0 +1,85 @@
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+import logging
+
+from app.core.config import settings
+from app.services.html_extractor import extract_html
+
+logger = logging.getLogger(__name__)
+
+# Key of a web document's metadata holding the validators of its last fetch
+HTTP_CACHE_KEY = "http_cache"
+
+REQUEST_TIMEOUT = 30
+
+class WebPage(NamedTuple):
+    # Final URL, after redirects
+    url: str
+    # True when the server answered 304: the stored content is current
+    not_modified: bool
+    text: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: Optional[str] = None
+    title: Optional[str] = None
+    # Absolute URLs of the page's links (only collected on request)
+    links: Tuple[str, ...] = ()
+
+def user_agent() -> str:
+    return f"{settings.app_name}/{settings.app_version}"
+
+def is_html(content_type: Optional[str]) -> bool:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return media_type in ("", "text/html", "application/xhtml+xml")
+
+def fetch_web_page(
+    url: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    with_links: bool = False
+) -> WebPage:
+    """Fetch a page and extract its main text (with the ``html_extractor`` setting).
+
+    With ``etag`` / ``last_modified`` from an earlier fetch the request is
+    conditional, and an unchanged page comes back as ``not_modified`` without
+    a body. ``with_links`` also collects the page links (for crawling).
+    """
+    import requests
+
+    headers = {
+        "User-Agent": user_agent(),
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"
+    }
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    content_type = response.headers.get("Content-Type")
+    if response.status_code == 304:
+        return WebPage(
+            response.url, True, None, response.headers.get("ETag", etag),
+            response.headers.get("Last-Modified", last_modified), content_type
+        )
+    response.raise_for_status()
+    if "charset" not in (content_type or "").lower():
+        response.encoding = response.apparent_encoding
+
+    page = extract_html(response.text, response.url, with_links=with_links and is_html(content_type))
+    return WebPage(
+        response.url, False, page.text, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+        content_type, page.title, page.links
+    )
+
+def http_cache_entry(page: WebPage, checked_at: float, fetched_at: Optional[float] = None) -> Dict[str, Any]:
+    """Validators to store in a web document's metadata under ``HTTP_CACHE_KEY``.
+
+    ``fetched_at`` is when the indexed content was fetched (``checked_at``
+    unless the page was found unchanged).
+    """
+    return {
+        "etag": page.etag,
+        "last_modified": page.last_modified,
+        "checked_at": checked_at,
+        "fetched_at": checked_at if fetched_at is None else fetched_at
+    }
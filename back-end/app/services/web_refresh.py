@@ -0,0 +1,178 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+
+from app.core.state_store import get_state_store, shared_state_enabled
+from app.models.document import DocumentStatus, DocumentType
+from app.services.document_service import DocumentService
+from app.services.rag_service import RAGService
+from app.services.web_loader import HTTP_CACHE_KEY
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between two scans for documents due for a refresh
+MAX_POLL_INTERVAL = 60.0
+
+class ReindexRunningError(RuntimeError):
+    """A refresh was refused because a re-index job is running"""
+
+class WebRefreshService:
+    """Periodically re-checks web documents and re-indexes the ones that changed.
+
+    Each document is due ``interval`` seconds after its last check, shifted
+    by up to ``jitter`` (a fraction of the interval) by a stable per-document
+    offset, so documents added together don't all come due together. Due
+    documents are refreshed one at a time with a random pause of up to
+    ``spacing`` seconds in between. Refreshes wait while a re-index job runs.
+
+    With several workers only the worker holding the ``web_refresh`` lease in
+    the shared state database runs refreshes.
+    """
+
+    def __init__(
+        self,
+        document_service: DocumentService,
+        rag_service: RAGService,
+        reindex_service=None,
+        interval: float = 86400,
+        jitter: float = 0.1,
+        spacing: float = 5.0
+    ):
+        self.document_service = document_service
+        self.rag_service = rag_service
+        self.reindex_service = reindex_service
+        self.interval = interval
+        self.jitter = jitter
+        self.spacing = spacing
+        self._poll_interval = min(MAX_POLL_INTERVAL, max(interval / 10, 1.0))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"checks": 0, "not_modified": 0, "unchanged": 0, "updated": 0, "failed": 0,
+                       "chunks_added": 0, "chunks_kept": 0, "chunks_removed": 0}
+        self._last_scan: Optional[str] = None
+
+    def start(self):
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="web-refresh", daemon=True)
+        self._thread.start()
+        logger.info(f"Web document refresh every {self.interval:g}s (jitter {self.jitter:.0%})")
+
+    def stop(self):
+        self._stop.set()
+
+    def _due_at(self, doc_id: str, doc_data: Dict[str, Any]) -> float:
+        cache = (doc_data.get("metadata") or {}).get(HTTP_CACHE_KEY) or {}
+        checked_at = cache.get("checked_at")
+        if checked_at is None:
+            try:
+                checked_at = datetime.fromisoformat(doc_data["updated_at"]).timestamp()
+            except (KeyError, TypeError, ValueError):
+                checked_at = 0.0
+        # Stable offset in [-jitter, +jitter] of the interval
+        fraction = int(hashlib.sha1(doc_id.encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return checked_at + self.interval * (1 + self.jitter * (2 * fraction - 1))
+
+    def due_documents(self, now: Optional[float] = None) -> List[str]:
+        """Web documents due for a refresh, most overdue first"""
+        now = time.time() if now is None else now
+        due = []
+        for doc_id, doc_data in list(self.document_service.documents_db.items()):
+            if doc_data.get("doc_type") != DocumentType.WEB.value:
+                continue
+            if doc_data.get("status") != DocumentStatus.COMPLETED.value:
+                continue
+            due_at = self._due_at(doc_id, doc_data)
+            if due_at <= now:
+                due.append((due_at, doc_id))
+        return [doc_id for _, doc_id in sorted(due)]
+
+    def _reindex_running(self) -> bool:
+        return self.reindex_service is not None and self.reindex_service.get_status().get("status") == "running"
+
+    def _claim(self) -> bool:
+        """Hold the refresh lease (multi-worker mode)"""
+        if not shared_state_enabled():
+            return True
+        pid = os.getpid()
+        lease_timeout = self._poll_interval * 3 + self.spacing
+
+        def claim(current):
+            if current and current.get("pid") != pid and time.time() - current.get("heartbeat", 0) < lease_timeout:
+                return current
+            return {"pid": pid, "heartbeat": time.time()}
+
+        return get_state_store().update("jobs", "web_refresh", claim)["pid"] == pid
+
+    def _run(self):
+        while not self._stop.wait(self._poll_interval):
+            try:
+                if not self._claim() or self._reindex_running():
+                    continue
+                self._last_scan = datetime.now().isoformat()
+                for doc_id in self.due_documents():
+                    if self._stop.is_set() or self._reindex_running() or not self._claim():
+                        break
+                    try:
+                        self.refresh(doc_id)
+                    except ReindexRunningError:
+                        break  # A re-index job started meanwhile
+                    except Exception:
+                        pass  # Logged and counted; the document is retried after a full interval
+                    self._stop.wait(random.uniform(0, self.spacing))
+            except Exception as e:
+                logger.error(f"Error in web refresh scan: {str(e)}")
+
+    def refresh(self, doc_id: str) -> Dict[str, Any]:
+        """Refresh one web document now (refused with ReindexRunningError while a re-index job runs)"""
+        doc_data = self.document_service.documents_db.get(doc_id)
+        if doc_data is None:
+            raise KeyError(f"Document {doc_id} not found")
+        if doc_data.get("doc_type") != DocumentType.WEB.value:
+            raise ValueError(f"Document {doc_id} is not a web document")
+        if self._reindex_running():
+            raise ReindexRunningError("A re-index job is running; refresh the document once it has finished")
+        try:
+            result = self.document_service.refresh_web_document(doc_id, self.rag_service)
+        except Exception as e:
+            with self._lock:
+                self._stats["checks"] += 1
+                self._stats["failed"] += 1
+            logger.error(f"Error refreshing web document {doc_id}: {str(e)}")
+            self._mark_checked(doc_id)
+            raise
+        with self._lock:
+            self._stats["checks"] += 1
+            self._stats[result["status"]] += 1
+            for key in ("chunks_added", "chunks_kept", "chunks_removed"):
+                self._stats[key] += result.get(key, 0)
+        return result
+
+    def _mark_checked(self, doc_id: str):
+        """Record a failed check so the document waits a full interval before the next attempt"""
+        doc_data = self.document_service.documents_db.get(doc_id)
+        if doc_data is None:
+            return
+        metadata = dict(doc_data.get("metadata") or {})
+        metadata[HTTP_CACHE_KEY] = {**(metadata.get(HTTP_CACHE_KEY) or {}), "checked_at": time.time()}
+        doc_data["metadata"] = metadata
+        self.document_service.documents_db[doc_id] = doc_data
+        self.document_service._save_documents_db()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(
+            interval_seconds=self.interval,
+            jitter=self.jitter,
+            running=self._thread is not None and self._thread.is_alive(),
+            last_scan=self._last_scan
+        )
+        return stats
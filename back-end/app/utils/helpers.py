@@ -1,4 +1,5 @@
 import re
+import unicodedata
 import uuid
 from typing import Dict, Any, List, Optional
 from datetime import datetime
@@ -24,6 +25,28 @@ def clean_text(text: str) -> str:
     
     return text.strip()
 
+def normalize_question(text: str) -> str:
+    """Normalize a question for use in coalescing and cache keys"""
+    if not text:
+        return ""
+
+    text = unicodedata.normalize("NFC", text).casefold()
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    # Trailing punctuation doesn't change the question
+    return text.rstrip(" ?!.")
+
+def detect_language(text: str) -> str:
+    """Guess whether text is Vietnamese ("vi") or English ("en") from its diacritics"""
+    if not text:
+        return "en"
+    
+    # Vietnamese letters decompose into a base letter plus combining marks (except đ)
+    decomposed = unicodedata.normalize("NFD", text.casefold())
+    if "đ" in decomposed or any(unicodedata.combining(char) for char in decomposed):
+        return "vi"
+    return "en"
+
 def truncate_text(text: str, max_length: int = 500) -> str:
     """Truncate text to specified length with ellipsis"""
     if len(text) <= max_length:
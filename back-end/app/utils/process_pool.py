@@ -0,0 +1,40 @@
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def default_pool_size(server_workers: int = 1) -> int:
+    """CPUs per server worker, so the pools of several workers don't oversubscribe the machine"""
+    return max(1, available_cpus() // max(1, server_workers))
+
+def get_process_pool(workers: int = 0) -> ProcessPoolExecutor:
+    """Get the shared process pool for CPU-bound ingestion work, starting it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = workers or available_cpus()
+            # Spawn rather than fork: the server process runs threads
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Started ingestion process pool with {workers} workers")
+        return _pool
+
+def shutdown_process_pool():
+    """Stop the shared process pool if it was started"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,96 @@
+"""Response field projection (``?fields=...``).
+
+``fields`` is a comma-separated list of dotted paths. Plain paths keep only
+those fields (``fields=message,conversation_id``), paths prefixed with ``-``
+drop fields and keep everything else (``fields=-sources``,
+``fields=-documents.metadata``). Lists are projected element by element, so
+``fields=sources.content`` keeps only the content of each source.
+"""
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+# Nested selection tree: path segment -> sub-tree (empty dict = whole value)
+FieldTree = Dict[str, "FieldTree"]
+
+class Projection:
+    """Parsed ``fields`` parameter"""
+
+    def __init__(self, include: FieldTree, exclude: FieldTree):
+        self.include = include
+        self.exclude = exclude
+
+    def selects(self, field: str) -> bool:
+        """Whether a top-level field is part of the response"""
+        if self.include and field not in self.include:
+            return False
+        return not (field in self.exclude and not self.exclude[field])
+
+    def apply(self, data: Any) -> Any:
+        if self.include:
+            data = _keep(data, self.include)
+        if self.exclude:
+            data = _drop(data, self.exclude)
+        return data
+
+def _add_path(tree: FieldTree, path: Tuple[str, ...]):
+    for segment in path[:-1]:
+        tree = tree.setdefault(segment, {})
+    tree[path[-1]] = {}
+
+def parse_fields(fields: Optional[str]) -> Optional[Projection]:
+    """Parse ``fields`` (None when no projection was requested)"""
+    if not fields or not fields.strip():
+        return None
+    include: FieldTree = {}
+    exclude: FieldTree = {}
+    for raw in fields.split(","):
+        raw = raw.strip()
+        if not raw:
+            continue
+        excluded = raw.startswith("-")
+        path = tuple(segment.strip() for segment in raw.lstrip("-").split("."))
+        if not all(path):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid field path: {raw}"
+            )
+        _add_path(exclude if excluded else include, path)
+    return Projection(include, exclude)
+
+def _keep(data: Any, tree: FieldTree) -> Any:
+    if isinstance(data, list):
+        return [_keep(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        key: _keep(data[key], subtree) if subtree else data[key]
+        for key, subtree in tree.items()
+        if key in data
+    }
+
+def _drop(data: Any, tree: FieldTree) -> Any:
+    if isinstance(data, list):
+        return [_drop(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    result = {}
+    for key, value in data.items():
+        subtree = tree.get(key)
+        if subtree is None:
+            result[key] = value
+        elif subtree:
+            result[key] = _drop(value, subtree)
+    return result
+
+def project_response(content: Union[BaseModel, List[BaseModel]], projection: Optional[Projection]):
+    """Return ``content`` as-is, or its projected JSON when fields were requested"""
+    if projection is None:
+        return content
+    if isinstance(content, list):
+        data = [item.model_dump(mode="json") for item in content]
+    else:
+        data = content.model_dump(mode="json")
+    return ORJSONResponse(projection.apply(data))
@@ -0,0 +1,244 @@
+from typing import Any, Iterable, Iterator, Optional, Set
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+# How often a worker polls the shared state while it waits for the gate
+SHARED_POLL_INTERVAL = 0.05
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class WriteGate:
+    """Shared/exclusive gate around writes to the active collection.
+
+    Any number of writers can hold the gate at once; an exclusive holder waits
+    for the writers in flight to finish and keeps new ones out until it
+    releases the gate (waiting exclusive holders go first, so a steady flow of
+    writers cannot starve them). Writers are re-entrant: a thread holding the
+    gate can enter it again, e.g. a document service call around a RAG
+    service write, and only leaves it with its outermost hold.
+
+    While tracking is on, writers report the keys (document IDs) they touch so
+    that a background job can find out what changed behind its back. Keys are
+    published when the writer leaves the gate, so a key that is drained
+    belongs to a write that is complete.
+
+    With a ``store`` (the shared state database, when several worker
+    processes serve the same collection) the writer counts, the exclusive
+    hold and the touched keys live in the store, so the gate covers the
+    writes of every worker. Entries of processes that died are ignored.
+    """
+
+    def __init__(self, store: Optional[Any] = None):
+        self.store = store
+        self._cond = threading.Condition()
+        self._writers = 0
+        self._exclusive = False
+        self._waiting = 0
+        self._touched: Optional[Set[str]] = None
+        self._local = threading.local()
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        """Hold the gate as one of many writers"""
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            self._local.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        if self.store is not None:
+            self._enter_shared_store()
+        else:
+            with self._cond:
+                while self._exclusive or self._waiting:
+                    self._cond.wait()
+                self._writers += 1
+        self._local.depth = 1
+        self._local.keys = set()
+        try:
+            yield
+        finally:
+            self._local.depth = 0
+            keys, self._local.keys = self._local.keys, set()
+            self._publish(keys)
+            if self.store is not None:
+                self._leave_shared_store()
+            else:
+                with self._cond:
+                    self._writers -= 1
+                    if not self._writers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Hold the gate alone, once the writers in flight are done"""
+        if self.store is not None:
+            self._enter_exclusive_store()
+            try:
+                yield
+            finally:
+                self.store.update("write_gate", "gate", lambda state: {**(state or {}), "exclusive": None})
+            return
+
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._exclusive or self._writers:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+    def start_tracking(self):
+        """Start recording touched keys (previous records are discarded)"""
+        if self.store is not None:
+            self.store.set("write_gate", "touched", {"pid": os.getpid(), "keys": []})
+            return
+        with self._cond:
+            self._touched = set()
+
+    def stop_tracking(self):
+        if self.store is not None:
+            self.store.delete("write_gate", "touched")
+            return
+        with self._cond:
+            self._touched = None
+
+    def touch(self, keys: Iterable[Optional[str]]):
+        """Record keys written by the caller, if tracking is on"""
+        keys = {key for key in keys if key}
+        if getattr(self._local, "depth", 0):
+            self._local.keys.update(keys)
+        else:
+            self._publish(keys)
+
+    def drain(self) -> Set[str]:
+        """Return and forget the keys touched since the last drain"""
+        if self.store is not None:
+            touched: Set[str] = set()
+
+            def take(tracking):
+                if not tracking:
+                    return tracking
+                touched.update(tracking["keys"])
+                return {**tracking, "keys": []}
+
+            self.store.update("write_gate", "touched", take)
+            return touched
+        with self._cond:
+            touched = self._touched or set()
+            if self._touched is not None:
+                self._touched = set()
+            return touched
+
+    def _publish(self, keys: Set[str]):
+        if not keys:
+            return
+        if self.store is None:
+            with self._cond:
+                if self._touched is not None:
+                    self._touched.update(keys)
+            return
+
+        tracking = self.store.get("write_gate", "touched")
+        if not tracking:
+            return
+
+        def add(tracking):
+            if not tracking:
+                return tracking
+            if not _alive(tracking["pid"]):
+                # The tracking job died with its process
+                return None
+            return {**tracking, "keys": sorted(set(tracking["keys"]) | keys)}
+
+        self.store.update("write_gate", "touched", add)
+
+    @staticmethod
+    def _live_state(state: Optional[dict]) -> dict:
+        """The shared gate state without the entries of dead processes"""
+        state = dict(state or {})
+        state["writers"] = {
+            pid: count for pid, count in (state.get("writers") or {}).items() if count > 0 and _alive(int(pid))
+        }
+        if state.get("exclusive") and not _alive(state["exclusive"]):
+            state["exclusive"] = None
+        state["waiting"] = [pid for pid in state.get("waiting") or [] if _alive(pid)]
+        return state
+
+    def _enter_shared_store(self):
+        pid = str(os.getpid())
+        while True:
+            entered = False
+
+            def enter(state):
+                nonlocal entered
+                state = self._live_state(state)
+                if not state.get("exclusive") and not state["waiting"]:
+                    state["writers"][pid] = state["writers"].get(pid, 0) + 1
+                    entered = True
+                return state
+
+            self.store.update("write_gate", "gate", enter)
+            if entered:
+                return
+            time.sleep(SHARED_POLL_INTERVAL)
+
+    def _leave_shared_store(self):
+        pid = str(os.getpid())
+
+        def leave(state):
+            state = dict(state or {})
+            writers = dict(state.get("writers") or {})
+            writers[pid] = writers.get(pid, 0) - 1
+            if writers[pid] <= 0:
+                del writers[pid]
+            state["writers"] = writers
+            return state
+
+        self.store.update("write_gate", "gate", leave)
+
+    def _enter_exclusive_store(self):
+        pid = os.getpid()
+        try:
+            while True:
+                acquired = False
+
+                def enter(state):
+                    nonlocal acquired
+                    state = self._live_state(state)
+                    if pid not in state["waiting"]:
+                        state["waiting"].append(pid)
+                    if not state.get("exclusive") and not state["writers"] and state["waiting"][0] == pid:
+                        state["waiting"].remove(pid)
+                        state["exclusive"] = pid
+                        acquired = True
+                    return state
+
+                self.store.update("write_gate", "gate", enter)
+                if acquired:
+                    return
+                time.sleep(SHARED_POLL_INTERVAL)
+        except BaseException:
+            self.store.update("write_gate", "gate", lambda state: {
+                **(state or {}), "waiting": [other for other in (state or {}).get("waiting") or [] if other != pid]
+            })
+            raise
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark: class-list BeautifulSoup loader vs readability-style HTML extraction
+
+Run from the back-end folder, on the saved pages in benchmarks/fixtures/:
+    python -m benchmarks.bench_html_extract
+on other saved pages (files or folders of .html files):
+    python -m benchmarks.bench_html_extract path/to/pages/
+or on generated pages (which also measures how much article text is kept
+and how much boilerplate gets through):
+    python -m benchmarks.bench_html_extract --generated --pages 200
+Save a page with e.g. `curl -L -o page.html <url>`.
+"""
+
+import argparse
+import glob
+import os
+import random
+import time
+from typing import Callable, List, Optional, Tuple
+
+from app.services.html_extractor import EXTRACTORS, ReadabilityExtractor, _extract, etree
+from app.services.text_splitter import OffsetTextSplitter
+from app.utils.process_pool import available_cpus, get_process_pool, shutdown_process_pool
+
+WORDS = (
+    "task decomposition agent planning memory tool retrieval context reflection "
+    "nhiệm vụ phân rã mô hình ngôn ngữ tài liệu câu hỏi trả lời"
+).split()
+
+BOILERPLATE = "zzboilerplate"
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Article containers: some match the class list of the old loader, most don't
+LAYOUTS = (
+    '<div class="post-content">{}</div>',
+    '<article class="entry">{}</article>',
+    '<main><div class="story-body">{}</div></main>',
+    '<div id="mw-content-text"><div class="mw-parser-output">{}</div></div>',
+    '<td class="text">{}</td>',
+)
+
+def sentence(rng: random.Random, marker: str = "") -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 24))]
+    if marker:
+        words.insert(rng.randrange(len(words)), marker)
+    return " ".join(words).capitalize() + rng.choice([".", ", and more.", "; see above."])
+
+def generate_page(rng: random.Random, paragraphs: int) -> Tuple[str, List[str]]:
+    """A page with navigation, sidebar, comments and footer around an article; returns (html, article paragraphs)"""
+    article = [" ".join(sentence(rng) for _ in range(rng.randint(2, 6))) for _ in range(paragraphs)]
+    body = "".join(f"<h2>{sentence(rng)}</h2>" if i % 5 == 4 else f"<p>{text}</p>\n" for i, text in enumerate(article))
+    article = [text for i, text in enumerate(article) if i % 5 != 4]
+    menu = "".join(f'<li><a href="/section/{i}">{BOILERPLATE} {rng.choice(WORDS)}</a></li>' for i in range(rng.randint(10, 40)))
+    sidebar = "".join(f"<p>{sentence(rng, BOILERPLATE)}</p>" for _ in range(rng.randint(2, 6)))
+    comments = "".join(
+        f'<div class="comment"><p>{sentence(rng, BOILERPLATE)}</p></div>' for _ in range(rng.randint(0, 20))
+    )
+    scripts = "".join(f"<script>var data{i} = {rng.random()};</script>" for i in range(rng.randint(2, 10)))
+    html = (
+        f"<!DOCTYPE html><html><head><title>{sentence(rng)}</title>{scripts}"
+        f"<style>.a{{color:red}}</style></head><body>"
+        f'<header class="site-header"><a href="/">{BOILERPLATE}</a><nav><ul>{menu}</ul></nav></header>'
+        f'<div class="wrapper"><div class="sidebar">{sidebar}</div>'
+        f"{rng.choice(LAYOUTS).format(body)}"
+        f'<div id="comments">{comments}</div></div>'
+        f"<footer><p>{sentence(rng, BOILERPLATE)}</p><ul>{menu}</ul></footer></body></html>"
+    )
+    return html, article
+
+def load_pages(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "*.htm*"), recursive=True)))
+        else:
+            files.append(path)
+    pages = []
+    for path in files:
+        with open(path, "rb") as f:
+            pages.append(f.read().decode("utf-8", errors="replace"))
+    return pages
+
+def measure(fn: Callable[[], list], repeat: int) -> Tuple[float, list]:
+    """Best wall time over ``repeat`` runs"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def quality(texts: List[str], articles: Optional[List[List[str]]]) -> Tuple[str, str]:
+    """Share of article paragraphs kept and share of pages with boilerplate in their text"""
+    if articles is None:
+        return "-", "-"
+    kept = sum(sum(1 for paragraph in article if paragraph in text) for text, article in zip(texts, articles))
+    total = sum(len(article) for article in articles)
+    noisy = sum(1 for text in texts if BOILERPLATE in text)
+    return f"{kept / max(total, 1):.0%}", f"{noisy / max(len(texts), 1):.0%}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML text extraction")
+    parser.add_argument("paths", nargs="*", help="Saved HTML files or folders (default: benchmarks/fixtures)")
+    parser.add_argument("--generated", action="store_true", help="Use generated pages instead of saved ones")
+    parser.add_argument("--pages", type=int, default=100, help="Number of generated pages")
+    parser.add_argument("--paragraphs", type=int, default=40, help="Article paragraphs per generated page")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=available_cpus(), help="Process pool size")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.generated and args.paths:
+        parser.error("--generated does not take paths")
+    articles = None
+    if args.generated:
+        rng = random.Random(42)
+        generated = [generate_page(rng, args.paragraphs) for _ in range(args.pages)]
+        pages = [html for html, _ in generated]
+        articles = [article for _, article in generated]
+    else:
+        pages = load_pages(args.paths or [FIXTURES])
+    size_mb = sum(len(page.encode("utf-8")) for page in pages) / (1024 * 1024)
+    splitter = OffsetTextSplitter(args.chunk_size, args.chunk_overlap)
+    base_url = "https://example.com/page"
+
+    runs = [("classes (bs4)", EXTRACTORS["classes"]())]
+    if etree is not None:
+        runs.append(("readability (lxml)", ReadabilityExtractor("lxml")))
+    runs.append(("readability (stdlib)", ReadabilityExtractor("html.parser")))
+
+    print(f"Input: {len(pages)} page(s), {size_mb:.2f} MB{' (generated)' if args.generated else ''}")
+    print("=" * 96)
+    print(f"{'extractor':<24}{'time (s)':>10}{'ms / page':>11}{'MB / s':>9}{'speed-up':>10}"
+          f"{'text KB':>10}{'chunks':>9}{'kept':>8}{'noisy':>8}")
+    baseline = None
+    for name, extractor in runs:
+        elapsed, results = measure(lambda: [extractor.extract(page, base_url, True) for page in pages], args.repeat)
+        texts = [result.text for result in results]
+        chunks = sum(len(splitter.split_spans(text)) for text in texts)
+        kept, noisy = quality(texts, articles)
+        baseline = baseline or elapsed
+        print(f"{name:<24}{elapsed:>10.3f}{elapsed / len(pages) * 1000:>11.2f}{size_mb / elapsed:>9.2f}"
+              f"{baseline / elapsed:>9.2f}x{sum(len(text) for text in texts) / 1024:>10.1f}{chunks:>9}{kept:>8}{noisy:>8}")
+
+    if args.workers > 1:
+        # Warm the pool up first: worker start-up is paid once per server process
+        pool = get_process_pool(args.workers)
+        list(pool.map(_extract, ["readability"] * args.workers, pages[:args.workers], [base_url] * args.workers,
+                      [True] * args.workers))
+        elapsed, _ = measure(lambda: list(pool.map(
+            _extract, ["readability"] * len(pages), pages, [base_url] * len(pages), [True] * len(pages), chunksize=4
+        )), args.repeat)
+        print(f"{'readability (pool)':<24}{elapsed:>10.3f}{elapsed / len(pages) * 1000:>11.2f}{size_mb / elapsed:>9.2f}"
+              f"{baseline / elapsed:>9.2f}x   ({args.workers} processes)")
+        shutdown_process_pool()
+    print("-" * 96)
+    print("kept: article paragraphs found in the text; noisy: pages whose text contains boilerplate")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: LangChain RecursiveCharacterTextSplitter vs the offset-based splitter
+
+Run from the back-end folder:
+    python -m benchmarks.bench_splitter --mb 5
+    python -m benchmarks.bench_splitter path/to/file.txt ...
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from app.services.text_splitter import OffsetTextSplitter, Chunk
+
+WORDS = (
+    "task decomposition agent planning memory tool retrieval context "
+    "nhiệm vụ phân rã mô hình ngôn ngữ tài liệu câu hỏi trả lời"
+).split()
+
+def generate_text(size_chars: int, seed: int = 42) -> str:
+    """Generate text with paragraphs, lines and words of varying length"""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    total = 0
+    while total < size_chars:
+        sentences = []
+        for _ in range(rng.randint(1, 8)):
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 30)))
+            sentences.append(sentence.capitalize() + ".")
+        paragraph = "\n".join(sentences) if rng.random() < 0.3 else " ".join(sentences)
+        parts.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(parts)[:size_chars]
+
+def measure(fn: Callable[[], list], repeat: int) -> Tuple[float, float, list]:
+    """Best wall time over ``repeat`` runs and peak traced memory of one run"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+        del result
+
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text splitters")
+    parser.add_argument("files", nargs="*", help="Text files to split (default: generated text)")
+    parser.add_argument("--mb", type=float, default=5.0, help="Size of the generated text in MB")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.files:
+        texts = [open(path, encoding="utf-8").read() for path in args.files]
+    else:
+        texts = [generate_text(int(args.mb * 1024 * 1024))]
+
+    metadata = {"doc_id": "bench", "doc_type": "text", "title": "Benchmark", "source": "generated"}
+    documents = [Document(page_content=text, metadata=dict(metadata)) for text in texts]
+    size_mb = sum(len(text.encode("utf-8")) for text in texts) / (1024 * 1024)
+
+    langchain_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap
+    )
+    offset_splitter = OffsetTextSplitter(args.chunk_size, args.chunk_overlap)
+
+    def run_langchain():
+        return langchain_splitter.split_documents(documents)
+
+    def run_offsets():
+        return [
+            Chunk(doc.page_content, start, end, doc.metadata)
+            for doc in documents
+            for start, end in offset_splitter.split_spans(doc.page_content)
+        ]
+
+    print(f"Input: {len(documents)} document(s), {size_mb:.2f} MB, "
+          f"chunk_size={args.chunk_size}, chunk_overlap={args.chunk_overlap}")
+    print("=" * 72)
+
+    lc_time, lc_peak, lc_chunks = measure(run_langchain, args.repeat)
+    off_time, off_peak, off_chunks = measure(run_offsets, args.repeat)
+
+    identical = [doc.page_content for doc in lc_chunks] == [chunk.text for chunk in off_chunks]
+
+    print(f"{'splitter':<22}{'chunks':>8}{'time (s)':>12}{'s / MB':>10}{'peak MB':>10}{'peak / MB':>11}")
+    for name, elapsed, peak, chunks in (
+        ("langchain recursive", lc_time, lc_peak, lc_chunks),
+        ("offset (spans)", off_time, off_peak, off_chunks),
+    ):
+        print(f"{name:<22}{len(chunks):>8}{elapsed:>12.3f}{elapsed / size_mb:>10.3f}"
+              f"{peak / 2**20:>10.2f}{peak / 2**20 / size_mb:>11.2f}")
+    print("-" * 72)
+    print(f"Speed-up: {lc_time / off_time:.2f}x, peak memory reduction: {lc_peak / max(off_peak, 1):.1f}x")
+    print(f"Identical chunks: {'yes' if identical else 'NO'}")
+
+if __name__ == "__main__":
+    main()